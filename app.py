@@ -1,11 +1,44 @@
 import streamlit as st
 import pandas as pd
-import re
-import unidecode
-import io
-import uuid
-import zipfile
-from io import BytesIO
+import numpy as np
+import os
+import weakref
+
+from email_utils import valid_email_mask
+from backends import BACKEND_DUCKDB, BACKEND_PANDAS, available_backends
+from batch import ALL_SHEETS, SHEET_COL, SOURCE_COL, FileBatch, is_zip
+from parse_cache import ParseCache, content_digest
+from preview import FULL_RENDER_ROWS, PAGE_SIZES, DEFAULT_PAGE_SIZE, preview_page
+from profiling import RunProfiler, STAGE_PARSE, STAGE_TRANSFORM, STAGE_RENDER, STAGE_EXPORT
+from data_io import EXCEL_MAX_ROWS, frame_nbytes, original_nbytes
+from master_index import IN_MASTER_COL, MasterIndex, check_against_master
+from fuzzy_dedup import DEFAULT_THRESHOLD, CLUSTER_COL, find_fuzzy_duplicates
+from duplicate_index import GROUPS_PER_PAGE, DuplicateIndex
+from patch_log import PatchLog
+from keep_policy import RULE_DOMAIN, RULE_KINDS, RULE_MAX, RULE_MIN, RULE_NEWEST, KeepRule, decision_counts
+from jobs import JOB_CANCELLED, JOB_FAILED, JobRunner
+from exporters import (
+    CHUNK_FORMATS, EXPORT_FORMATS, TempFile, chunk_file_name, export_bytes, export_chunks_zip, format_bytes
+)
+from operations import (
+    fix_emails,
+    KEEP_METHODS,
+    KEEP_COMPARE,
+    KEEP_RANKED,
+    COMPARE_MAX,
+    COMPARE_MIN,
+    find_duplicates,
+    keep_rules,
+    drop_duplicates_ranked,
+    merge_blocks,
+    split_multiline_rows,
+    fill_columns,
+    compare_filled,
+    DUPLICATE_FIRST,
+    DUPLICATE_LAST,
+    DUPLICATE_ERROR,
+    DUPLICATE_KEY_POLICIES,
+)
 st.set_page_config(page_title="Email Data Cleaner", layout="wide")
 # Inject CSS để thay đổi màu nút download
 st.markdown("""
@@ -34,58 +67,300 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# --- Các hàm hỗ trợ xử lý email ---
-def is_valid_email(email):
-    """Kiểm tra định dạng email hợp lệ."""
-    pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-    return bool(re.match(pattern, str(email)))
-
-def remove_accents(input_str):
-    """Loại bỏ dấu tiếng Việt khỏi chuỗi."""
-    return unidecode.unidecode(input_str)
-
-def remove_invisible_chars(s):
-    """Loại bỏ các ký tự ẩn (invisible characters) khỏi chuỗi."""
-    return re.sub(r'[\u200B\u200C\u200D\uFEFF]', '', s)
-
-def fix_domain(email):
-
-    parts = email.split('@')
-    if len(parts) != 2:
-        return email
-    local, domain = parts
-    domain = domain.strip()
-    domain_parts = domain.split('.')
-    if len(domain_parts) == 3 and domain_parts[1].lower() == "vnn":
-        domain = f"{domain_parts[0]}.{domain_parts[2]}"
-    return f"{local}@{domain}"
-
-def clean_and_normalize_email(email, company_name):
-
-    if pd.isna(email) or not email.strip():
-        clean_name = remove_accents(str(company_name).strip().replace(" ", "").lower())
-        return f"{clean_name}@default.com"
-    
-    # Xóa các ký tự ẩn và khoảng trắng
-    email_clean = remove_invisible_chars(email).strip()
-    email_clean = re.sub(r'\s+', '', email_clean)
-    
-    # Nếu email nối liền nhau, tách bằng dấu phân cách ;, dấu phẩy hoặc dấu gạch chéo
-    emails = re.split(r'[;,/]+', email_clean)
-    candidate = emails[0] if emails else email_clean
-    
-    # Nếu candidate không hợp lệ, trích xuất email hợp lệ bằng regex
-    if not is_valid_email(candidate):
-        matches = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', candidate)
-        if matches:
-            candidate = matches[0]
-    
-    if is_valid_email(candidate):
-        return fix_domain(candidate)
-    
-    # Nếu không tìm được email hợp lệ, tạo email mới từ tên công ty
-    clean_name = remove_accents(str(company_name).strip().replace(" ", "").lower())
-    return f"{clean_name}@default.com"
+@st.cache_resource
+def get_parse_cache():
+    """Cache DataFrame đã đọc, dùng chung giữa các tab và các lần rerun."""
+    return ParseCache()
+
+@st.cache_resource
+def get_master_index():
+    """Chỉ mục master (SQLite) dùng chung cho mọi phiên làm việc."""
+    return MasterIndex()
+
+@st.cache_resource
+def get_job_runner():
+    """Thread pool chạy các thao tác nặng trong nền, dùng chung cho mọi phiên làm việc."""
+    return JobRunner()
+
+def stage(kind, detail="", rows=None):
+    """Đo một bước (đọc, xử lý, hiển thị, xuất file) của trang hiện tại, hiện trong bảng chẩn đoán."""
+    return st.session_state["run_profiler"].stage(kind, detail, rows=rows)
+
+def current_backend():
+    """Engine so khóa đang chọn ở sidebar (pandas nếu engine đã chọn không còn dùng được)."""
+    backend = st.session_state.get("backend", BACKEND_PANDAS)
+    return backend if backend in available_backends() else BACKEND_PANDAS
+
+def timed(func, *args, kind=STAGE_TRANSFORM, **kwargs):
+    """Gọi func(*args, **kwargs) và ghi thời gian vào bảng chẩn đoán (số dòng vào/ra nếu là DataFrame)."""
+    rows = next((len(arg) for arg in args if isinstance(arg, pd.DataFrame)), None)
+    with stage(kind, func.__name__, rows=rows) as record:
+        result = func(*args, **kwargs)
+        output = result[0] if isinstance(result, tuple) else result
+        if isinstance(output, pd.DataFrame):
+            record["rows_out"] = len(output)
+    return result
+
+def start_job(key, func, label, params=None):
+    """
+    Chạy func(job) trong nền thay cho job cũ cùng key (job cũ bị hủy).
+    func chạy ngoài luồng script nên không được gọi st.* hay đọc session_state.
+    """
+    jobs = st.session_state.setdefault("jobs", {})
+    old_job = jobs.get(key)
+    if old_job is not None and old_job.running:
+        old_job.cancel()
+    jobs[key] = get_job_runner().submit(func, label, params)
+    return jobs[key]
+
+@st.fragment(run_every=1)
+def show_job_progress(job):
+    """Thanh tiến độ của job đang chạy (tự làm mới mỗi giây), chạy lại cả trang khi job kết thúc."""
+    if not job.running:
+        st.rerun()
+    text = "Đang hủy..." if job.cancelled else f"{job.label}: {job.message}".rstrip(": ")
+    st.progress(job.fraction or 0.0, text=f"{text} ({job.seconds:.0f}s)")
+    if not job.cancelled and st.button("✖ Hủy", key=f"cancel_job_{job.id}"):
+        job.cancel()
+        st.rerun()
+
+def job_result(key, params=None):
+    """
+    Kết quả của job key nếu đã chạy xong với đúng params, None nếu chưa có / đang chạy / lỗi / bị hủy.
+    Job đang chạy thì hiện tiến độ, job xong được ghi thời gian vào bảng chẩn đoán một lần.
+    """
+    job = st.session_state.get("jobs", {}).get(key)
+    if job is None or job.params != params:
+        return None
+    if job.running:
+        show_job_progress(job)
+        return None
+    if job.status == JOB_CANCELLED:
+        st.warning(f"⚠️ Đã hủy: {job.label}")
+        return None
+    if job.status == JOB_FAILED:
+        st.error(f"❌ Lỗi khi {job.label.lower()}: {job.error}")
+        return None
+    reported = st.session_state.setdefault("reported_jobs", set())
+    if job.id not in reported:
+        reported.add(job.id)
+        st.session_state["run_profiler"].record(STAGE_TRANSFORM, job.label, job.seconds)
+    return job.result
+
+def show_dataframe(data, key, **kwargs):
+    """
+    st.dataframe có đo thời gian hiển thị. Bảng lớn hơn FULL_RENDER_ROWS dòng chỉ gửi một trang
+    sang trình duyệt; tìm kiếm, sắp xếp và chuyển trang được xử lý trên server.
+    key phân biệt các bảng trên cùng một trang (dùng cho các ô điều khiển).
+    """
+    if len(data) <= FULL_RENDER_ROWS:
+        with stage(STAGE_RENDER, "dataframe", rows=len(data)):
+            return st.dataframe(data, **kwargs)
+
+    columns = list(data.columns)
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 1], vertical_alignment="bottom")
+    search = col1.text_input("🔎 Tìm kiếm", key=f"{key}__search")
+    search_column = col2.selectbox(
+        "Trong cột", [None, *columns], format_func=lambda col: "Tất cả các cột" if col is None else str(col),
+        key=f"{key}__search_column"
+    )
+    sort_column = col3.selectbox(
+        "Sắp xếp theo", [None, *columns], format_func=lambda col: "Không sắp xếp" if col is None else str(col),
+        key=f"{key}__sort_column"
+    )
+    descending = col4.toggle("Giảm dần", key=f"{key}__descending")
+    col5, col6, col7 = st.columns([1, 1, 4], vertical_alignment="bottom")
+    page_size = col6.selectbox(
+        "Số dòng mỗi trang", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{key}__page_size"
+    )
+
+    page_key = f"{key}__page"
+    with stage(STAGE_RENDER, "dataframe (trang)", rows=len(data)) as record:
+        df_page, matched, page, pages = preview_page(
+            data, search.strip(), None if search_column is None else [search_column], sort_column,
+            ascending=not descending, page=st.session_state.get(page_key, 1), page_size=page_size
+        )
+        # Đưa số trang về trong giới hạn trước khi tạo ô nhập (khi kết quả tìm kiếm ít trang hơn)
+        st.session_state[page_key] = page
+        col5.number_input("Trang", min_value=1, max_value=pages, step=1, key=page_key)
+        start = (page - 1) * page_size
+        col7.caption(
+            f"Dòng {start + 1 if matched else 0:,}–{start + len(df_page):,} / {matched:,}"
+            + (f" (lọc từ {len(data):,} dòng)" if matched != len(data) else "")
+        )
+        record["rows_out"] = len(df_page)
+        return st.dataframe(df_page, **kwargs)
+
+def download_table(df, key, label, file_name, sheet_name="Sheet1", source=None, version=None):
+    """
+    Tải bảng xuống dạng xlsx / csv / parquet. File chỉ được tạo khi người dùng bấm nút và được giữ
+    lại (theo key, định dạng) cho tới khi kết quả đổi: kết quả được nhận biết bằng chính đối tượng
+    source (mặc định df, là kết quả lưu trong session nên giữ nguyên qua các lần rerun) và version.
+    """
+    source = df if source is None else source
+    col1, col2 = st.columns([2, 3], vertical_alignment="bottom")
+    fmt = col1.radio("Định dạng file", list(EXPORT_FORMATS), horizontal=True, key=f"{key}__format")
+    split_files = by_sheet = False
+    if fmt == "xlsx" and SHEET_COL in df.columns:
+        by_sheet = col2.checkbox(
+            f"Ghi mỗi sheet gốc (cột \"{SHEET_COL}\") thành một sheet", value=True, key=f"{key}__by_sheet"
+        )
+    if fmt == "xlsx" and not by_sheet and len(df) > EXCEL_MAX_ROWS - 1:
+        split_files = col2.checkbox(
+            f"Chia thành nhiều file (mỗi file tối đa {EXCEL_MAX_ROWS - 1:,} dòng) thay vì nhiều sheet",
+            key=f"{key}__split_files"
+        )
+
+    export_key = f"{key}__export"
+    params = (fmt, split_files, by_sheet, sheet_name, version)
+    cached = st.session_state.get(export_key)
+    if cached is None or cached["params"] != params or cached["source"]() is not source:
+        if not st.button(f"📦 Tạo file {fmt}", key=f"{key}__prepare"):
+            return
+        with st.spinner("Đang tạo file..."):
+            data, ext, mime = timed(
+                export_bytes, df, fmt, sheet_name=sheet_name, split_files=split_files,
+                group_column=SHEET_COL if by_sheet else None, kind=STAGE_EXPORT
+            )
+        cached = {"params": params, "source": weakref.ref(source), "data": data, "ext": ext, "mime": mime}
+        st.session_state[export_key] = cached
+
+    st.download_button(
+        label=f"{label} ({format_bytes(len(cached['data']))})",
+        data=cached["data"],
+        file_name=f"{os.path.splitext(file_name)[0]}.{cached['ext']}",
+        mime=cached["mime"],
+        key=f"{key}__download"
+    )
+
+def read_uploaded_file(uploaded_file, key, drop_unnamed=True, **read_options):
+    """
+    Đọc file upload (Excel/CSV) qua cache: cùng nội dung + tùy chọn đọc thì chỉ đọc một lần.
+    Nhiều file hoặc file zip được đọc song song và ghép lại, cột SOURCE_COL ghi file gốc của từng dòng.
+    File Excel nhiều sheet: người dùng chọn các sheet cần đọc, nhiều sheet được đọc song song
+    và ghép lại với cột SHEET_COL. key phân biệt các ô chọn sheet trên cùng một trang.
+    Khi bật chế độ gọn bộ nhớ, hiện dung lượng trước và sau khi thu gọn.
+    """
+    cache = get_parse_cache()
+    hits = cache.hits
+    compact = st.session_state.get("compact_mode", False)
+    is_batch = isinstance(uploaded_file, FileBatch) or is_zip(uploaded_file.name)
+    sheets = None
+    if is_batch:
+        files = uploaded_file.files if isinstance(uploaded_file, FileBatch) else [
+            (uploaded_file.name, uploaded_file.getvalue())
+        ]
+        if st.toggle("📑 Đọc tất cả các sheet của mỗi file", key=f"{key}__all_sheets"):
+            sheets = ALL_SHEETS
+    else:
+        data = uploaded_file.getvalue()
+        all_sheets = cache.sheet_names(data, uploaded_file.name)
+        if len(all_sheets) > 1:
+            sheets = st.multiselect(
+                f"📑 Chọn sheet ({len(all_sheets)} sheet)", all_sheets, default=all_sheets[:1], key=f"{key}__sheets",
+                help=f"Chọn nhiều sheet để ghép lại, cột \"{SHEET_COL}\" ghi sheet gốc của từng dòng"
+            ) or all_sheets[:1]
+
+    with stage(STAGE_PARSE, uploaded_file.name) as record:
+        if is_batch:
+            df = cache.read_batch(files, drop_unnamed=drop_unnamed, compact=compact, sheets=sheets, **read_options)
+        elif sheets is not None and len(sheets) > 1:
+            df = cache.read_batch(
+                [(uploaded_file.name, data)], drop_unnamed=drop_unnamed, compact=compact, sheets=sheets,
+                tag_source=False, **read_options
+            )
+        else:
+            if sheets is not None:
+                read_options["sheet_name"] = sheets[0]
+            df = cache.read(data, uploaded_file.name, drop_unnamed=drop_unnamed, compact=compact, **read_options)
+        record["rows_out"] = len(df)
+        if cache.hits > hits:
+            record["detail"] += " (cache)"
+    if is_batch:
+        st.caption(f"📚 Đã ghép {df[SOURCE_COL].nunique()} file, {len(df):,} dòng. Cột \"{SOURCE_COL}\" ghi file gốc của từng dòng.")
+    elif SHEET_COL in df.columns and sheets is not None and len(sheets) > 1:
+        st.caption(f"📑 Đã ghép {len(sheets)} sheet, {len(df):,} dòng.")
+    if compact:
+        st.caption(
+            f"💾 {uploaded_file.name}: {format_bytes(original_nbytes(df))} → {format_bytes(frame_nbytes(df))} sau khi thu gọn"
+        )
+    return df
+
+def source_id(uploaded_file, key):
+    """
+    Định danh dữ liệu đã đọc bằng read_uploaded_file(uploaded_file, key): tên file, băm nội dung
+    (tải lên file khác cùng tên thì không dùng lại kết quả cũ) và các sheet đã chọn.
+    """
+    files = uploaded_file.files if isinstance(uploaded_file, FileBatch) else [(uploaded_file.name, uploaded_file.getvalue())]
+    digests = tuple(content_digest(data) for _, data in files)
+    sheets = st.session_state.get(f"{key}__sheets") or []
+    return uploaded_file.name, digests, tuple(sheets), st.session_state.get(f"{key}__all_sheets", False)
+
+def persistent_file_uploader(label, key, type=None, **kwargs):
+    """
+    st.file_uploader giữ lại file đã tải lên khi chuyển sang trang khác rồi quay lại.
+    Streamlit xóa giá trị widget của trang không hiển thị, nên file được lưu riêng
+    trong session_state và chỉ bị bỏ khi người dùng tự xóa file ở uploader.
+    Cho phép chọn nhiều file hoặc file zip: khi đó trả về FileBatch thay cho một file.
+    """
+    stored_key = f"{key}__file"
+    returning = key not in st.session_state
+    uploaded_files = st.file_uploader(
+        label, key=key, type=None if type is None else [*type, "zip"], accept_multiple_files=True, **kwargs
+    )
+    if len(uploaded_files) == 1:
+        uploaded_file = uploaded_files[0]
+    elif uploaded_files:
+        uploaded_file = FileBatch((upload.name, upload.getvalue()) for upload in uploaded_files)
+    else:
+        uploaded_file = None
+    if uploaded_file is not None:
+        st.session_state[stored_key] = uploaded_file
+    elif returning and stored_key in st.session_state:
+        uploaded_file = st.session_state[stored_key]
+        st.caption(f"📎 Đang dùng file đã tải lên trước đó: {uploaded_file.name}")
+    else:
+        st.session_state.pop(stored_key, None)
+    return uploaded_file
+
+# Nguồn của các bước trong nhật ký thay đổi email
+EMAIL_AUTO_FIX = "Sửa tự động"
+EMAIL_MANUAL_EDIT = "Chỉnh sửa tay"
+
+# Các widget có key được giữ giá trị khi chuyển trang
+PERSISTENT_WIDGET_KEYS = [
+    "fix_domain_typos",
+    "selected_column", "duplicate_search",
+    "duplicate_columns", "sort_duplicates", "duplicate_normalize", "duplicate_keep_method", "duplicate_keep_rules",
+    "duplicate_compare_column", "duplicate_compare_type",
+    "fuzzy_column", "fuzzy_threshold",
+    "merge_x_col", "merge_y_col",
+    "split_columns",
+    "check_cols_a", "check_cols_b", "source_cols_b", "target_cols_a",
+    "fill_overwrite", "fill_normalize", "fill_duplicate_keys",
+    "master_columns",
+]
+
+def keep_widget_state():
+    """Gán lại giá trị widget vào session_state để Streamlit không xóa khi trang bị ẩn."""
+    for key in PERSISTENT_WIDGET_KEYS:
+        if key in st.session_state:
+            st.session_state[key] = st.session_state[key]
+
+def fix_email_patches(df, fix_typos, progress):
+    """Sửa email (fix_emails) và ghi các email đã sửa thành bước đầu tiên của nhật ký thay đổi trên df."""
+    _, df_compare = fix_emails(df, email_col="Email", name_col="Tên", correct_domains=fix_typos, progress=progress)
+    patches = PatchLog(df)
+    patches.apply(((row, "Email", email) for row, email in df_compare["email_fixed"].items()), EMAIL_AUTO_FIX)
+    return patches
+
+def save_email_edits(patches, rows, editor_key):
+    """Ghi các ô email_fixed vừa chỉnh trong bảng so sánh thành một bước của nhật ký thay đổi."""
+    edited_rows = st.session_state[editor_key]["edited_rows"]
+    patches.apply(
+        ((rows[int(position)], "Email", cells["email_fixed"]) for position, cells in edited_rows.items() if "email_fixed" in cells),
+        EMAIL_MANUAL_EDIT
+    )
 
 def clean_email_page():
     # --- Giao diện Streamlit ---
@@ -93,106 +368,106 @@ def clean_email_page():
     st.write("Upload file Excel chứa dữ liệu liên hệ")
 
     # Upload file Excel
-    uploaded_file = st.file_uploader("Chọn file Excel", type=["xlsx"], key="clean_email_uploader")
+    uploaded_file = persistent_file_uploader("Chọn file Excel", type=["xlsx"], key="clean_email_uploader")
     if uploaded_file is not None:
         try:
-            df = pd.read_excel(uploaded_file, engine="openpyxl")
+            # Đọc file Excel và loại bỏ các cột có tên bắt đầu bằng "Unnamed"
+            df = read_uploaded_file(uploaded_file, "clean_email")
         except Exception as e:
             st.error(f"Lỗi khi đọc file: {e}")
         else:
-            # Đọc file Excel và loại bỏ các cột có tên bắt đầu bằng "Unnamed"
-            df = df.loc[:, ~df.columns.str.startswith("Unnamed")]
-            
             # Thêm cột "email_original" chứa email ban đầu
             df["email_original"] = df["Email"]
             
             st.subheader("Dữ liệu ban đầu")
-            st.dataframe(df.head())
+            show_dataframe(df.head(), "email_head")
             st.write("Tổng số dòng dữ liệu:", df.shape[0])
+            # Tính mask email hợp lệ một lần và dùng lại cho các bước sau
+            valid_mask = valid_email_mask(df["Email"])
             # Tách dữ liệu: các dòng có email  hợp lệ (df_valid)
-            df_valid = df[df["Email"].apply(is_valid_email)].copy()
+            df_valid = df[valid_mask]
             st.subheader("Các Email  hợp lệ ban đầu (df_valid)")
-            st.dataframe(df_valid)
+            show_dataframe(df_valid, "email_valid")
             st.write("Số lượng Email  hợp lệ:", df_valid.shape[0])
             # Tách dữ liệu: các dòng có email không hợp lệ (df_invalid)
-            df_invalid = df[~df["Email"].apply(is_valid_email)].copy()
+            df_invalid = df[~valid_mask]
             st.subheader("Các Email không hợp lệ ban đầu (df_invalid)")
-            st.dataframe(df_invalid[["email_original", "Email"]], use_container_width=True)
+            show_dataframe(df_invalid[["email_original", "Email"]], "email_invalid", use_container_width=True)
             st.write("Số lượng Email không hợp lệ:", df_invalid.shape[0])
             
+            fix_typos = st.checkbox(
+                "Sửa lỗi chính tả domain (gmial.com, gmail.con, yahoo.com.vnn, ...)",
+                value=True,
+                help="Sửa cả các email đúng định dạng nhưng domain gõ sai, dựa trên các domain phổ biến và các domain xuất hiện nhiều trong file",
+                key="fix_domain_typos"
+            )
             # Cho phép người dùng chọn sửa các email không hợp lệ
             if st.button("Sửa các Email không hợp lệ"):
-                # Tạo df_invalid_fixed bằng cách sửa email theo hàm clean_and_normalize_email
-                df_invalid_fixed = df_invalid.copy()
-                df_invalid_fixed["email_fixed"] = df_invalid_fixed.apply(
-                    lambda row: clean_and_normalize_email(row["Email"], row["Tên"]), axis=1
+                # Sửa email không hợp lệ (và domain gõ sai) trong nền, kết quả là nhật ký thay đổi trên dữ liệu gốc
+                df_input = df.drop(columns=["email_original"])
+                start_job(
+                    "email_fix",
+                    lambda job: fix_email_patches(df_input, fix_typos, job.progress),
+                    "Sửa email", params=(source_id(uploaded_file, "clean_email"), fix_typos)
                 )
-                # Tạo bảng so sánh gồm 2 cột: email_original và email_fixed
-                df_compare = df_invalid_fixed[["email_original", "email_fixed"]].copy()
-                
+
+            # Kết quả được giữ trong session để chuyển trang bảng / chỉnh sửa không làm mất kết quả
+            patches = job_result("email_fix", params=(source_id(uploaded_file, "clean_email"), fix_typos))
+            if patches is not None:
                 st.subheader("So sánh Email ban đầu và Email đã sửa")
                 st.write("So sánh lại với dữ liệu ban đầu, bạn hoàn toàn có thể sửa đổi email_fixed nếu chưa đúng")
-                # Hiển thị bảng so sánh và cho phép người dùng chỉnh sửa trực tiếp cột "email_fixed"
-                df_edited = st.data_editor(df_compare, num_rows="dynamic", key="edited_df", use_container_width=True)
-                
-                # Sau khi chỉnh sửa, cập nhật lại df_invalid_fixed với giá trị từ df_edited
-                df_invalid_fixed["email_fixed"] = df_edited["email_fixed"]
-                # Cập nhật cột Email trong df_invalid_fixed từ cột email_fixed đã chỉnh sửa
-                df_invalid_fixed["Email"] = df_invalid_fixed["email_fixed"]
-                # Loại bỏ cột email_fixed để tránh trùng lặp
-                df_invalid_fixed = df_invalid_fixed.drop(columns=["email_fixed"])
-                
-                # Cập nhật bảng dữ liệu toàn bộ đã sửa:
-                # - df_valid: các dòng có email hợp lệ ban đầu
-                df_valid = df[df["Email"].apply(is_valid_email)]
-                # - Gộp lại df_valid và df_invalid_fixed
-                df_fixed = pd.concat([df_valid, df_invalid_fixed], axis=0).sort_index()
-                # Loại bỏ cột email_original khỏi df_fixed
-                df_fixed = df_fixed.drop(columns=["email_original"])
-                
-                # Sử dụng placeholder để hiển thị bảng df_fixed và cập nhật ngay lập tức sau chỉnh sửa
+                # Bảng so sánh chỉ gồm các dòng đã sửa; mỗi chỉnh sửa được ghi vào nhật ký (có thể hoàn tác)
+                rows = patches.touched_rows("Email")
+                df_compare = pd.DataFrame({
+                    "email_original": patches.base.loc[rows, "Email"],
+                    "email_fixed": patches.values(rows, "Email"),
+                })
+                editor_key = f"email_edits__{id(patches)}_{patches.version}"
+                with stage(STAGE_RENDER, "data_editor", rows=len(df_compare)):
+                    st.data_editor(
+                        df_compare, key=editor_key, use_container_width=True, disabled=["email_original"],
+                        on_change=save_email_edits, args=(patches, df_compare.index, editor_key)
+                    )
+
+                col1, col2, col3 = st.columns([1, 1, 4], vertical_alignment="center")
+                col1.button("↶ Hoàn tác", on_click=patches.undo, disabled=not patches.can_undo)
+                col2.button("↷ Làm lại", on_click=patches.redo, disabled=not patches.can_redo)
+                col3.caption(f"{len(patches)} bước thay đổi, {patches.changed_cells:,} ô khác dữ liệu gốc.")
+
+                # Toàn bộ dữ liệu đã sửa chỉ được tạo lại khi nhật ký thay đổi
+                df_fixed = patches.materialize()
                 st.subheader("Toàn bộ dữ liệu đã chỉnh sửa")
-                fixed_placeholder = st.empty()
-                fixed_placeholder.dataframe(df_fixed, use_container_width=True)
+                show_dataframe(df_fixed, "email_fixed", use_container_width=True)
                 st.write("Tổng số dòng:", df_fixed.shape[0])
-                
+
                 # Nút download cho bảng so sánh đã chỉnh sửa
-                towrite_compare = io.BytesIO()
-                with pd.ExcelWriter(towrite_compare, engine="openpyxl") as writer:
-                    df_edited.to_excel(writer, index=False)
-                st.download_button(
-                    label="Tải file so sánh (email_original vs email_fixed)",
-                    data=towrite_compare.getvalue(),
-                    file_name="Email_Comparison.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                download_table(
+                    df_compare, "email_compare", "Tải file so sánh (email_original vs email_fixed)",
+                    "Email_Comparison.xlsx", source=patches, version=patches.version
                 )
-                
+
                 # Nút download cho toàn bộ dữ liệu đã sửa
-                towrite_full = io.BytesIO()
-                with pd.ExcelWriter(towrite_full, engine="openpyxl") as writer:
-                    df_fixed.to_excel(writer, index=False)
-                st.download_button(
-                    label="Tải file toàn bộ dữ liệu đã sửa",
-                    data=towrite_full.getvalue(),
-                    file_name="FullData_Fixed.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                download_table(
+                    df_fixed, "email_fixed", "Tải file toàn bộ dữ liệu đã sửa",
+                    "FullData_Fixed.xlsx", source=patches, version=patches.version
+                )
+
+                # Nút download cho nhật ký thay đổi (sửa tự động và chỉnh sửa tay)
+                download_table(
+                    patches.audit_frame(), "email_audit", "Tải nhật ký thay đổi",
+                    "Email_Changes.xlsx", source=patches, version=patches.version
                 )
-def get_duplicate_groups(df, column_name):
-    """Lấy tất cả các nhóm có giá trị trùng lặp trong cột chỉ định."""
-    if column_name not in df.columns:
-        return pd.DataFrame()
-    return df[df.duplicated(subset=[column_name], keep=False)]
 
 def Check_data():
     st.title("Kiểm tra Data")
-    uploaded_file = st.file_uploader("Chọn file Excel", type=["xlsx"], key="check_data_uploader")
+    uploaded_file = persistent_file_uploader("Chọn file Excel", type=["xlsx"], key="check_data_uploader")
 
     if uploaded_file is not None:
         try:
-            df_new = pd.read_excel(uploaded_file, engine="openpyxl")
+            df_new = read_uploaded_file(uploaded_file, "check_data", drop_unnamed=False)
             st.session_state['data_fixed'] = df_new  # Lưu vào session
             st.subheader("Dữ liệu mới đã tải lên")
-            st.dataframe(df_new, use_container_width=True)
+            show_dataframe(df_new, "check_data", use_container_width=True)
         except Exception as e:
             st.error(f"Lỗi khi đọc file: {e}")
             return  
@@ -206,119 +481,197 @@ def Check_data():
     # Chọn cột để kiểm tra trùng lặp
     selected_column = st.selectbox("Chọn cột để kiểm tra trùng lặp:", df_new.columns, key="selected_column")
 
-    # Kiểm tra trùng lặp & lưu kết quả vào session_state
+    # Kiểm tra trùng lặp: tạo chỉ mục nhóm một lần và lưu vào session_state
     if st.button("Kiểm tra trùng lặp"):
-        st.session_state['duplicate_df'] = get_duplicate_groups(df_new, selected_column)
+        index = timed(DuplicateIndex, df_new, selected_column)
+        st.session_state['duplicate_index'] = index
+        st.session_state['duplicate_source'] = df_new
+        st.session_state['duplicate_df'] = index.duplicate_rows(df_new)
+        st.session_state.pop("duplicate_group_list__page", None)
 
     # Hiển thị kết quả nếu có
-    if 'duplicate_df' in st.session_state and not st.session_state['duplicate_df'].empty:
+    index = st.session_state.get('duplicate_index')
+    if index is not None and len(index):
         duplicate_df = st.session_state['duplicate_df']
-        st.subheader(f"Dữ liệu trùng lặp trong cột '{selected_column}'")
-        st.dataframe(duplicate_df, use_container_width=True)
-
-        # Chọn giá trị cụ thể để lọc
-        unique_values = duplicate_df[selected_column].dropna().astype(str).unique()
-        selected_value = st.selectbox(f"Chọn giá trị trong '{selected_column}' để xem:", unique_values, key="selected_value")
-
-        # Lọc dữ liệu theo giá trị được chọn
-        filtered_df = duplicate_df[duplicate_df[selected_column].astype(str) == str(selected_value)]
-        st.subheader(f"Dữ liệu trùng có '{selected_column} = {selected_value}'")
-        st.dataframe(filtered_df, use_container_width=True)
-    elif 'duplicate_df' in st.session_state:
-        st.success(f"Không có dữ liệu trùng lặp trong cột {selected_column}.")
+        column = index.column
+        st.subheader(f"Dữ liệu trùng lặp trong cột '{column}'")
+        st.caption(f"{len(index):,} nhóm trùng, {index.row_count:,} dòng; nhóm lớn nhất {index.sizes[0]:,} dòng.")
+        show_dataframe(duplicate_df, "duplicate_groups", use_container_width=True)
+
+        with st.expander("📊 Phân bố số dòng mỗi nhóm"):
+            st.dataframe(index.size_distribution(), hide_index=True)
+
+        # Tìm và chuyển trang giữa các nhóm (nhóm lớn trước), chọn một nhóm để xem
+        col1, col2, col3 = st.columns([3, 1, 2], vertical_alignment="bottom")
+        search = col1.text_input(f"🔎 Tìm giá trị trong '{column}'", key="duplicate_search")
+        groups = index.search(search.strip())
+        page_key = "duplicate_group_list__page"
+        page_groups, page, pages = index.page(groups, st.session_state.get(page_key, 1), GROUPS_PER_PAGE)
+        st.session_state[page_key] = page
+        col2.number_input("Trang", min_value=1, max_value=pages, step=1, key=page_key)
+        col3.caption(f"{len(groups):,} nhóm" + (f" (lọc từ {len(index):,} nhóm)" if len(groups) != len(index) else ""))
+        if not len(page_groups):
+            st.info("Không có nhóm nào khớp.")
+            return
+
+        labels = index.labels.to_numpy()
+        selected_group = st.selectbox(
+            f"Chọn giá trị trong '{column}' để xem:", page_groups.tolist(), key="duplicate_group",
+            format_func=lambda group: f"{labels[group]} ({index.sizes[group]:,} dòng)"
+        )
+        filtered_df = index.group_rows(st.session_state['duplicate_source'], selected_group)
+        st.subheader(f"Dữ liệu trùng có '{column} = {labels[selected_group]}'")
+        show_dataframe(filtered_df, "duplicate_value", use_container_width=True)
+    elif index is not None:
+        st.success(f"Không có dữ liệu trùng lặp trong cột {index.column}.")
 
 def check_duplicate():
     st.title("🔍 Kiểm tra & Xử lý Trùng Dữ Liệu")
 
-    uploaded_file = st.file_uploader("📂 Chọn file Excel", type=["xlsx"], key="check_duplicate_uploader_unique")
+    uploaded_file = persistent_file_uploader("📂 Chọn file Excel", type=["xlsx"], key="check_duplicate_uploader_unique")
 
     if uploaded_file is not None:
         try:
-            df_new = pd.read_excel(uploaded_file, engine="openpyxl", dtype=str)
+            df_new = read_uploaded_file(uploaded_file, "check_duplicate", drop_unnamed=False, dtype=str)
             st.session_state['data_fixed'] = df_new
 
             st.subheader("📊 Dữ liệu đã tải lên")
             df_new = df_new.loc[:, ~df_new.columns.str.startswith("Unnamed")]
 
-            st.dataframe(df_new, use_container_width=True)
+            show_dataframe(df_new, "duplicate_data", use_container_width=True)
 
-            selected_columns = st.multiselect("🛠 Chọn cột kiểm tra trùng lặp:", df_new.columns)
-            sort_duplicates = st.checkbox("🔃 Sắp xếp dữ liệu trùng lặp lại gần nhau", value=False)
+            with st.expander("🧩 Tìm trùng gần đúng (tên công ty / liên hệ viết khác nhau)"):
+                fuzzy_column = st.selectbox("Cột tên cần so khớp:", df_new.columns, key="fuzzy_column")
+                fuzzy_threshold = st.slider(
+                    "Ngưỡng độ giống:", min_value=0.5, max_value=1.0, value=DEFAULT_THRESHOLD, step=0.05,
+                    help="Độ giống Jaccard trên n-gram ký tự sau khi bỏ dấu và bỏ các từ như 'Công ty', 'TNHH'",
+                    key="fuzzy_threshold"
+                )
+                fuzzy_params = (source_id(uploaded_file, "check_duplicate"), fuzzy_column, fuzzy_threshold)
+                if st.button("🔎 Tìm trùng gần đúng"):
+                    start_job(
+                        "fuzzy_duplicates",
+                        lambda job: find_fuzzy_duplicates(
+                            df_new, fuzzy_column, threshold=fuzzy_threshold, progress=job.progress
+                        ),
+                        "Tìm trùng gần đúng", params=fuzzy_params
+                    )
+                df_fuzzy = job_result("fuzzy_duplicates", params=fuzzy_params)
+                if df_fuzzy is not None:
+                    st.success(f"✅ {df_fuzzy.shape[0]} dòng trong {df_fuzzy[CLUSTER_COL].nunique()} nhóm gần giống nhau.")
+                    show_dataframe(df_fuzzy, "fuzzy_result", use_container_width=True)
+                    download_table(df_fuzzy, "fuzzy_result", "📥 Tải nhóm trùng gần đúng", "Fuzzy_Duplicates.xlsx")
+
+            selected_columns = st.multiselect("🛠 Chọn cột kiểm tra trùng lặp:", df_new.columns, key="duplicate_columns")
+            sort_duplicates = st.checkbox("🔃 Sắp xếp dữ liệu trùng lặp lại gần nhau", value=False, key="sort_duplicates")
+            normalize = st.checkbox(
+                "🔤 Chuẩn hóa trước khi so trùng", value=False, key="duplicate_normalize",
+                help="Bỏ dấu, bỏ ký tự ẩn, không phân biệt hoa thường và gộp khoảng trắng ('Công ty  ABC' trùng 'CONG TY ABC')"
+            )
 
             if selected_columns:
-                df_base = df_new.sort_values(by=selected_columns).reset_index(drop=True) if sort_duplicates else df_new
-
                 # Tìm các dòng trùng lặp (giữ tất cả trùng)
-                df_duplicates = df_base[df_base.duplicated(subset=selected_columns, keep=False)]
+                df_duplicates = timed(
+                    find_duplicates, df_new, selected_columns, sort=sort_duplicates, normalize=normalize,
+                    backend=current_backend()
+                )
 
                 st.write("### 🔍 Dữ liệu Trùng Lặp" + (" (Đã sắp xếp)" if sort_duplicates else ""))
-                st.dataframe(df_duplicates)
+                show_dataframe(df_duplicates, "duplicate_rows")
                 st.markdown("### ✨ Chọn cách giữ dòng:")
                 method = st.radio(
                     "Cách xử lý dòng trùng:",
-                    ["Giữ dòng đầu tiên", "Giữ dòng có Email @gmail.com", "So sánh theo cột cụ thể"],
+                    KEEP_METHODS,
                     key="duplicate_keep_method"
                 )
 
-                keep_option = "first"
                 df_cleaned = pd.DataFrame()
+                compare_column = compare_type = rules = None
 
-                if method == "Giữ dòng đầu tiên":
-                    df_cleaned = df_new.drop_duplicates(subset=selected_columns, keep="first")
-
-                elif method == "Giữ dòng có Email @gmail.com":
-                    df_duplicates = df_new[df_new.duplicated(subset=selected_columns, keep=False)]
-                    df_gmail = df_duplicates[df_duplicates["Email"].str.endswith("@gmail.com", na=False)]
-                    df_gmail = df_gmail.drop_duplicates(subset=selected_columns, keep="first")
-                    df_non_duplicates = df_new[~df_new.duplicated(subset=selected_columns, keep=False)]
-                    df_cleaned = pd.concat([df_non_duplicates, df_gmail])
-
-                elif method == "So sánh theo cột cụ thể":
-                    compare_column = st.selectbox("📊 Chọn cột để so sánh:", df_new.columns)
-                    compare_type = st.radio("🧮 Giữ dòng có giá trị:", ["Lớn nhất", "Nhỏ nhất"], horizontal=True)
-
-                    if compare_column and compare_type:
-                        try:
-                            # Ép kiểu cột về số (Int64 cho phép NaN)
-                            df_new[compare_column] = pd.to_numeric(df_new[compare_column], errors='coerce').astype("Int64")
-
-                            # Bỏ các dòng không thể so sánh
-                            df_valid = df_new.dropna(subset=[compare_column])
-
-                            # Lọc giữ dòng có giá trị lớn nhất hoặc nhỏ nhất theo nhóm
-                            if compare_type == "Lớn nhất":
-                                df_cleaned = df_valid.loc[df_valid.groupby(selected_columns)[compare_column].idxmax()]
-                            else:
-                                df_cleaned = df_valid.loc[df_valid.groupby(selected_columns)[compare_column].idxmin()]
+                if method == KEEP_COMPARE:
+                    compare_column = st.selectbox("📊 Chọn cột để so sánh:", df_new.columns, key="duplicate_compare_column")
+                    compare_type = st.radio(
+                        "🧮 Giữ dòng có giá trị:", [COMPARE_MAX, COMPARE_MIN], horizontal=True, key="duplicate_compare_type"
+                    )
 
-                            st.success(f"✅ Đã giữ lại các dòng có {compare_column} {compare_type.lower()} theo nhóm {selected_columns}")
-                            st.dataframe(df_cleaned)
-                        except Exception as e:
-                            st.error(f"❌ Lỗi: Không thể xử lý cột '{compare_column}': {e}")
+                elif method == KEEP_RANKED:
+                    rule_kinds = st.multiselect(
+                        "📋 Chọn tiêu chí theo thứ tự ưu tiên:", RULE_KINDS, key="duplicate_keep_rules",
+                        help="Tiêu chí chọn trước được xét trước; hòa thì xét tiêu chí tiếp theo, hòa tất cả thì giữ dòng đứng trước"
+                    )
+                    rules = []
+                    for i, kind in enumerate(rule_kinds, 1):
+                        if kind == RULE_DOMAIN:
+                            col_email, col_domains = st.columns(2)
+                            columns = list(df_new.columns)
+                            email_column = col_email.selectbox(
+                                f"{i}. Cột email:", columns, index=columns.index("Email") if "Email" in columns else 0,
+                                key="duplicate_rule_email"
+                            )
+                            domains = col_domains.text_input(
+                                f"{i}. Domain ưu tiên (cách nhau bởi dấu phẩy):", value="gmail.com", key="duplicate_rule_domains"
+                            )
+                            rules.append(KeepRule(kind, email_column, tuple(d.strip() for d in domains.split(",") if d.strip())))
+                        elif kind in (RULE_MAX, RULE_MIN):
+                            rules.append(KeepRule(kind, st.selectbox(f"{i}. {kind}:", df_new.columns, key=f"duplicate_rule_{kind}")))
+                        elif kind == RULE_NEWEST:
+                            date_column = st.selectbox(
+                                f"{i}. Cột ngày:", [None] + list(df_new.columns), key="duplicate_rule_date",
+                                format_func=lambda c: "(Không có - dòng nằm sau cùng là mới nhất)" if c is None else c
+                            )
+                            rules.append(KeepRule(kind, date_column))
+                        else:
+                            rules.append(KeepRule(kind))
+
+                try:
+                    df_cleaned, decided_by = timed(
+                        drop_duplicates_ranked, df_new, selected_columns,
+                        keep_rules(method, compare_column, compare_type, rules), normalize=normalize,
+                        backend=current_backend()
+                    )
+                    if method == KEEP_COMPARE:
+                        st.success(f"✅ Đã giữ lại các dòng có {compare_column} {compare_type.lower()} theo nhóm {selected_columns}")
+                    decisions = decision_counts(decided_by)
+                    if not decisions.empty:
+                        st.write("📌 Tiêu chí quyết định dòng được giữ của các nhóm trùng:")
+                        st.dataframe(decisions, hide_index=True)
+                except Exception as e:
+                    st.error(f"❌ Lỗi: Không thể chọn dòng giữ lại: {e}")
 
 
                 st.success(f"✅ Dữ liệu sau khi làm sạch: {df_cleaned.shape[0]} dòng.")
-                st.dataframe(df_cleaned)
+                show_dataframe(df_cleaned, "duplicate_cleaned")
 
                 chunk_size = st.number_input("📌 Nhập số dòng cho mỗi file nhỏ:", min_value=100, value=8000, step=100)
                 prefix = st.text_input("📌 Nhập tiền tố cho tên file:", value="Output_file")
+                chunk_format = st.radio("📄 Định dạng file nhỏ:", list(CHUNK_FORMATS), horizontal=True)
 
+                def build_zip(job):
+                    zip_path, stats = export_chunks_zip(
+                        df_cleaned, chunk_size, prefix, fmt=chunk_format,
+                        progress=lambda done, total: job.progress(done, total, f"Đã tạo {done}/{total} file")
+                    )
+                    # Giữ file zip trên đĩa, chỉ đọc khi người dùng bấm tải (file bị xóa khi kết quả bị thay)
+                    return TempFile(zip_path), stats
+
+                # Chỉ dùng lại file zip khi cùng file, cùng cách lọc trùng và cùng cách chia
+                zip_params = (
+                    source_id(uploaded_file, "check_duplicate"), selected_columns, normalize, method, compare_column, compare_type, rules,
+                    chunk_size, prefix, chunk_format
+                )
                 if st.button("📥 Tải tất cả file chia nhỏ"):
-                    zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as zip_file:
-                        for i, chunk_start in enumerate(range(0, df_cleaned.shape[0], chunk_size)):
-                            df_chunk = df_cleaned.iloc[chunk_start: chunk_start + chunk_size]
-                            excel_buffer = io.BytesIO()
-                            with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                                df_chunk.to_excel(writer, index=False)
-                            excel_buffer.seek(0)
-                            file_name = f"{prefix}_{i+1}.xlsx"
-                            zip_file.writestr(file_name, excel_buffer.read())
-                    zip_buffer.seek(0)
+                    start_job("split_zip", build_zip, "Tạo các file chia nhỏ", params=zip_params)
+                result = job_result("split_zip", params=zip_params)
+                if result is not None:
+                    zip_file, stats = result
+                    st.info(
+                        f"⏱ {stats['files']} file, {stats['rows']} dòng trong {stats['seconds']:.2f}s "
+                        f"({stats['rows_per_sec']:,.0f} dòng/s), file zip {format_bytes(stats['zip_bytes'])}"
+                    )
                     st.download_button(
                         label="📦 Tải toàn bộ file chia nhỏ (.zip)",
-                        data=zip_buffer,
-                        file_name=f"{prefix}_split_files.zip",
+                        data=zip_file.read,
+                        file_name=chunk_file_name(prefix, "split_files", "zip"),
                         mime="application/zip"
                     )
 
@@ -328,136 +681,60 @@ def merge_data():
     st.title("🔄 Gộp thông tin theo khối trong DataFrame")
 
     # Upload file
-    uploaded_file = st.file_uploader("📂 Tải lên file Excel hoặc CSV", type=["csv", "xlsx"])
+    uploaded_file = persistent_file_uploader("📂 Tải lên file Excel hoặc CSV", type=["csv", "xlsx"], key="merge_data_uploader")
 
     if uploaded_file:
         # Đọc file
-        if uploaded_file.name.endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
+        df = read_uploaded_file(uploaded_file, "merge_data", drop_unnamed=False)
 
         st.subheader("📋 Xem trước dữ liệu")
-        st.dataframe(df.head(10))
+        show_dataframe(df.head(10), "merge_head")
 
         # Chọn cột X (bắt đầu block) và Y (gom dữ liệu)
-        x_col = st.selectbox("🧱 Chọn cột để xác định khối (X)", df.columns)
-        y_col = st.selectbox("📍 Chọn cột để gom thông tin (Y)", df.columns)
+        x_col = st.selectbox("🧱 Chọn cột để xác định khối (X)", df.columns, key="merge_x_col")
+        y_col = st.selectbox("📍 Chọn cột để gom thông tin (Y)", df.columns, key="merge_y_col")
 
+        merge_params = (source_id(uploaded_file, "merge_data"), x_col, y_col)
         if st.button("🚀 Thực hiện gom dữ liệu"):
-            # Tìm chỉ số bắt đầu block
-            block_start_indices = df[df[x_col].notna()].index.tolist()
-            block_start_indices.append(len(df))  # Đảm bảo chặn cuối
-
-            rows_to_drop = set()
-
-            for i in range(len(block_start_indices) - 1):
-                start = block_start_indices[i]
-                end = block_start_indices[i + 1]
-                block = df.loc[start:end-1]
-
-                # Gom dữ liệu cột Y
-                values = (
-                    block[y_col]
-                    .dropna()
-                    .astype(str)
-                    .str.strip()
-                    .loc[lambda x: x != '']
-                    .unique()
-                    .tolist()
-                )
-
-                value_string = ",".join(values)
-                df.at[start, y_col] = value_string
-
-                # Xoá các dòng chỉ có giá trị Y (có thể điều chỉnh logic này tùy bạn)
-                idx_range = df.index[(df.index > start) & (df.index < end)]
-                for j in idx_range:
-                    if (
-                        pd.isna(df.at[j, x_col]) and
-                        df.at[j, y_col] in values and
-                        all(pd.isna(df.at[j, col]) for col in df.columns if col not in [y_col])
-                    ):
-                        rows_to_drop.add(j)
-
-            df_result = df.drop(index=list(rows_to_drop)).reset_index(drop=True)
+            start_job("merge", lambda job: merge_blocks(df, x_col, y_col), "Gom dữ liệu", params=merge_params)
 
+        df_result = job_result("merge", params=merge_params)
+        if df_result is not None:
             st.success("✅ Hoàn tất xử lý!")
-            st.dataframe(df_result)
+            show_dataframe(df_result, "merge_result")
 
             # Xuất file
-            def convert_df(df):
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                    df.to_excel(writer, index=False, sheet_name="Sheet1")
-                return output.getvalue()
-
-            excel_bytes = convert_df(df_result)
-            st.download_button(
-                label="⬇️ Tải xuống kết quả",
-                data=excel_bytes,
-                file_name="ket_qua_gom.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            )
-def split_row_generic(row, columns):
-    values_split = {col: str(row[col]).split('\n') for col in columns}
-    max_len = max(len(v) for v in values_split.values())
-    rows = []
-
-    for i in range(max_len):
-        new_row = row.copy()
-        for col in columns:
-            new_row[col] = values_split[col][i] if i < len(values_split[col]) else ''
-        rows.append(new_row)
-    return rows
-
-def convert_df_to_excel(df):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False)
-    processed_data = output.getvalue()
-    return processed_data
+            download_table(df_result, "merge_result", "⬇️ Tải xuống kết quả", "ket_qua_gom.xlsx")
 def split_data():
     st.title("Split Multi-line Cells into Multiple Rows")
 
-    uploaded_file = st.file_uploader("Upload your Excel or CSV file", type=["xlsx", "csv"])
+    uploaded_file = persistent_file_uploader("Upload your Excel or CSV file", type=["xlsx", "csv"], key="split_data_uploader")
 
     if uploaded_file is not None:
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
+        df = read_uploaded_file(uploaded_file, "split_data", drop_unnamed=False)
 
         st.subheader("Dữ liệu xem trước")
-        st.dataframe(df)
+        show_dataframe(df, "split_data")
 
         all_columns = df.columns.tolist()
-        cols_to_split = st.multiselect("Chọn các dòng có dữ liệu cần chia nhỏ", options=all_columns)
+        cols_to_split = st.multiselect("Chọn các dòng có dữ liệu cần chia nhỏ", options=all_columns, key="split_columns")
 
         if st.button("Chia nhỏ dòng"):
             if not cols_to_split:
                 st.warning("Vui lòng chọn ít nhất 1 dòng để chạy")
             else:
-                new_rows = []
-                for _, row in df.iterrows():
-                    new_rows.extend(split_row_generic(row, cols_to_split))
-
-                df_result = pd.DataFrame(new_rows)
-                df_result = df_result.fillna('')  # Thay NaN bằng chuỗi rỗng
-                # df_result = df_result.replace('nan', '')  # Thay chuỗi 'nan' bằng chuỗi rỗng (nếu có)
-                # df_result.fillna('', inplace=True)
-
-                st.subheader("Kết quả sau khi chia nhỏ dữ liệu")
-                st.dataframe(df_result)
-
-                excel_data = convert_df_to_excel(df_result)
-                st.download_button(
-                    label="Download cleaned data",
-                    data=excel_data,
-                    file_name="split_result.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                start_job(
+                    "split", lambda job: split_multiline_rows(df, cols_to_split), "Chia nhỏ dòng",
+                    params=(source_id(uploaded_file, "split_data"), cols_to_split)
                 )
 
+        df_result = job_result("split", params=(source_id(uploaded_file, "split_data"), cols_to_split))
+        if df_result is not None:
+            st.subheader("Kết quả sau khi chia nhỏ dữ liệu")
+            show_dataframe(df_result, "split_result")
+
+            download_table(df_result, "split_result", "Download cleaned data", "split_result.xlsx")
+
 
 def FillData():
     st.title("📝 Điền Dữ Liệu từ File B sang File A")
@@ -466,79 +743,71 @@ def FillData():
     
     with col1:
         st.subheader("📂 File A (Cần điền dữ liệu)")
-        file_a = st.file_uploader("Tải lên File A", type=["xlsx", "csv"], key="file_a_uploader")
+        file_a = persistent_file_uploader("Tải lên File A", type=["xlsx", "csv"], key="file_a_uploader")
     
     with col2:
         st.subheader("📂 File B (Nguồn dữ liệu)")
-        file_b = st.file_uploader("Tải lên File B", type=["xlsx", "csv"], key="file_b_uploader")
+        file_b = persistent_file_uploader("Tải lên File B", type=["xlsx", "csv"], key="file_b_uploader")
     
     if file_a is not None and file_b is not None:
         try:
-            # Đọc file A
-            if file_a.name.endswith('.csv'):
-                df_a = pd.read_csv(file_a)
-            else:
-                df_a = pd.read_excel(file_a, engine="openpyxl")
-            
-            # Đọc file B
-            if file_b.name.endswith('.csv'):
-                df_b = pd.read_csv(file_b)
-            else:
-                df_b = pd.read_excel(file_b, engine="openpyxl")
-            
-            # Loại bỏ cột Unnamed
-            df_a = df_a.loc[:, ~df_a.columns.str.startswith("Unnamed")]
-            df_b = df_b.loc[:, ~df_b.columns.str.startswith("Unnamed")]
+            # Đọc file A và file B, loại bỏ cột Unnamed
+            df_a = read_uploaded_file(file_a, "file_a")
+            df_b = read_uploaded_file(file_b, "file_b")
             
             # Hiển thị preview
             col1, col2 = st.columns(2)
             
             with col1:
                 st.write("**Xem trước File A:**")
-                st.dataframe(df_a.head(5))
+                show_dataframe(df_a.head(5), "fill_head_a")
                 st.write(f"Tổng số dòng: {df_a.shape[0]}")
             
             with col2:
                 st.write("**Xem trước File B:**")
-                st.dataframe(df_b.head(5))
+                show_dataframe(df_b.head(5), "fill_head_b")
                 st.write(f"Tổng số dòng: {df_b.shape[0]}")
             
             st.markdown("---")
             
-            # Chọn cột kiểm tra chung
+            # Chọn cột kiểm tra chung (có thể chọn nhiều cột, ghép theo thứ tự đã chọn)
             st.subheader("🔍 Bước 1: Chọn cột để kiểm tra trùng khớp")
             col1, col2 = st.columns(2)
             
             with col1:
-                check_col_a = st.selectbox(
+                check_cols_a = st.multiselect(
                     "Cột kiểm tra ở File A:",
                     df_a.columns.tolist(),
-                    key="check_col_a"
+                    default=df_a.columns.tolist()[:1],
+                    key="check_cols_a"
                 )
             
             with col2:
-                check_col_b = st.selectbox(
+                check_cols_b = st.multiselect(
                     "Cột kiểm tra ở File B:",
                     df_b.columns.tolist(),
-                    key="check_col_b"
+                    default=df_b.columns.tolist()[:1],
+                    key="check_cols_b"
                 )
             
-            # Chọn cột nguồn và đích
+            # Chọn cột nguồn và đích (cột nguồn thứ i điền vào cột đích thứ i)
             st.subheader("📋 Bước 2: Chọn cột nguồn và cột đích")
             col1, col2 = st.columns(2)
             
             with col1:
-                source_col_b = st.selectbox(
+                source_cols_b = st.multiselect(
                     "Cột lấy dữ liệu từ File B:",
                     df_b.columns.tolist(),
-                    key="source_col_b"
+                    default=df_b.columns.tolist()[:1],
+                    key="source_cols_b"
                 )
             
             with col2:
-                target_col_a = st.selectbox(
+                target_cols_a = st.multiselect(
                     "Cột cần điền ở File A:",
                     df_a.columns.tolist(),
-                    key="target_col_a"
+                    default=df_a.columns.tolist()[:1],
+                    key="target_cols_a"
                 )
             
             # Tùy chọn xử lý
@@ -546,60 +815,75 @@ def FillData():
             overwrite = st.checkbox(
                 "Ghi đè dữ liệu đã có trong File A",
                 value=False,
-                help="Nếu bỏ chọn, chỉ điền vào các ô trống"
+                help="Nếu bỏ chọn, chỉ điền vào các ô trống",
+                key="fill_overwrite"
+            )
+            normalize = st.checkbox(
+                "Chuẩn hóa cột kiểm tra trước khi so khớp",
+                value=False,
+                help="Bỏ khoảng trắng đầu/cuối, bỏ dấu và không phân biệt chữ hoa/thường",
+                key="fill_normalize"
+            )
+            duplicate_labels = {
+                DUPLICATE_LAST: "Lấy dòng cuối cùng",
+                DUPLICATE_FIRST: "Lấy dòng đầu tiên",
+                DUPLICATE_ERROR: "Báo lỗi",
+            }
+            duplicate_keys = st.radio(
+                "Khi File B có nhiều dòng trùng giá trị kiểm tra:",
+                DUPLICATE_KEY_POLICIES,
+                format_func=duplicate_labels.get,
+                horizontal=True,
+                key="fill_duplicate_keys"
             )
             
+            fill_params = (
+                source_id(file_a, "file_a"), source_id(file_b, "file_b"), check_cols_a, check_cols_b, source_cols_b, target_cols_a,
+                overwrite, normalize, duplicate_keys
+            )
             # Nút thực hiện
             if st.button("🚀 Thực hiện điền dữ liệu", type="primary"):
-                # Tạo bản copy để xử lý
-                df_result = df_a.copy()
-                
-                # Tạo dictionary mapping từ File B
-                mapping_dict = df_b.set_index(check_col_b)[source_col_b].to_dict()
-                
-                # Đếm số dòng được điền
-                filled_count = 0
-                
-                # Điền dữ liệu
-                for idx, row in df_result.iterrows():
-                    check_value = row[check_col_a]
-                    
-                    # Kiểm tra xem giá trị có trong mapping không
-                    if check_value in mapping_dict:
-                        # Nếu overwrite=True hoặc ô đích đang trống
-                        if overwrite or pd.isna(row[target_col_a]) or str(row[target_col_a]).strip() == '':
-                            df_result.at[idx, target_col_a] = mapping_dict[check_value]
-                            filled_count += 1
+                if not check_cols_a or len(check_cols_a) != len(check_cols_b):
+                    st.warning("Vui lòng chọn cùng số cột kiểm tra ở File A và File B")
+                    return
+                if not source_cols_b or len(source_cols_b) != len(target_cols_a):
+                    st.warning("Vui lòng chọn cùng số cột nguồn và cột đích")
+                    return
+
+                # Điền dữ liệu trong nền (engine được đọc trước vì job không truy cập được session)
+                backend = current_backend()
+                start_job(
+                    "fill",
+                    lambda job: fill_columns(
+                        df_a, df_b, check_cols_a, check_cols_b, list(zip(source_cols_b, target_cols_a)),
+                        overwrite=overwrite, normalize=normalize, duplicate_keys=duplicate_keys, progress=job.progress,
+                        backend=backend
+                    ),
+                    "Điền dữ liệu", params=fill_params
+                )
+
+            # Kết quả được giữ trong session để chuyển trang bảng không làm mất kết quả
+            result = job_result("fill", params=fill_params)
+            if result is not None:
+                df_result, filled_masks = result
+                filled_count = int(np.logical_or.reduce(list(filled_masks.values())).sum())
                 
                 # Hiển thị kết quả
                 st.success(f"✅ Đã điền {filled_count} dòng dữ liệu thành công!")
                 
                 st.subheader("📊 Kết quả sau khi điền dữ liệu")
-                st.dataframe(df_result, use_container_width=True)
+                show_dataframe(df_result, "fill_result", use_container_width=True)
                 
                 # So sánh trước và sau
                 with st.expander("🔍 Xem chi tiết các dòng đã được điền"):
-                    comparison_cols = [check_col_a, target_col_a]
-                    df_compare = pd.DataFrame({
-                        f'{check_col_a}': df_result[check_col_a],
-                        f'{target_col_a} (Trước)': df_a[target_col_a],
-                        f'{target_col_a} (Sau)': df_result[target_col_a]
-                    })
                     # Chỉ hiển thị các dòng có thay đổi
-                    df_changed = df_compare[df_a[target_col_a].astype(str) != df_result[target_col_a].astype(str)]
-                    st.dataframe(df_changed, use_container_width=True)
+                    df_changed = timed(compare_filled, df_a, df_result, check_cols_a, target_cols_a, filled_masks)
+                    show_dataframe(df_changed, "fill_changed", use_container_width=True)
                     st.write(f"Tổng số dòng có thay đổi: {len(df_changed)}")
                 
                 # Nút tải xuống
-                towrite = io.BytesIO()
-                with pd.ExcelWriter(towrite, engine="openpyxl") as writer:
-                    df_result.to_excel(writer, index=False, sheet_name="Result")
-                
-                st.download_button(
-                    label="📥 Tải xuống File kết quả",
-                    data=towrite.getvalue(),
-                    file_name="FileA_Filled.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                download_table(
+                    df_result, "fill_result", "📥 Tải xuống File kết quả", "FileA_Filled.xlsx", sheet_name="Result"
                 )
                 
         except Exception as e:
@@ -607,19 +891,112 @@ def FillData():
     else:
         st.info("👆 Vui lòng tải lên cả 2 file Excel (File A và File B) để bắt đầu")
 
-# --- Navigation Tabs ở đầu trang ---
-tabs = st.tabs(["Clean Email", "Check Data", "Check duplicate","Merge Data","Split Data", "Fill Data"])
-with tabs[0]:
-    clean_email_page()
-
-with tabs[1]:
-    Check_data()
-with tabs[2]:
-    check_duplicate()
-with tabs[3]:
-    merge_data()
-with tabs[4]:
-    split_data()
-with tabs[5]:
-    FillData()
-    
+def master_index_page():
+    st.title("🗂 Kiểm tra với dữ liệu Master")
+    st.write("Kiểm tra file mới với toàn bộ dữ liệu đã nhập trước đây mà không cần tải lại dữ liệu cũ.")
+    index = get_master_index()
+
+    uploaded_file = persistent_file_uploader("📂 Chọn file cần kiểm tra", type=["xlsx", "csv"], key="master_uploader")
+    if uploaded_file is None:
+        return
+
+    df = read_uploaded_file(uploaded_file, "master", dtype=str)
+    st.subheader("📊 Dữ liệu đã tải lên")
+    show_dataframe(df, "master_data", use_container_width=True)
+
+    key_columns = st.multiselect("🔑 Chọn cột khóa kiểm tra trùng:", df.columns, key="master_columns")
+    if not key_columns:
+        return
+    st.caption(f"Master hiện có {index.key_sets().get(tuple(key_columns), 0)} khóa cho bộ cột này.")
+
+    master_params = (source_id(uploaded_file, "master"), key_columns)
+    if st.button("🔍 Kiểm tra với master"):
+        start_job(
+            "master", lambda job: check_against_master(df, key_columns, index)[0], "Kiểm tra với master",
+            params=master_params
+        )
+
+    df_result = job_result("master", params=master_params)
+    if df_result is not None:
+        in_master = df_result[IN_MASTER_COL]
+        col1, col2 = st.columns(2)
+        col1.metric("Đã có trong master", int(in_master.sum()))
+        col2.metric("Dòng mới", int((~in_master).sum()))
+        show_dataframe(df_result, "master_result", use_container_width=True)
+
+        df_new_rows = df_result.loc[~in_master, df.columns]
+        download_table(df_new_rows, "master_new_rows", "📥 Tải các dòng mới", "New_Rows.xlsx", source=df_result)
+        if st.button("➕ Thêm các dòng mới vào master"):
+            added = timed(index.add, df_new_rows, key_columns, source=uploaded_file.name)
+            st.session_state['jobs'].pop('master', None)
+            st.success(f"✅ Đã thêm {added} khóa mới vào master.")
+
+    with st.expander("⚙️ Quản lý master"):
+        key_sets = index.key_sets()
+        if not key_sets:
+            st.info("Master chưa có dữ liệu.")
+        for columns, count in key_sets.items():
+            col1, col2 = st.columns([4, 1])
+            col1.write(f"{', '.join(columns)}: {count} khóa")
+            if col2.button("🗑 Xóa", key=f"master_clear_{'_'.join(columns)}"):
+                index.clear(list(columns))
+                st.rerun()
+
+# --- Điều hướng ở đầu trang: mỗi lần rerun chỉ chạy trang đang được chọn ---
+pages = [
+    st.Page(clean_email_page, title="Clean Email", url_path="clean-email", default=True),
+    st.Page(Check_data, title="Check Data", url_path="check-data"),
+    st.Page(check_duplicate, title="Check duplicate", url_path="check-duplicate"),
+    st.Page(merge_data, title="Merge Data", url_path="merge-data"),
+    st.Page(split_data, title="Split Data", url_path="split-data"),
+    st.Page(FillData, title="Fill Data", url_path="fill-data"),
+    st.Page(master_index_page, title="Master Index", url_path="master-index"),
+]
+def show_diagnostics(run_profiler):
+    """Bảng chẩn đoán hiệu năng của lần chạy vừa rồi: thời gian, số dòng, bộ nhớ từng bước (+ cProfile nếu bật)."""
+    with st.expander("🩺 Chẩn đoán hiệu năng"):
+        if not run_profiler.stages:
+            st.caption("Chưa có bước nào được đo trong lần chạy này.")
+        else:
+            st.dataframe(run_profiler.to_frame().drop(columns=["tool"]), use_container_width=True, hide_index=True)
+        st.caption(f"Tổng thời gian chạy trang: {run_profiler.total_seconds:.2f} giây")
+
+        col1, col2, col3 = st.columns(3)
+        col1.download_button(
+            "📥 JSON", data=run_profiler.to_json(), file_name="profile.json", mime="application/json"
+        )
+        col2.download_button("📥 CSV", data=run_profiler.to_csv(), file_name="profile.csv", mime="text/csv")
+        if col3.button("⏱ Chạy lại với cProfile"):
+            st.session_state["capture_cprofile"] = True
+            st.rerun()
+
+        report = run_profiler.cprofile_text()
+        if report is not None:
+            st.code(report)
+            st.download_button(
+                "📥 Tải file .prof", data=run_profiler.cprofile_bytes(), file_name="profile.prof",
+                mime="application/octet-stream"
+            )
+
+keep_widget_state()
+st.sidebar.toggle(
+    "💾 Chế độ gọn bộ nhớ",
+    key="compact_mode",
+    help="Lưu cột chuỗi lặp lại nhiều (tỉnh/thành, loại công ty, ...) dạng category, "
+         "cột chuỗi dạng Arrow và thu nhỏ kiểu số."
+)
+engines = available_backends()
+st.sidebar.selectbox(
+    "⚙️ Engine so khóa",
+    engines,
+    key="backend",
+    help="Engine dùng để tìm / loại trùng và ghép khóa File A với File B; kết quả như nhau. "
+         "DuckDB chạy nhiều luồng và ghi dữ liệu tạm ra đĩa khi thiếu bộ nhớ"
+         + ("." if BACKEND_DUCKDB in engines else " (cần cài gói duckdb).")
+)
+page = st.navigation(pages, position="top")
+run_profiler = RunProfiler(page.title)
+st.session_state["run_profiler"] = run_profiler
+with run_profiler.cprofile(enabled=st.session_state.pop("capture_cprofile", False)):
+    page.run()
+show_diagnostics(run_profiler)
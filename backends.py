@@ -0,0 +1,277 @@
+"""
+Engine thực thi cho các thao tác so khóa nặng nhất (tìm / loại trùng, ghép khóa File A với File B):
+pandas (mặc định) hoặc DuckDB (nếu đã cài, chạy nhiều luồng và đẩy dữ liệu tạm ra đĩa khi thiếu RAM).
+Hai engine cho cùng kết quả; cột khóa DuckDB không so được đúng như pandas (cột object lẫn số
+và chữ) thì tự chạy bằng pandas. Các hàm *_file chạy thẳng trên file .csv / .parquet bằng DuckDB,
+không cần đọc cả file vào bộ nhớ.
+"""
+import importlib.util
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from data_io import decategorize
+
+BACKEND_PANDAS = "pandas"
+BACKEND_DUCKDB = "duckdb"
+BACKENDS = [BACKEND_PANDAS, BACKEND_DUCKDB]
+# Thư mục DuckDB ghi dữ liệu tạm khi vượt giới hạn bộ nhớ
+DUCKDB_TEMP_DIR = os.path.join(tempfile.gettempdir(), "cleandata_duckdb")
+# Các loại file DuckDB đọc / ghi trực tiếp
+DUCKDB_FILE_EXTENSIONS = (".csv", ".parquet")
+# Cột tạm (vị trí dòng, thứ tự trong nhóm) dùng trong các câu lệnh *_file
+ROW_COL = "__cleandata_row"
+RANK_COL = "__cleandata_rank"
+# Biểu thức (RE2) của ô chỉ gồm khoảng trắng theo str.strip() của Python (tab, xuống dòng, NBSP, ...),
+# vì trim() của DuckDB chỉ bỏ dấu cách
+BLANK_PATTERN = "[" + "".join(f"\\x{{{ord(c):04x}}}" for c in map(chr, range(0x3001)) if c.isspace()) + "]*"
+
+
+def available_backends():
+    """Các engine dùng được trong môi trường hiện tại (DuckDB chỉ có khi đã cài gói duckdb)."""
+    return [backend for backend in BACKENDS if backend == BACKEND_PANDAS or importlib.util.find_spec(backend)]
+
+def duckdb_connect(database=":memory:", threads=None, memory_limit=None):
+    """Kết nối DuckDB dùng threads luồng (mặc định số CPU), ghi dữ liệu tạm vào DUCKDB_TEMP_DIR."""
+    import duckdb
+
+    os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+    con = duckdb.connect(database)
+    con.execute(f"SET threads = {int(threads or os.cpu_count() or 1)}")
+    con.execute(f"SET temp_directory = '{_sql_text(DUCKDB_TEMP_DIR)}'")
+    con.execute("SET preserve_insertion_order = true")
+    if memory_limit:
+        con.execute(f"SET memory_limit = '{_sql_text(memory_limit)}'")
+    return con
+
+def _sql_text(value):
+    return str(value).replace("'", "''")
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _key_table(keys, labels=False):
+    """
+    Bảng khóa gửi sang DuckDB (cột k0, k1, ..., vị trí dòng pos và nhãn index label nếu labels),
+    None nếu có cột DuckDB không so được giống pandas: cột object lẫn kiểu (123 và "123" khác nhau trong pandas).
+    """
+    columns = {}
+    for i, column in enumerate(keys.columns):
+        values = decategorize(keys[column])
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+            return None
+        columns[f"k{i}"] = values.to_numpy() if values.dtype == object else values.array
+    columns["pos"] = np.arange(len(keys))
+    if labels:
+        columns["label"] = keys.index.to_numpy()
+    table = pd.DataFrame(columns)
+    # DuckDB đọc bảng Arrow nhanh hơn nhiều so với cột object của pandas
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return table
+    return pa.Table.from_pandas(table, preserve_index=False)
+
+def _key_kind(dtype):
+    """Loại cột khóa khi ghép hai bảng: DuckDB chỉ ghép cột chữ với chữ, số với số (giống pandas)."""
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if pd.api.types.is_string_dtype(dtype) or pd.api.types.is_object_dtype(dtype):
+        return "text"
+    if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+        return "number"
+    return str(dtype)
+
+def _key_columns(count, prefix=""):
+    return ", ".join(f"{prefix}k{i}" for i in range(count))
+
+def _duckdb_positions(con, query, count, default=-1):
+    """Chạy query trả về (pos, value) và xếp value theo pos vào mảng count phần tử."""
+    result = con.execute(query).fetchnumpy()
+    values = np.full(count, default, dtype=np.int64)
+    values[np.asarray(result["pos"], dtype=np.int64)] = np.asarray(result["value"], dtype=np.int64)
+    return values
+
+
+def group_ids(keys, backend=BACKEND_PANDAS):
+    """
+    Số nhóm của từng dòng theo các cột keys: các dòng cùng giá trị (kể cả cùng trống) có cùng số.
+    Chỉ dùng để so bằng: số nhóm của pandas và DuckDB khác nhau (DuckDB dùng vị trí dòng đầu của nhóm).
+    """
+    table = _key_table(keys) if backend == BACKEND_DUCKDB else None
+    if table is None:
+        return keys.groupby(list(keys.columns), sort=False, dropna=False).ngroup().to_numpy()
+    with duckdb_connect() as con:
+        con.register("keys", table)
+        return _duckdb_positions(
+            con, f"SELECT pos, min(pos) OVER (PARTITION BY {_key_columns(len(keys.columns))}) AS value FROM keys",
+            len(keys)
+        )
+
+def duplicated(keys, keep="first", backend=BACKEND_PANDAS):
+    """Như keys.duplicated(keep).to_numpy(): keep="first" / "last" đánh dấu các lần lặp sau / trước, False đánh dấu cả nhóm."""
+    table = _key_table(keys) if backend == BACKEND_DUCKDB else None
+    if table is None:
+        return keys.duplicated(keep=keep).to_numpy()
+    partition = f"PARTITION BY {_key_columns(len(keys.columns))}"
+    if keep is False:
+        value = f"(count(*) OVER ({partition}) > 1)::INTEGER"
+    else:
+        value = f"(row_number() OVER ({partition} ORDER BY pos {'DESC' if keep == 'last' else 'ASC'}) > 1)::INTEGER"
+    with duckdb_connect() as con:
+        con.register("keys", table)
+        return _duckdb_positions(con, f"SELECT pos, {value} AS value FROM keys", len(keys), default=0).astype(bool)
+
+def match_positions(keys_a, keys_b, backend=BACKEND_PANDAS):
+    """
+    Với mỗi dòng của keys_a: nhãn index (số nguyên) của dòng keys_b có cùng khóa, -1 nếu không có.
+    keys_b không được có khóa trùng; dòng có ô khóa trống không khớp với dòng nào.
+    """
+    table_a = table_b = None
+    if backend == BACKEND_DUCKDB and list(map(_key_kind, keys_a.dtypes)) == list(map(_key_kind, keys_b.dtypes)):
+        table_a, table_b = _key_table(keys_a), _key_table(keys_b, labels=True)
+    if table_a is None or table_b is None:
+        indexer = _key_index(keys_b).get_indexer(_key_index(keys_a))
+        # Chỉ lấy nhãn ở các dòng khớp: keys_b có thể rỗng (File B không có dòng hoặc mọi khóa trống)
+        found = indexer >= 0
+        found &= ~keys_a.isna().any(axis=1).to_numpy()
+        positions = np.full(len(keys_a), -1)
+        positions[found] = keys_b.index.to_numpy()[indexer[found]]
+        return positions
+
+    condition = " AND ".join(f"a.k{i} = b.k{i}" for i in range(len(keys_a.columns)))
+    with duckdb_connect() as con:
+        con.register("keys_a", table_a)
+        con.register("keys_b", table_b)
+        return _duckdb_positions(
+            con, f"SELECT a.pos, b.label AS value FROM keys_a a JOIN keys_b b ON {condition}", len(keys_a)
+        )
+
+def _key_index(keys):
+    """Index dùng để ghép khóa: một cột thì Index thường, nhiều cột thì MultiIndex."""
+    if keys.shape[1] == 1:
+        return pd.Index(keys.iloc[:, 0])
+    return pd.MultiIndex.from_frame(keys)
+
+
+# --- Chạy trực tiếp trên file bằng DuckDB (dữ liệu lớn hơn RAM) ---
+def _read_file_sql(path):
+    """Câu lệnh đọc file: CSV đọc mọi cột dạng chuỗi để giữ nguyên giá trị (mã số 0123 không thành 123)."""
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        return f"read_csv('{_sql_text(path)}', all_varchar = true, header = true)"
+    if lower.endswith(".parquet"):
+        return f"read_parquet('{_sql_text(path)}')"
+    raise ValueError(f"DuckDB chỉ đọc trực tiếp được file {' / '.join(DUCKDB_FILE_EXTENSIONS)}: {path}")
+
+def _copy_sql(query, path):
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        return f"COPY ({query}) TO '{_sql_text(path)}' (HEADER, DELIMITER ',')"
+    if lower.endswith(".parquet"):
+        return f"COPY ({query}) TO '{_sql_text(path)}' (FORMAT PARQUET)"
+    raise ValueError(f"DuckDB chỉ ghi trực tiếp được file {' / '.join(DUCKDB_FILE_EXTENSIONS)}: {path}")
+
+def _load_file(con, path, table):
+    """Nạp file vào bảng DuckDB (giữ thứ tự dòng, rowid là vị trí dòng trong file). Trả về {tên cột: kiểu}."""
+    con.execute(f"CREATE TABLE {table} AS SELECT * FROM {_read_file_sql(path)}")
+    return {row[0]: row[1] for row in con.execute(f"DESCRIBE {table}").fetchall()}
+
+def _numbered(table):
+    """Bảng kèm cột ROW_COL là vị trí dòng trong file."""
+    return f"(SELECT *, rowid AS {ROW_COL} FROM {table})"
+
+def _check_columns(columns, available, path):
+    missing = [column for column in columns if column not in available]
+    if missing:
+        raise ValueError(f"Không có cột {', '.join(missing)} trong {path}")
+
+def _work_database():
+    """File database tạm cho các lệnh *_file (để bảng lớn hơn RAM được lưu trên đĩa)."""
+    os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+    handle, path = tempfile.mkstemp(suffix=".duckdb", dir=DUCKDB_TEMP_DIR)
+    os.close(handle)
+    os.remove(path)
+    return path
+
+def _remove_database(path):
+    for name in (path, path + ".wal"):
+        if os.path.exists(name):
+            os.remove(name)
+
+def dedup_file(input_path, output_path, columns, threads=None, memory_limit=None):
+    """
+    Loại các dòng trùng theo các cột, giữ dòng đầu tiên (như drop_duplicate_rows với KEEP_FIRST),
+    đọc và ghi file trực tiếp bằng DuckDB. Trả về (số dòng đọc, số dòng ghi).
+    """
+    database = _work_database()
+    try:
+        with duckdb_connect(database, threads, memory_limit) as con:
+            available = _load_file(con, input_path, "data")
+            _check_columns(columns, available, input_path)
+            partition = ", ".join(_quote(column) for column in columns)
+            query = (
+                f"SELECT * EXCLUDE ({ROW_COL}, {RANK_COL}) FROM (SELECT *, row_number() OVER "
+                f"(PARTITION BY {partition} ORDER BY {ROW_COL}) AS {RANK_COL} FROM {_numbered('data')}) "
+                f"WHERE {RANK_COL} = 1 ORDER BY {ROW_COL}"
+            )
+            rows_in = con.execute("SELECT count(*) FROM data").fetchone()[0]
+            # COPY trả về số dòng đã ghi
+            rows_out = con.execute(_copy_sql(query, output_path)).fetchone()[0]
+            return rows_in, rows_out
+    finally:
+        _remove_database(database)
+
+def fill_file(path_a, path_b, output_path, keys_a, keys_b, column_pairs, overwrite=False,
+              keep_last=True, threads=None, memory_limit=None):
+    """
+    Điền các cột của File A từ File B theo khóa (như fill_columns, không chuẩn hóa khóa), đọc và ghi
+    file trực tiếp bằng DuckDB. Khóa trùng ở File B lấy dòng cuối (keep_last) hoặc dòng đầu;
+    dòng có ô khóa trống không được điền. Trả về {cột đích: số ô đã điền}.
+    """
+    targets = [target for _, target in column_pairs]
+    if len(set(targets)) != len(targets):
+        raise ValueError("Mỗi cột đích chỉ được điền từ một cột nguồn khi chạy trực tiếp trên file")
+    database = _work_database()
+    try:
+        with duckdb_connect(database, threads, memory_limit) as con:
+            columns_a = _load_file(con, path_a, "file_a")
+            columns_b = _load_file(con, path_b, "file_b")
+            _check_columns(list(keys_a) + targets, columns_a, path_a)
+            _check_columns(list(keys_b) + [source for source, _ in column_pairs], columns_b, path_b)
+
+            key_b = ", ".join(f"{_quote(column)} AS k{i}" for i, column in enumerate(keys_b))
+            sources = ", ".join(f"{_quote(source)} AS s{i}" for i, (source, _) in enumerate(column_pairs))
+            not_null = " AND ".join(f"{_quote(column)} IS NOT NULL" for column in keys_b)
+            con.execute(
+                f"CREATE TABLE lookup AS SELECT * EXCLUDE ({RANK_COL}) FROM (SELECT {key_b}, {sources}, "
+                f"row_number() OVER (PARTITION BY {', '.join(_quote(c) for c in keys_b)} "
+                f"ORDER BY {ROW_COL} {'DESC' if keep_last else 'ASC'}) AS {RANK_COL} "
+                f"FROM {_numbered('file_b')} WHERE {not_null}) WHERE {RANK_COL} = 1"
+            )
+            condition = " AND ".join(f"a.{_quote(column)} = b.k{i}" for i, column in enumerate(keys_a))
+
+            filled = {}
+            replace = []
+            for i, (source, target) in enumerate(column_pairs):
+                empty = f"(a.{_quote(target)} IS NULL OR regexp_full_match(CAST(a.{_quote(target)} AS VARCHAR), '{BLANK_PATTERN}'))"
+                fill = "b.k0 IS NOT NULL" if overwrite else f"b.k0 IS NOT NULL AND {empty}"
+                # Cột nguồn và cột đích khác kiểu (ví dụ số điền vào cột chữ của file parquet): ghi dạng chuỗi
+                value, current = f"b.s{i}", f"a.{_quote(target)}"
+                if columns_b[source] != columns_a[target]:
+                    value, current = f"CAST({value} AS VARCHAR)", f"CAST({current} AS VARCHAR)"
+                replace.append(f"CASE WHEN {fill} THEN {value} ELSE {current} END AS {_quote(target)}")
+                filled[target] = f"count(*) FILTER (WHERE {fill})"
+            query = (
+                f"SELECT a.* EXCLUDE ({ROW_COL}) REPLACE ({', '.join(replace)}) "
+                f"FROM {_numbered('file_a')} a LEFT JOIN lookup b ON {condition} ORDER BY a.{ROW_COL}"
+            )
+            con.execute(_copy_sql(query, output_path))
+            counts = con.execute(
+                f"SELECT {', '.join(filled.values())} FROM file_a a LEFT JOIN lookup b ON {condition}"
+            ).fetchone()
+            return dict(zip(filled, counts))
+    finally:
+        _remove_database(database)
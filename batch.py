@@ -0,0 +1,151 @@
+"""
+Đọc nhiều file cùng lúc (nhiều file tải lên, file .zip hoặc thư mục) và nhiều sheet của một file:
+các file / sheet được đọc song song bằng process pool, mỗi dòng được gắn tên file nguồn
+(và tên sheet), rồi ghép thành một DataFrame để làm sạch và kiểm tra trùng chung.
+Chỉ bước đọc chạy trong process con: làm sạch email dùng từ điển domain của toàn bộ dữ liệu
+và kiểm tra trùng so giữa các file, nên chạy sau khi ghép để kết quả không phụ thuộc cách chia file.
+"""
+import io
+import os
+import zipfile
+
+import pandas as pd
+
+from data_io import process_pool, read_table, sheet_names
+
+# Cột ghi tên file gốc của từng dòng khi ghép nhiều file
+SOURCE_COL = "File nguồn"
+# Cột ghi tên sheet gốc của từng dòng khi đọc nhiều sheet
+SHEET_COL = "Sheet"
+# Giá trị sheets để đọc tất cả các sheet của mỗi file
+ALL_SHEETS = "all"
+# Các loại file bảng được lấy ra từ file zip / thư mục
+TABLE_EXTENSIONS = (".xlsx", ".csv")
+
+
+class FileBatch:
+    """Nhiều file tải lên được xử lý như một file: files là danh sách (tên file, bytes)."""
+
+    def __init__(self, files):
+        self.files = list(files)
+        names = [name for name, _ in self.files]
+        self.name = ", ".join(names) if len(names) <= 3 else f"{names[0]}, ... ({len(names)} file)"
+
+    def __len__(self):
+        return len(self.files)
+
+
+def is_zip(name):
+    return name.lower().endswith(".zip")
+
+def _is_table(name):
+    base = os.path.basename(name)
+    return name.lower().endswith(TABLE_EXTENSIONS) and not base.startswith(("~$", "._"))
+
+def zip_entries(data, zip_name):
+    """Các file bảng trong file zip (bytes), dạng (zip_name/đường dẫn trong zip, bytes), theo thứ tự tên."""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = sorted(
+            info.filename for info in archive.infolist()
+            if not info.is_dir() and _is_table(info.filename) and not info.filename.startswith("__MACOSX/")
+        )
+        return [(f"{zip_name}/{name}", archive.read(name)) for name in names]
+
+def folder_files(path):
+    """Các file bảng và file zip trong thư mục (không tính thư mục con), theo thứ tự tên."""
+    return [
+        os.path.join(path, name) for name in sorted(os.listdir(path))
+        if os.path.isfile(os.path.join(path, name)) and (_is_table(name) or is_zip(name))
+    ]
+
+def expand_sources(sources):
+    """
+    Danh sách nguồn cần đọc từ các đường dẫn (file, file zip, thư mục) hoặc (tên file, bytes).
+    File zip được mở ra thành các file bên trong, thư mục được thay bằng các file trong đó.
+    """
+    expanded = []
+    for source in sources:
+        if isinstance(source, tuple):
+            name, data = source
+            expanded.extend(zip_entries(data, name) if is_zip(name) else [source])
+        elif os.path.isdir(source):
+            expanded.extend(expand_sources(folder_files(source)))
+        elif is_zip(source):
+            with open(source, "rb") as zip_file:
+                expanded.extend(zip_entries(zip_file.read(), os.path.basename(source)))
+        else:
+            expanded.append(source)
+    return expanded
+
+def source_name(source):
+    return source[0] if isinstance(source, tuple) else os.path.basename(source)
+
+def source_sheets(source):
+    """Tên các sheet của một nguồn (đường dẫn hoặc (tên file, bytes)); file CSV trả về danh sách rỗng."""
+    if isinstance(source, tuple):
+        buffer = io.BytesIO(source[1])
+        buffer.name = source[0]
+        return sheet_names(buffer)
+    return sheet_names(source)
+
+def sheet_tasks(sources, sheets=None):
+    """
+    Danh sách (nguồn, sheet) cần đọc. sheets=None: sheet đầu tiên của mỗi file (sheet = None);
+    ALL_SHEETS: mọi sheet của mỗi file; danh sách tên: các sheet đó. File CSV luôn là một phần (sheet = None).
+    """
+    tasks = []
+    for source in sources:
+        names = [] if sheets is None else source_sheets(source) if sheets == ALL_SHEETS else list(sheets)
+        tasks.extend((source, sheet) for sheet in names or [None])
+    return tasks
+
+def _read_source(source, sheet, read_options):
+    """Đọc một sheet của một nguồn (đường dẫn hoặc (tên file, bytes)) thành DataFrame (chạy trong process con)."""
+    name = source_name(source)
+    if isinstance(source, tuple):
+        source = io.BytesIO(source[1])
+        source.name = name
+    if sheet is not None:
+        read_options = dict(read_options, sheet_name=sheet)
+    try:
+        return read_table(source, drop_unnamed=False, **read_options)
+    except Exception as e:
+        raise ValueError(f"Không đọc được {name}" + (f" (sheet {sheet})" if sheet is not None else "") + f": {e}") from e
+
+def read_sources(tasks, max_workers=None, **read_options):
+    """
+    Đọc song song các phần (nguồn, sheet) của sheet_tasks, trả về danh sách DataFrame theo đúng thứ tự.
+    Số process mặc định là số CPU (không quá số phần); 1 phần hoặc 1 CPU thì đọc tuần tự.
+    """
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    if max_workers <= 1:
+        return [_read_source(source, sheet, read_options) for source, sheet in tasks]
+    with process_pool(max_workers) as executor:
+        sources, sheets = zip(*tasks)
+        return list(executor.map(_read_source, sources, sheets, [read_options] * len(tasks)))
+
+def concat_sources(frames, tasks, tag_source=True, tag_sheet=False):
+    """
+    Ghép các DataFrame đọc từ tasks, thêm cột SOURCE_COL (tên file) và / hoặc SHEET_COL (tên sheet)
+    cho từng dòng. Cột thiếu ở file / sheet nào (kể cả SHEET_COL của file CSV) thì để trống.
+    """
+    tagged = []
+    for df, (source, sheet) in zip(frames, tasks):
+        if tag_source:
+            df = df.assign(**{SOURCE_COL: source_name(source)})
+        if tag_sheet and sheet is not None:
+            df = df.assign(**{SHEET_COL: sheet})
+        tagged.append(df)
+    return pd.concat(tagged, ignore_index=True)
+
+def read_batch(sources, max_workers=None, sheets=None, tag_source=True, **read_options):
+    """
+    Đọc và ghép nhiều nguồn (đường dẫn, file zip, thư mục hoặc (tên file, bytes)) thành một DataFrame.
+    sheets: xem sheet_tasks; khi đọc nhiều sheet, cột SHEET_COL ghi tên sheet của từng dòng.
+    """
+    sources = expand_sources(sources)
+    if not sources:
+        raise ValueError("Không tìm thấy file .xlsx / .csv nào để đọc")
+    tasks = sheet_tasks(sources, sheets)
+    frames = read_sources(tasks, max_workers=max_workers, **read_options)
+    return concat_sources(frames, tasks, tag_source=tag_source, tag_sheet=sheets is not None)
@@ -0,0 +1,426 @@
+"""
+Đo hiệu năng các thao tác xử lý dữ liệu trên dữ liệu giả lập (synthetic_data.py).
+
+Mỗi thao tác chạy trong một process con riêng (fork) để đo được bộ nhớ đỉnh (peak RSS)
+của riêng thao tác đó. Kết quả (thời gian, peak RSS, số dòng/giây) được ghi ra file JSON
+để so sánh giữa các lần chạy.
+
+Ví dụ:
+    python benchmark.py --sizes 10000,100000 -o baseline.json
+    python benchmark.py --sizes 10000,100000 -o current.json --compare baseline.json
+    python benchmark.py --sizes 10000 --only fix_emails,merge_blocks --check
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from backends import BACKEND_DUCKDB, available_backends, dedup_file
+from data_io import ChunkWriter, iter_table_chunks, read_table, write_table
+from email_utils import is_valid_email, clean_and_normalize_email, valid_email_mask, clean_and_normalize_emails
+from fuzzy_dedup import find_fuzzy_duplicates
+from keep_policy import RULE_DOMAIN, RULE_FILLED, RULE_NEWEST, KeepRule, rank_keep
+from master_index import MasterIndex
+from profiling import memory_kb, peak_rss_kb
+from operations import (
+    KEEP_FIRST,
+    KEEP_GMAIL,
+    fix_emails,
+    find_duplicates,
+    drop_duplicate_rows,
+    drop_duplicates_ranked,
+    merge_blocks,
+    merge_blocks_legacy,
+    split_multiline_rows,
+    split_multiline_rows_legacy,
+    fill_columns,
+    fill_from_reference,
+    fill_from_reference_legacy,
+)
+from synthetic_data import generate_contacts, generate_blocks, generate_fill_pair
+
+DEFAULT_SIZES = [10_000, 100_000]
+# Số dòng tối đa của một sheet Excel (không tính dòng tiêu đề)
+EXCEL_MAX_ROWS = 1_048_575
+# Thao tác chậm hơn baseline quá tỉ lệ này bị coi là chậm đi
+DEFAULT_TOLERANCE = 0.2
+# Số dòng tối đa khi đối chiếu kết quả với các hàm cũ (*_legacy) chạy từng dòng
+CHECK_MAX_ROWS = 20_000
+
+
+# --- Dữ liệu đầu vào ---
+def prepare_inputs(rows, work_dir, seed=0):
+    """Sinh dữ liệu và các file mẫu cho một kích thước (không tính vào thời gian đo)."""
+    contacts = generate_contacts(rows, seed=seed)
+    df_a, df_b = generate_fill_pair(rows, seed=seed)
+    inputs = {
+        "rows": rows,
+        "work_dir": work_dir,
+        "contacts": contacts,
+        "blocks": generate_blocks(rows, seed=seed),
+        "fill_a": df_a,
+        "fill_b": df_b,
+        "csv_path": os.path.join(work_dir, f"contacts_{rows}.csv"),
+        "xlsx_path": os.path.join(work_dir, f"contacts_{rows}.xlsx"),
+        "master_path": os.path.join(work_dir, f"master_{rows}.sqlite"),
+    }
+    write_table(contacts, inputs["csv_path"])
+    if rows <= EXCEL_MAX_ROWS:
+        with ChunkWriter(inputs["xlsx_path"]) as writer:
+            writer.write(contacts)
+    with MasterIndex(inputs["master_path"]) as index:
+        index.add(contacts, ["Mã số thuế"], source="benchmark")
+    return inputs
+
+def _output_path(inputs, ext):
+    return os.path.join(inputs["work_dir"], f"output_{os.getpid()}.{ext}")
+
+
+# --- Các thao tác được đo: nhận inputs, trả về số dòng kết quả ---
+def bench_valid_email_mask(inputs):
+    return int(valid_email_mask(inputs["contacts"]["Email"]).sum())
+
+def bench_fix_emails(inputs):
+    return len(fix_emails(inputs["contacts"], correct_domains=False)[0])
+
+def bench_fix_emails_domains(inputs):
+    return len(fix_emails(inputs["contacts"], correct_domains=True)[0])
+
+def bench_find_duplicates(inputs):
+    return len(find_duplicates(inputs["contacts"], ["Mã số thuế"], sort=True))
+
+def bench_find_duplicates_normalized(inputs):
+    return len(find_duplicates(inputs["contacts"], ["Tên"], normalize=True))
+
+def bench_drop_duplicates_first(inputs):
+    return len(drop_duplicate_rows(inputs["contacts"], ["Mã số thuế"], KEEP_FIRST))
+
+def bench_drop_duplicates_gmail(inputs):
+    return len(drop_duplicate_rows(inputs["contacts"], ["Mã số thuế"], KEEP_GMAIL))
+
+def bench_drop_duplicates_ranked(inputs):
+    rules = [KeepRule(RULE_DOMAIN, "Email", ("gmail.com",)), KeepRule(RULE_FILLED), KeepRule(RULE_NEWEST)]
+    return len(drop_duplicates_ranked(inputs["contacts"], ["Mã số thuế"], rules)[0])
+
+def bench_fuzzy_duplicates(inputs):
+    return len(find_fuzzy_duplicates(inputs["contacts"], "Tên"))
+
+def bench_merge_blocks(inputs):
+    return len(merge_blocks(inputs["blocks"], "Tên", "Điện thoại"))
+
+def bench_split_multiline(inputs):
+    return len(split_multiline_rows(inputs["contacts"], ["Điện thoại"]))
+
+def bench_fill_columns(inputs):
+    df_result, _ = fill_columns(
+        inputs["fill_a"], inputs["fill_b"], ["Mã số thuế"], ["MST"], [("Email liên hệ", "Email")]
+    )
+    return len(df_result)
+
+def bench_find_duplicates_duckdb(inputs):
+    return len(find_duplicates(inputs["contacts"], ["Mã số thuế"], sort=True, backend=BACKEND_DUCKDB))
+
+def bench_drop_duplicates_duckdb(inputs):
+    return len(drop_duplicate_rows(inputs["contacts"], ["Mã số thuế"], KEEP_FIRST, backend=BACKEND_DUCKDB))
+
+def bench_fill_columns_duckdb(inputs):
+    df_result, _ = fill_columns(
+        inputs["fill_a"], inputs["fill_b"], ["Mã số thuế"], ["MST"], [("Email liên hệ", "Email")],
+        backend=BACKEND_DUCKDB
+    )
+    return len(df_result)
+
+def bench_dedup_file_duckdb(inputs):
+    return dedup_file(inputs["csv_path"], _output_path(inputs, "csv"), ["Mã số thuế"])[1]
+
+def bench_master_lookup(inputs):
+    with MasterIndex(inputs["master_path"]) as index:
+        return int(index.lookup(inputs["contacts"], ["Mã số thuế"]).iloc[:, 0].sum())
+
+def bench_write_xlsx(inputs):
+    write_table(inputs["contacts"], _output_path(inputs, "xlsx"))
+    return inputs["rows"]
+
+def bench_write_xlsx_stream(inputs):
+    with ChunkWriter(_output_path(inputs, "xlsx")) as writer:
+        writer.write(inputs["contacts"])
+    return writer.rows
+
+def bench_read_xlsx(inputs):
+    return len(read_table(inputs["xlsx_path"]))
+
+def bench_read_xlsx_chunks(inputs):
+    return sum(len(df) for df in iter_table_chunks(inputs["xlsx_path"], dtype=str))
+
+def bench_write_csv(inputs):
+    write_table(inputs["contacts"], _output_path(inputs, "csv"))
+    return inputs["rows"]
+
+def bench_read_csv(inputs):
+    return len(read_table(inputs["csv_path"]))
+
+BENCHMARKS = {
+    "valid_email_mask": bench_valid_email_mask,
+    "fix_emails": bench_fix_emails,
+    "fix_emails_domains": bench_fix_emails_domains,
+    "find_duplicates": bench_find_duplicates,
+    "find_duplicates_normalized": bench_find_duplicates_normalized,
+    "drop_duplicates_first": bench_drop_duplicates_first,
+    "drop_duplicates_gmail": bench_drop_duplicates_gmail,
+    "drop_duplicates_ranked": bench_drop_duplicates_ranked,
+    "fuzzy_duplicates": bench_fuzzy_duplicates,
+    "merge_blocks": bench_merge_blocks,
+    "split_multiline": bench_split_multiline,
+    "fill_columns": bench_fill_columns,
+    "find_duplicates_duckdb": bench_find_duplicates_duckdb,
+    "drop_duplicates_duckdb": bench_drop_duplicates_duckdb,
+    "fill_columns_duckdb": bench_fill_columns_duckdb,
+    "dedup_file_duckdb": bench_dedup_file_duckdb,
+    "master_lookup": bench_master_lookup,
+    "write_xlsx": bench_write_xlsx,
+    "write_xlsx_stream": bench_write_xlsx_stream,
+    "read_xlsx": bench_read_xlsx,
+    "read_xlsx_chunks": bench_read_xlsx_chunks,
+    "write_csv": bench_write_csv,
+    "read_csv": bench_read_csv,
+}
+# Các thao tác đọc/ghi Excel, bỏ qua khi vượt số dòng tối đa của Excel
+EXCEL_BENCHMARKS = {"write_xlsx", "write_xlsx_stream", "read_xlsx", "read_xlsx_chunks"}
+# Các thao tác cần DuckDB, bỏ qua khi chưa cài gói duckdb
+DUCKDB_BENCHMARKS = {"find_duplicates_duckdb", "drop_duplicates_duckdb", "fill_columns_duckdb", "dedup_file_duckdb"}
+
+
+# --- Đo thời gian và bộ nhớ ---
+def _run_child(name, inputs, queue):
+    try:
+        rss_before = memory_kb("VmRSS")
+        start = time.perf_counter()
+        rows_out = BENCHMARKS[name](inputs)
+        seconds = time.perf_counter() - start
+        queue.put({"seconds": seconds, "rows_out": rows_out, "peak_rss_kb": peak_rss_kb(), "rss_before_kb": rss_before})
+    except BaseException as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+def measure(name, inputs):
+    """Chạy một thao tác trong process con (fork) và trả về thời gian, peak RSS."""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=_run_child, args=(name, inputs, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def run_benchmarks(sizes, names, repeat=1, seed=0, log=print):
+    """Chạy các thao tác ở từng kích thước, mỗi thao tác lấy lần nhanh nhất trong repeat lần."""
+    results = []
+    for rows in sizes:
+        work_dir = tempfile.mkdtemp(prefix="cleandata_bench_")
+        try:
+            start = time.perf_counter()
+            inputs = prepare_inputs(rows, work_dir, seed=seed)
+            log(f"{rows} dòng: chuẩn bị dữ liệu {time.perf_counter() - start:.1f}s")
+            for name in names:
+                if name in EXCEL_BENCHMARKS and rows > EXCEL_MAX_ROWS:
+                    log(f"    {name:<24} bỏ qua (vượt {EXCEL_MAX_ROWS} dòng của Excel)")
+                    continue
+                if name in DUCKDB_BENCHMARKS and BACKEND_DUCKDB not in available_backends():
+                    log(f"    {name:<24} bỏ qua (chưa cài duckdb)")
+                    continue
+                runs = [measure(name, inputs) for _ in range(repeat)]
+                errors = [run["error"] for run in runs if "error" in run]
+                if errors:
+                    log(f"    {name:<24} lỗi: {errors[0]}")
+                    results.append({"operation": name, "rows": rows, "error": errors[0]})
+                    continue
+                best = min(runs, key=lambda run: run["seconds"])
+                peak_rss_mb = max(run["peak_rss_kb"] for run in runs) / 1024
+                result = {
+                    "operation": name,
+                    "rows": rows,
+                    "seconds": round(best["seconds"], 4),
+                    "rows_per_sec": round(rows / best["seconds"], 1) if best["seconds"] else None,
+                    "peak_rss_mb": round(peak_rss_mb, 1),
+                    "rss_before_mb": round((best["rss_before_kb"] or 0) / 1024, 1),
+                    "rows_out": best["rows_out"],
+                }
+                results.append(result)
+                log(
+                    f"    {name:<24} {result['seconds']:>9.3f}s {result['rows_per_sec'] or 0:>14,.0f} dòng/s"
+                    f" {result['peak_rss_mb']:>9.1f} MB"
+                )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+# --- Đối chiếu kết quả với các hàm cũ ---
+def _same_frame(df_new, df_old):
+    return df_new.astype(object).fillna("").equals(df_old.astype(object).fillna(""))
+
+def check_equivalence(rows, seed=0):
+    """So sánh kết quả các hàm theo cột với các hàm cũ (*_legacy, từng dòng). Trả về {tên: đúng/sai}."""
+    rows = min(rows, CHECK_MAX_ROWS)
+    contacts = generate_contacts(rows, seed=seed)
+    checks = {}
+
+    emails = contacts["Email"]
+    checks["valid_email_mask"] = valid_email_mask(emails).tolist() == emails.map(is_valid_email).tolist()
+
+    invalid = contacts[~valid_email_mask(emails)]
+    per_row = [clean_and_normalize_email(email, name) for email, name in zip(invalid["Email"], invalid["Tên"])]
+    checks["clean_and_normalize_emails"] = clean_and_normalize_emails(invalid["Email"], invalid["Tên"]).tolist() == per_row
+
+    checks["split_multiline_rows"] = _same_frame(
+        split_multiline_rows(contacts, ["Điện thoại"]).reset_index(drop=True),
+        split_multiline_rows_legacy(contacts, ["Điện thoại"]).reset_index(drop=True),
+    )
+
+    blocks = generate_blocks(rows, seed=seed)
+    checks["merge_blocks"] = _same_frame(
+        merge_blocks(blocks, "Tên", "Điện thoại"), merge_blocks_legacy(blocks, "Tên", "Điện thoại")
+    )
+
+    # Hàm cũ coi các khóa trống là trùng nhau, nên chỉ đối chiếu trên khóa có giá trị
+    df_a, df_b = generate_fill_pair(rows, seed=seed)
+    args = (df_a, df_b, "Mã số thuế", "MST", "Email liên hệ", "Email")
+    new_df, new_count = fill_from_reference(*args)
+    old_df, old_count = fill_from_reference_legacy(*args)
+    checks["fill_from_reference"] = new_count == old_count and _same_frame(new_df, old_df)
+
+    # Ngày dạng ISO (đọc với dtype=str) và ngày/tháng/năm: "Dòng mới nhất" phải chọn đúng ngày muộn nhất
+    dated = pd.DataFrame({
+        "Tên": ["A", "A", "B", "B"],
+        "Ngày": ["2023-05-01 00:00:00", "2023-01-06", "06/01/2023", "01/05/2023"],
+    }, dtype="str")
+    kept, _ = rank_keep(dated, dated[["Tên"]], [KeepRule(RULE_NEWEST, "Ngày")])
+    checks["rank_keep (ngày mới nhất)"] = kept.tolist() == [0, 3]
+
+    # File B không có dòng nào hoặc mọi khóa đều trống: không điền gì
+    pairs = [("Email liên hệ", "Email")]
+    blank_b = df_b.assign(MST=np.nan)
+    empty_results = [
+        fill_columns(df_a, b, ["Mã số thuế"], ["MST"], pairs) for b in (df_b.iloc[:0], blank_b)
+    ]
+    checks["fill_columns (File B rỗng)"] = all(
+        _same_frame(result, df_a) and not masks["Email"].any() for result, masks in empty_results
+    )
+
+    # Engine DuckDB phải cho cùng kết quả với pandas
+    if BACKEND_DUCKDB in available_backends():
+        columns = ["Tên", "Thành phố"]
+        checks["find_duplicates (duckdb)"] = find_duplicates(contacts, columns, sort=True).equals(
+            find_duplicates(contacts, columns, sort=True, backend=BACKEND_DUCKDB)
+        )
+        checks["drop_duplicate_rows (duckdb)"] = drop_duplicate_rows(contacts, columns, KEEP_GMAIL).equals(
+            drop_duplicate_rows(contacts, columns, KEEP_GMAIL, backend=BACKEND_DUCKDB)
+        )
+        pandas_df, _ = fill_columns(df_a, df_b, ["Mã số thuế"], ["MST"], pairs, normalize=True)
+        duckdb_df, _ = fill_columns(df_a, df_b, ["Mã số thuế"], ["MST"], pairs, normalize=True, backend=BACKEND_DUCKDB)
+        checks["fill_columns (duckdb)"] = pandas_df.equals(duckdb_df)
+        checks["fill_columns (duckdb, File B rỗng)"] = all(
+            fill_columns(df_a, b, ["Mã số thuế"], ["MST"], pairs, backend=BACKEND_DUCKDB)[0].equals(result)
+            for b, (result, _) in zip((df_b.iloc[:0], blank_b), empty_results)
+        )
+    return checks
+
+
+# --- Lưu và so sánh kết quả ---
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment_info():
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def compare_results(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    So sánh thời gian với baseline theo (thao tác, số dòng).
+    Trả về danh sách (thao tác, số dòng, giây baseline, giây hiện tại, tỉ lệ, chậm đi?).
+    """
+    old = {(r["operation"], r["rows"]): r for r in baseline["results"] if "seconds" in r}
+    rows = []
+    for result in current["results"]:
+        key = (result["operation"], result["rows"])
+        if "seconds" not in result or key not in old:
+            continue
+        ratio = result["seconds"] / old[key]["seconds"] if old[key]["seconds"] else float("inf")
+        rows.append((*key, old[key]["seconds"], result["seconds"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng các thao tác làm sạch dữ liệu.")
+    parser.add_argument(
+        "--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+        help="Các kích thước dữ liệu (số dòng), cách nhau bởi dấu phẩy, ví dụ 10000,100000,1000000"
+    )
+    parser.add_argument("--only", help=f"Chỉ chạy các thao tác (cách nhau bởi dấu phẩy): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần chạy mỗi thao tác, lấy lần nhanh nhất")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="So sánh với file JSON kết quả trước đó")
+    parser.add_argument(
+        "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+        help=f"Tỉ lệ chậm hơn cho phép khi so sánh (mặc định: {DEFAULT_TOLERANCE})"
+    )
+    parser.add_argument("--check", action="store_true", help="Đối chiếu kết quả với các hàm cũ (*_legacy)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    names = [name.strip() for name in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Thao tác không hợp lệ: {', '.join(unknown)}")
+    exit_code = 0
+
+    if args.check:
+        checks = check_equivalence(min(sizes), seed=args.seed)
+        for name, ok in checks.items():
+            print(f"    kiểm tra {name:<28} {'OK' if ok else 'KHÁC KẾT QUẢ'}")
+        if not all(checks.values()):
+            exit_code = 1
+
+    report = {"environment": environment_info(), "results": run_benchmarks(sizes, names, args.repeat, args.seed)}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Đã ghi {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"So sánh với {args.compare} ({baseline['environment'].get('git_commit')}):")
+        for operation, rows, old, new, ratio, slower in compare_results(report, baseline, args.tolerance):
+            flag = "  <-- chậm hơn" if slower else ""
+            print(f"    {operation:<24} {rows:>9} {old:>9.3f}s -> {new:>9.3f}s  x{ratio:.2f}{flag}")
+            if slower:
+                exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
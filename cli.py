@@ -0,0 +1,473 @@
+"""
+Chạy các công cụ làm sạch dữ liệu từ dòng lệnh (không cần Streamlit).
+
+Ví dụ:
+    python cli.py DuLieuLienHe.xlsx -o ketqua.xlsx --steps clean-email,dedup --dedup-cols "Mã số thuế"
+    python cli.py BigExport.xlsx -o ketqua.csv --steps clean-email,split --split-cols "Điện thoại" --stream 50000
+    python cli.py ChiNhanh/ -o TongHop.xlsx --steps clean-email,dedup --dedup-cols "Mã số thuế" --workers 4
+    python cli.py TheoVung.xlsx -o TheoVung_Sach.xlsx --steps clean-email --sheets all --by-sheet
+    python cli.py BigExport.csv -o BigExport_Dedup.parquet --steps dedup --dedup-cols "Mã số thuế" --out-of-core
+    python cli.py FileA.xlsx -o FileA_Filled.xlsx --steps fill --fill-file FileB.xlsx \\
+        --key-a "Mã số thuế" --key-b "MST" --source-col "Email,Điện thoại" --target-col "Email,Điện thoại" --normalize
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+from backends import BACKEND_DUCKDB, BACKEND_PANDAS, BACKENDS, DUCKDB_FILE_EXTENSIONS, available_backends, dedup_file, fill_file
+from batch import ALL_SHEETS, SHEET_COL, is_zip, read_batch
+from email_utils import DomainCorrector, email_domains
+from data_io import ChunkWriter, compact_frame, frame_nbytes, iter_table_chunks, read_table, write_table
+from master_index import DEFAULT_MASTER_PATH, IN_MASTER_COL, MasterIndex, check_against_master
+from fuzzy_dedup import DEFAULT_THRESHOLD, find_fuzzy_duplicates
+from keep_policy import RULE_DOMAIN, RULE_MAX, RULE_MIN, RULE_FILLED, RULE_NEWEST, KeepRule, decision_counts
+from operations import (
+    KEEP_FIRST,
+    KEEP_GMAIL,
+    KEEP_COMPARE,
+    KEEP_RANKED,
+    COMPARE_MAX,
+    COMPARE_MIN,
+    fix_emails,
+    find_duplicates,
+    keep_rules,
+    drop_duplicates_ranked,
+    split_into_chunks,
+    merge_blocks,
+    split_multiline_rows,
+    DUPLICATE_LAST,
+    DUPLICATE_ERROR,
+    DUPLICATE_KEY_POLICIES,
+    fill_columns,
+)
+
+KEEP_CHOICES = {"first": KEEP_FIRST, "gmail": KEEP_GMAIL, "max": KEEP_COMPARE, "min": KEEP_COMPARE, "ranked": KEEP_RANKED}
+# Tên tiêu chí trong --keep-rules
+RULE_NAMES = {"domain": RULE_DOMAIN, "max": RULE_MAX, "min": RULE_MIN, "filled": RULE_FILLED, "newest": RULE_NEWEST}
+
+
+def log(message):
+    """In tiến trình ra stderr ngay lập tức."""
+    print(message, file=sys.stderr, flush=True)
+
+def split_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+def parse_keep_rules(value, email_col="Email"):
+    """
+    Đọc --keep-rules dạng "domain=gmail.com,yahoo.com;max=Doanh thu;filled;newest=Ngày cập nhật"
+    thành danh sách KeepRule theo đúng thứ tự. newest không có cột: dòng nằm sau cùng là mới nhất.
+    """
+    rules = []
+    for item in (value or "").split(";"):
+        name, _, argument = item.partition("=")
+        name, argument = name.strip().lower(), argument.strip() or None
+        if not name:
+            continue
+        if name not in RULE_NAMES:
+            raise SystemExit(f"Tiêu chí không hợp lệ trong --keep-rules: {name} (chọn trong: {', '.join(RULE_NAMES)})")
+        kind = RULE_NAMES[name]
+        if kind == RULE_DOMAIN:
+            rules.append(KeepRule(kind, email_col, tuple(split_list(argument or "gmail.com"))))
+        elif kind in (RULE_MAX, RULE_MIN) and not argument:
+            raise SystemExit(f"Tiêu chí {name} trong --keep-rules cần tên cột, ví dụ {name}=Doanh thu")
+        else:
+            rules.append(KeepRule(kind, argument if kind != RULE_FILLED else None))
+    return rules
+
+def require(args, *names):
+    missing = [f"--{name.replace('_', '-')}" for name in names if not getattr(args, name)]
+    if missing:
+        raise SystemExit(f"Thiếu tham số: {', '.join(missing)}")
+
+
+# --- Các bước xử lý: nhận DataFrame + args, trả về DataFrame ---
+def step_clean_email(df, args):
+    df_fixed, df_compare = fix_emails(
+        df, email_col=args.email_col, name_col=args.name_col, correct_domains=not args.no_domain_fix,
+        corrector=args.domain_corrector
+    )
+    log(f"    đã sửa {len(df_compare)} email")
+    return df_fixed
+
+def step_duplicates(df, args):
+    require(args, "dedup_cols")
+    return find_duplicates(
+        df, split_list(args.dedup_cols), sort=args.sort, normalize=args.normalize, backend=args.backend
+    )
+
+def step_fuzzy_duplicates(df, args):
+    require(args, "fuzzy_col")
+    return find_fuzzy_duplicates(df, args.fuzzy_col, threshold=args.threshold)
+
+def step_dedup(df, args):
+    require(args, "dedup_cols")
+    if args.keep in ("max", "min"):
+        require(args, "compare_col")
+    if args.keep == "ranked":
+        require(args, "keep_rules")
+    compare_type = COMPARE_MIN if args.keep == "min" else COMPARE_MAX
+    rules = keep_rules(
+        KEEP_CHOICES[args.keep], args.compare_col, compare_type, parse_keep_rules(args.keep_rules, args.email_col)
+    )
+    df_kept, decided_by = drop_duplicates_ranked(
+        df, split_list(args.dedup_cols), rules, normalize=args.normalize, backend=args.backend
+    )
+    for rule, groups in decision_counts(decided_by).itertuples(index=False):
+        log(f"    {groups} nhóm trùng được quyết định bởi: {rule}")
+    return df_kept
+
+def step_master(df, args):
+    require(args, "master_cols")
+    with MasterIndex(args.master_db) as index:
+        df_result, added = check_against_master(
+            df, split_list(args.master_cols), index, add_new=args.master_add, source=input_label(args.input)
+        )
+    log(f"    {int(df_result[IN_MASTER_COL].sum())} dòng đã có trong master, thêm {added} khóa mới")
+    return df_result[~df_result[IN_MASTER_COL]] if args.new_only else df_result
+
+def step_merge(df, args):
+    require(args, "x_col", "y_col")
+    return merge_blocks(df, args.x_col, args.y_col)
+
+def step_split(df, args):
+    require(args, "split_cols")
+    return split_multiline_rows(df, split_list(args.split_cols))
+
+def step_fill(df, args):
+    require(args, "fill_file", "key_a", "key_b", "source_col", "target_col")
+    keys_a, keys_b = split_list(args.key_a), split_list(args.key_b)
+    sources, targets = split_list(args.source_col), split_list(args.target_col)
+    if len(keys_a) != len(keys_b) or len(sources) != len(targets):
+        raise SystemExit("--key-a/--key-b và --source-col/--target-col phải có cùng số cột")
+    df_b = read_table(args.fill_file)
+    try:
+        df_result, filled_masks = fill_columns(
+            df, df_b, keys_a, keys_b, list(zip(sources, targets)), overwrite=args.overwrite,
+            normalize=args.normalize, duplicate_keys=args.duplicate_keys, backend=args.backend
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    for target, mask in filled_masks.items():
+        log(f"    {target}: đã điền {int(mask.sum())} dòng")
+    return df_result
+
+STEPS = {
+    "clean-email": step_clean_email,
+    "duplicates": step_duplicates,
+    "fuzzy-duplicates": step_fuzzy_duplicates,
+    "dedup": step_dedup,
+    "master": step_master,
+    "merge": step_merge,
+    "split": step_split,
+    "fill": step_fill,
+}
+# Các bước xử lý độc lập từng dòng, có thể chạy trên từng phần của file (--stream)
+CHUNKABLE_STEPS = {"clean-email", "split"}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Chạy các công cụ làm sạch dữ liệu (Clean Email, Check duplicate, Merge, Split, Fill) trên file."
+    )
+    parser.add_argument(
+        "input", nargs="+",
+        help="File đầu vào (.xlsx hoặc .csv), file .zip hoặc thư mục. Nhiều file được đọc song song "
+             "và ghép lại, cột \"File nguồn\" ghi file gốc của từng dòng"
+    )
+    parser.add_argument("-o", "--output", required=True, help="File kết quả (.xlsx, .csv hoặc .parquet)")
+    parser.add_argument(
+        "--steps", required=True,
+        help=f"Các bước chạy lần lượt, cách nhau bởi dấu phẩy: {', '.join(STEPS)}"
+    )
+    parser.add_argument("--chunk-size", type=int, help="Chia kết quả thành nhiều file, mỗi file tối đa N dòng")
+    parser.add_argument(
+        "--stream", type=int, metavar="N",
+        help=f"Đọc, xử lý và ghi từng phần N dòng (chỉ cho các bước: {', '.join(sorted(CHUNKABLE_STEPS))})"
+    )
+    parser.add_argument("--workers", type=int, help="Số process đọc file khi có nhiều file, số luồng DuckDB khi --out-of-core (mặc định: số CPU)")
+    parser.add_argument(
+        "--sheets",
+        help=f"Các sheet cần đọc, cách nhau bởi dấu phẩy, hoặc \"{ALL_SHEETS}\" cho tất cả; "
+             f"nhiều sheet được đọc song song và ghép lại, cột \"{SHEET_COL}\" ghi sheet gốc của từng dòng"
+    )
+    parser.add_argument(
+        "--by-sheet", action="store_true",
+        help=f"Ghi kết quả .xlsx mỗi sheet gốc (cột \"{SHEET_COL}\") thành một sheet"
+    )
+    parser.add_argument(
+        "--backend", choices=BACKENDS, default=BACKEND_PANDAS,
+        help="Engine so khóa cho duplicates, dedup, fill (kết quả như nhau; duckdb chạy nhiều luồng, cần cài gói duckdb)"
+    )
+    parser.add_argument(
+        "--out-of-core", action="store_true",
+        help="Chạy dedup (--keep first) / fill trực tiếp trên file .csv / .parquet bằng DuckDB, "
+             "không đọc cả file vào bộ nhớ (dữ liệu lớn hơn RAM)"
+    )
+    parser.add_argument("--memory-limit", help="Giới hạn bộ nhớ của DuckDB khi --out-of-core, ví dụ 4GB")
+    parser.add_argument("--str", dest="as_str", action="store_true", help="Đọc tất cả các cột dưới dạng chuỗi")
+    parser.add_argument(
+        "--compact", action="store_true",
+        help="Thu gọn bộ nhớ sau khi đọc: cột lặp lại nhiều dạng category, chuỗi Arrow, kiểu số nhỏ (không dùng với --stream)"
+    )
+
+    group = parser.add_argument_group("clean-email")
+    group.add_argument("--email-col", default="Email", help="Cột email (mặc định: Email)")
+    group.add_argument("--name-col", default="Tên", help="Cột tên dùng tạo email mặc định (mặc định: Tên)")
+    group.add_argument(
+        "--no-domain-fix", action="store_true",
+        help="Không sửa lỗi chính tả domain (gmial.com, gmail.con, ...)"
+    )
+
+    group = parser.add_argument_group("duplicates / dedup")
+    group.add_argument("--dedup-cols", help="Các cột kiểm tra trùng, cách nhau bởi dấu phẩy")
+    group.add_argument("--sort", action="store_true", help="Sắp xếp các dòng trùng lại gần nhau")
+    group.add_argument("--keep", choices=list(KEEP_CHOICES), default="first", help="Cách giữ dòng trùng")
+    group.add_argument("--compare-col", help="Cột so sánh khi --keep max/min")
+    group.add_argument(
+        "--keep-rules",
+        help="Các tiêu chí khi --keep ranked, theo thứ tự ưu tiên, cách nhau bởi dấu chấm phẩy: "
+             "domain=gmail.com,yahoo.com (dùng --email-col); max=<cột>; min=<cột>; filled (nhiều ô có dữ liệu nhất); "
+             "newest=<cột ngày> (bỏ trống cột: dòng nằm sau cùng). Ví dụ: \"domain=gmail.com;filled;newest\""
+    )
+    group.add_argument(
+        "--normalize", action="store_true",
+        help="Chuẩn hóa cột kiểm tra trùng (duplicates, dedup) và cột khóa (fill) trước khi so: "
+             "bỏ dấu, bỏ ký tự ẩn, không phân biệt hoa/thường, gộp khoảng trắng"
+    )
+
+    group = parser.add_argument_group("fuzzy-duplicates")
+    group.add_argument("--fuzzy-col", help="Cột tên cần tìm trùng gần đúng")
+    group.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD,
+        help=f"Ngưỡng độ giống từ 0 đến 1 (mặc định: {DEFAULT_THRESHOLD})"
+    )
+
+    group = parser.add_argument_group("master")
+    group.add_argument("--master-db", default=DEFAULT_MASTER_PATH, help=f"File chỉ mục master (mặc định: {DEFAULT_MASTER_PATH})")
+    group.add_argument("--master-cols", help="Các cột khóa kiểm tra với master, cách nhau bởi dấu phẩy")
+    group.add_argument("--master-add", action="store_true", help="Thêm khóa của các dòng mới vào master")
+    group.add_argument("--new-only", action="store_true", help="Chỉ giữ các dòng chưa có trong master")
+
+    group = parser.add_argument_group("merge")
+    group.add_argument("--x-col", help="Cột xác định khối (X)")
+    group.add_argument("--y-col", help="Cột gom thông tin (Y)")
+
+    group = parser.add_argument_group("split")
+    group.add_argument("--split-cols", help="Các cột có ô nhiều dòng cần tách, cách nhau bởi dấu phẩy")
+
+    group = parser.add_argument_group("fill")
+    group.add_argument("--fill-file", help="File B (nguồn dữ liệu)")
+    group.add_argument("--key-a", help="Các cột kiểm tra ở File A, cách nhau bởi dấu phẩy")
+    group.add_argument("--key-b", help="Các cột kiểm tra ở File B (cùng thứ tự với --key-a)")
+    group.add_argument("--source-col", help="Các cột lấy dữ liệu từ File B, cách nhau bởi dấu phẩy")
+    group.add_argument("--target-col", help="Các cột cần điền ở File A (cùng thứ tự với --source-col)")
+    group.add_argument("--overwrite", action="store_true", help="Ghi đè dữ liệu đã có trong File A")
+    group.add_argument(
+        "--duplicate-keys", choices=DUPLICATE_KEY_POLICIES, default=DUPLICATE_KEY_POLICIES[0],
+        help="Khi File B trùng giá trị kiểm tra: lấy dòng cuối (last), đầu (first) hoặc báo lỗi (error)"
+    )
+    # Từ điển sửa domain dùng chung cho mọi phần khi --stream (xem run_streaming)
+    parser.set_defaults(domain_corrector=None)
+    return parser
+
+def input_label(inputs):
+    """Tên nguồn ghi vào master: tên file nếu chỉ có một file đầu vào."""
+    return os.path.basename(os.path.normpath(inputs[0])) if len(inputs) == 1 else f"{len(inputs)} nguồn"
+
+def is_single_file(inputs):
+    return len(inputs) == 1 and os.path.isfile(inputs[0]) and not is_zip(inputs[0])
+
+def read_input(args, steps=()):
+    """Đọc một file, hoặc đọc song song và ghép nhiều file (nhiều đường dẫn, file zip, thư mục)."""
+    read_options = {"dtype": str} if args.as_str else {}
+    if not args.as_str and "master" in steps and args.master_cols:
+        # Cột khóa master luôn đọc dạng chuỗi như trang Master của app (mã số thuế 0303... giữ số 0 đầu),
+        # để khóa thêm từ app và từ CLI khớp nhau
+        read_options["dtype"] = {column: str for column in split_list(args.master_cols)}
+    sheets = None
+    if args.sheets:
+        sheets = ALL_SHEETS if args.sheets == ALL_SHEETS else split_list(args.sheets)
+    if is_single_file(args.input):
+        if sheets is not None and (sheets == ALL_SHEETS or len(sheets) > 1):
+            return read_batch(args.input, max_workers=args.workers, sheets=sheets, tag_source=False, **read_options)
+        if sheets is not None:
+            read_options["sheet_name"] = sheets[0]
+        return read_table(args.input[0], **read_options)
+    return read_batch(args.input, max_workers=args.workers, sheets=sheets, **read_options)
+
+def write_output(df, path, chunk_size=None, group_column=None):
+    """
+    Ghi kết quả, chia thành nhiều file <tên>_<i>.<đuôi> nếu có chunk_size.
+    Với group_column, file .xlsx có mỗi giá trị của cột đó một sheet.
+    """
+    if not chunk_size:
+        write_table(df, path, group_column=group_column)
+        return [path]
+    root, ext = os.path.splitext(path)
+    paths = []
+    for i, df_chunk in enumerate(split_into_chunks(df, chunk_size)):
+        chunk_path = f"{root}_{i+1}{ext}"
+        write_table(df_chunk, chunk_path)
+        paths.append(chunk_path)
+    return paths
+
+def count_email_domains(args, steps, dtype):
+    """
+    Lượt đọc đầu khi --stream: đếm domain của các email hợp lệ trong cả file (sau các bước đứng trước
+    clean-email) để mọi phần dùng cùng một từ điển sửa domain, cho kết quả giống khi đọc cả file.
+    """
+    before = steps[:steps.index("clean-email")]
+    counts = collections.Counter()
+    for df in iter_table_chunks(args.input[0], chunk_size=args.stream, dtype=dtype):
+        for name in before:
+            df = STEPS[name](df, args)
+        counts.update(email_domains(df[args.email_col]).value_counts().to_dict())
+    return counts
+
+def run_streaming(args, steps):
+    """Đọc file theo từng phần, chạy các bước trên mỗi phần và ghi nối tiếp ra file kết quả."""
+    dtype = str if args.as_str else None
+    rows_in = 0
+    start = time.perf_counter()
+    if "clean-email" in steps and not args.no_domain_fix:
+        log(f"Đếm domain email trong {args.input[0]} ...")
+        args.domain_corrector = DomainCorrector(count_email_domains(args, steps, dtype))
+    log(f"Đọc theo từng phần {args.stream} dòng: {args.input[0]} ...")
+    with ChunkWriter(args.output) as writer:
+        for i, df in enumerate(iter_table_chunks(args.input[0], chunk_size=args.stream, dtype=dtype), start=1):
+            rows_in += df.shape[0]
+            for name in steps:
+                df = STEPS[name](df, args)
+            writer.write(df)
+            elapsed = time.perf_counter() - start
+            log(f"    phần {i}: {rows_in} dòng đọc, {writer.rows} dòng ghi ({rows_in / elapsed:,.0f} dòng/s)")
+    return rows_in
+
+# Các bước chạy được trực tiếp trên file khi --out-of-core
+OUT_OF_CORE_STEPS = ("dedup", "fill")
+
+def run_out_of_core(args, steps):
+    """Chạy lần lượt các bước dedup / fill bằng DuckDB từ file sang file; bước giữa ghi ra file .parquet tạm."""
+    source = args.input[0]
+    temp_files = []
+    try:
+        for i, name in enumerate(steps, start=1):
+            start = time.perf_counter()
+            log(f"[{i}/{len(steps)}] {name} (DuckDB) ...")
+            if i < len(steps):
+                target = f"{args.output}.step{i}.parquet"
+                temp_files.append(target)
+            else:
+                target = args.output
+            if name == "dedup":
+                require(args, "dedup_cols")
+                rows_in, rows_out = dedup_file(
+                    source, target, split_list(args.dedup_cols), threads=args.workers, memory_limit=args.memory_limit
+                )
+                log(f"    {rows_in} -> {rows_out} dòng ({time.perf_counter() - start:.2f}s)")
+            else:
+                require(args, "fill_file", "key_a", "key_b", "source_col", "target_col")
+                keys_a, keys_b = split_list(args.key_a), split_list(args.key_b)
+                sources, targets = split_list(args.source_col), split_list(args.target_col)
+                if len(keys_a) != len(keys_b) or len(sources) != len(targets):
+                    raise SystemExit("--key-a/--key-b và --source-col/--target-col phải có cùng số cột")
+                counts = fill_file(
+                    source, args.fill_file, target, keys_a, keys_b, list(zip(sources, targets)),
+                    overwrite=args.overwrite, keep_last=args.duplicate_keys == DUPLICATE_LAST,
+                    threads=args.workers, memory_limit=args.memory_limit
+                )
+                for column, count in counts.items():
+                    log(f"    {column}: đã điền {count} dòng")
+                log(f"    ({time.perf_counter() - start:.2f}s)")
+            source = target
+    except ValueError as e:
+        raise SystemExit(str(e))
+    finally:
+        for path in temp_files:
+            if os.path.exists(path):
+                os.remove(path)
+
+def check_out_of_core(args, steps):
+    """Kiểm tra các tùy chọn dùng được với --out-of-core."""
+    if BACKEND_DUCKDB not in available_backends():
+        raise SystemExit("--out-of-core cần gói duckdb (pip install duckdb)")
+    not_supported = [name for name in steps if name not in OUT_OF_CORE_STEPS]
+    if not_supported:
+        raise SystemExit(f"Các bước không chạy được với --out-of-core: {', '.join(not_supported)}")
+    if "dedup" in steps and args.keep != "first":
+        raise SystemExit("--out-of-core chỉ hỗ trợ --keep first")
+    if "fill" in steps and args.duplicate_keys == DUPLICATE_ERROR:
+        raise SystemExit(f"--out-of-core không hỗ trợ --duplicate-keys {DUPLICATE_ERROR}")
+    if args.normalize or args.stream or args.chunk_size or args.compact or args.sheets or args.by_sheet:
+        raise SystemExit("Không dùng --normalize, --stream, --chunk-size, --compact, --sheets, --by-sheet cùng với --out-of-core")
+    files = [args.output] + ([args.fill_file] if "fill" in steps and args.fill_file else [])
+    if not is_single_file(args.input) or not all(path.lower().endswith(DUCKDB_FILE_EXTENSIONS) for path in args.input + files):
+        raise SystemExit(f"--out-of-core chỉ dùng với một file đầu vào và các file {' / '.join(DUCKDB_FILE_EXTENSIONS)}")
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    steps = split_list(args.steps)
+    unknown = [name for name in steps if name not in STEPS]
+    if unknown:
+        raise SystemExit(f"Bước không hợp lệ: {', '.join(unknown)}. Chọn trong: {', '.join(STEPS)}")
+
+    if args.backend not in available_backends():
+        raise SystemExit(f"Chưa cài engine {args.backend} (pip install {args.backend})")
+
+    total_start = time.perf_counter()
+
+    if args.out_of_core:
+        check_out_of_core(args, steps)
+        run_out_of_core(args, steps)
+        log(f"Hoàn tất sau {time.perf_counter() - total_start:.2f}s")
+        return 0
+
+    if args.stream:
+        not_chunkable = [name for name in steps if name not in CHUNKABLE_STEPS]
+        if not_chunkable:
+            raise SystemExit(f"Các bước không chạy được theo từng phần (--stream): {', '.join(not_chunkable)}")
+        if args.chunk_size:
+            raise SystemExit("Không dùng --chunk-size cùng với --stream")
+        if args.compact:
+            raise SystemExit("Không dùng --compact cùng với --stream")
+        if args.sheets or args.by_sheet:
+            raise SystemExit("Không dùng --sheets / --by-sheet cùng với --stream")
+        if not is_single_file(args.input):
+            raise SystemExit("--stream chỉ dùng với một file đầu vào")
+        run_streaming(args, steps)
+        log(f"Hoàn tất sau {time.perf_counter() - total_start:.2f}s")
+        return 0
+
+    start = time.perf_counter()
+    log(f"Đọc {', '.join(args.input)} ...")
+    df = read_input(args, steps)
+    if args.by_sheet and SHEET_COL not in df.columns:
+        raise SystemExit(f"--by-sheet cần cột \"{SHEET_COL}\" (đọc nhiều sheet bằng --sheets)")
+    log(f"    {df.shape[0]} dòng, {df.shape[1]} cột ({time.perf_counter() - start:.2f}s)")
+    if args.compact:
+        start = time.perf_counter()
+        nbytes = frame_nbytes(df)
+        df = compact_frame(df)
+        log(f"    thu gọn bộ nhớ: {nbytes / 2**20:.1f} MB -> {frame_nbytes(df) / 2**20:.1f} MB ({time.perf_counter() - start:.2f}s)")
+
+    for i, name in enumerate(steps, start=1):
+        start = time.perf_counter()
+        log(f"[{i}/{len(steps)}] {name} ...")
+        rows_before = df.shape[0]
+        df = STEPS[name](df, args)
+        log(f"    {rows_before} -> {df.shape[0]} dòng ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    log(f"Ghi {args.output} ...")
+    paths = write_output(df, args.output, args.chunk_size, SHEET_COL if args.by_sheet else None)
+    log(f"    {len(paths)} file ({time.perf_counter() - start:.2f}s)")
+
+    log(f"Hoàn tất sau {time.perf_counter() - total_start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import xlsxwriter
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Số dòng mặc định cho mỗi phần khi đọc/ghi theo từng phần
+CHUNK_SIZE = 50_000
+# Số dòng tối đa của một sheet Excel (kể cả dòng tiêu đề)
+EXCEL_MAX_ROWS = 1_048_576
+
+# Các chuỗi pandas.read_excel mặc định coi là giá trị trống (na_values)
+NA_STRINGS = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+# Độ dài tối đa và các ký tự không được dùng trong tên sheet Excel
+SHEET_NAME_MAX = 31
+SHEET_NAME_INVALID = "[]:*?/\\"
+
+# Chế độ gọn bộ nhớ: cột chuỗi có số giá trị khác nhau không quá tỉ lệ này so với số dòng
+# (tỉnh/thành, loại công ty, nhân viên phụ trách, ...) được lưu dạng category
+CATEGORY_RATIO = 0.5
+
+
+def process_pool(max_workers):
+    """
+    ProcessPoolExecutor tạo process con bằng forkserver (spawn nếu hệ điều hành không có):
+    app gọi từ các luồng job trong server Streamlit nhiều luồng, fork khi đó có thể làm
+    process con treo vì thừa hưởng một khóa đang bị giữ.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Server nạp sẵn pandas và module đọc / ghi một lần, các process con sau đó khởi động nhanh
+        context.set_forkserver_preload(["data_io"])
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+def drop_unnamed_columns(df):
+    """Loại bỏ các cột có tên bắt đầu bằng "Unnamed"."""
+    return df.loc[:, ~df.columns.astype(str).str.startswith("Unnamed")]
+
+def get_file_name(source):
+    """Lấy tên file từ đường dẫn hoặc từ file upload của Streamlit."""
+    return getattr(source, "name", None) or os.fspath(source)
+
+def _is_csv(source):
+    return get_file_name(source).lower().endswith(".csv")
+
+def read_table(source, drop_unnamed=True, **kwargs):
+    """
+    Đọc file Excel (.xlsx) hoặc CSV thành DataFrame.
+    source có thể là đường dẫn hoặc file upload (có thuộc tính name).
+    """
+    if _is_csv(source):
+        df = pd.read_csv(source, **kwargs)
+    else:
+        df = pd.read_excel(source, engine="openpyxl", **kwargs)
+    if drop_unnamed:
+        df = drop_unnamed_columns(df)
+    return df
+
+def sheet_names(source):
+    """Tên các sheet của file Excel theo thứ tự trong file; file CSV trả về danh sách rỗng."""
+    if _is_csv(source):
+        return []
+    workbook = openpyxl.load_workbook(source, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+def _excel_header(header_row):
+    """Đặt tên cột giống pandas: ô trống thành "Unnamed: i", tên trùng thêm hậu tố .1, .2, ..."""
+    columns = []
+    seen = {}
+    for i, value in enumerate(header_row):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        columns.append(name)
+    return columns
+
+def _excel_value(value, as_str):
+    """Chuyển giá trị ô Excel giống pandas.read_excel (số thực nguyên thành int)."""
+    if value is None or isinstance(value, str) and value in NA_STRINGS:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value) if as_str else value
+
+def _iter_excel_chunks(source, chunk_size, drop_unnamed, dtype, sheet_name):
+    # Chế độ read_only của openpyxl đọc từng dòng, không nạp toàn bộ workbook
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name] if sheet_name is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+
+        columns = _excel_header(header_row)
+        keep = [
+            i for i, name in enumerate(columns)
+            if not (drop_unnamed and name.startswith("Unnamed"))
+        ]
+        columns = [columns[i] for i in keep]
+        as_str = dtype is str
+        width = len(header_row)
+
+        batch = []
+        pending_blank = 0
+        for row in rows:
+            if all(value is None or value == "" for value in row):
+                # Dòng trống chỉ được giữ nếu phía sau còn dữ liệu (giống pandas)
+                pending_blank += 1
+                continue
+            row = tuple(row) + (None,) * (width - len(row))
+            batch.extend([[None] * len(keep)] * pending_blank)
+            pending_blank = 0
+            batch.append([_excel_value(row[i], as_str) for i in keep])
+
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch[:chunk_size], columns=columns)
+                batch = batch[chunk_size:]
+
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+def _iter_csv_chunks(source, chunk_size, drop_unnamed, dtype):
+    usecols = (lambda name: not str(name).startswith("Unnamed")) if drop_unnamed else None
+    yield from pd.read_csv(source, chunksize=chunk_size, usecols=usecols, dtype=dtype)
+
+def iter_table_chunks(source, chunk_size=CHUNK_SIZE, drop_unnamed=True, dtype=None, sheet_name=None):
+    """
+    Đọc file Excel/CSV theo từng phần, mỗi phần tối đa chunk_size dòng.
+    Bộ nhớ dùng phụ thuộc vào chunk_size, không phụ thuộc kích thước file.
+    Các cột "Unnamed" được bỏ ngay khi đọc. dtype chỉ hỗ trợ str với file Excel.
+    Kiểu dữ liệu được suy luận riêng cho từng phần; dùng dtype=str nếu cần kiểu ổn định.
+    """
+    if _is_csv(source):
+        yield from _iter_csv_chunks(source, chunk_size, drop_unnamed, dtype)
+    else:
+        yield from _iter_excel_chunks(source, chunk_size, drop_unnamed, dtype, sheet_name)
+
+def frame_nbytes(df):
+    """Dung lượng bộ nhớ thực tế của DataFrame (bytes)."""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def _arrow_string_dtype():
+    """Kiểu chuỗi lưu bằng Arrow, ô trống là NaN; None nếu pandas/pyarrow không hỗ trợ."""
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except (TypeError, ImportError):
+        return None
+
+def compact_column(series, category_ratio=CATEGORY_RATIO):
+    """
+    Kiểu dữ liệu gọn hơn cho một cột, không đổi giá trị:
+    - cột chỉ chứa chuỗi: chuỗi Arrow, hoặc category nếu ít giá trị khác nhau;
+    - cột số nguyên: kiểu nguyên nhỏ nhất đủ chứa;
+    - cột số thực: float32 nếu không mất độ chính xác (ví dụ cột toàn NaN).
+    Cột có kiểu hỗn hợp (số lẫn chữ), bool, ngày tháng được giữ nguyên.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(dtype):
+        return series
+    if pd.api.types.is_integer_dtype(dtype):
+        return pd.to_numeric(series, downcast="integer")
+    if dtype == np.float64:
+        downcast = series.astype(np.float32)
+        if np.array_equal(downcast.to_numpy(dtype=np.float64), series.to_numpy(), equal_nan=True):
+            return downcast
+        return series
+    if pd.api.types.infer_dtype(series, skipna=True) != "string":
+        return series
+
+    string_dtype = _arrow_string_dtype()
+    if string_dtype is not None and dtype != string_dtype:
+        series = series.astype(string_dtype)
+    if series.nunique(dropna=True) <= len(series) * category_ratio:
+        series = series.astype("category")
+    return series
+
+def compact_frame(df, category_ratio=CATEGORY_RATIO):
+    """
+    Bản sao df với kiểu dữ liệu gọn cho từng cột (xem compact_column).
+    Dung lượng ban đầu của từng cột được lưu trong df.attrs["original_nbytes"] để báo cáo.
+    """
+    original_nbytes = {str(col): int(nbytes) for col, nbytes in df.memory_usage(index=False, deep=True).items()}
+    df_compact = pd.DataFrame(
+        {col: compact_column(df[col], category_ratio) for col in df.columns}, index=df.index
+    ) if df.columns.is_unique else df.apply(compact_column, category_ratio=category_ratio)
+    df_compact.attrs["original_nbytes"] = original_nbytes
+    return df_compact
+
+def original_nbytes(df):
+    """Dung lượng của df trước khi gọn bộ nhớ (bằng frame_nbytes nếu df chưa qua compact_frame)."""
+    before = df.attrs.get("original_nbytes")
+    current = df.memory_usage(index=True, deep=True)
+    if not before:
+        return int(current.sum())
+    return int(current["Index"]) + sum(
+        before.get(str(col), int(current[col])) for col in df.columns
+    )
+
+def decategorize(series):
+    """Cột category -> cột cùng kiểu với các giá trị (chuỗi, số, ...) để gán giá trị mới; cột khác giữ nguyên."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype(series.cat.categories.dtype)
+    return series
+
+def fillna_keep_categories(df, value):
+    """df.fillna(value), cột category được thêm value vào danh sách category thay vì báo lỗi."""
+    df = df.copy()
+    for col in df.columns[df.isna().any().to_numpy()]:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+            df[col] = series.cat.add_categories([value])
+    return df.fillna(value)
+
+def arrow_compatible(df):
+    """Cột object lẫn kiểu (số và chữ) được chuyển thành chuỗi để ghi được Parquet; cột khác giữ nguyên."""
+    mixed = [
+        col for col in df.columns
+        if pd.api.types.is_object_dtype(df[col].dtype)
+        and pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty")
+    ]
+    if not mixed:
+        return df
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].astype(str).where(df[col].notna())
+    return df
+
+def excel_sheet_name(name, used=()):
+    """Tên sheet Excel hợp lệ từ name: bỏ ký tự không cho phép, tối đa 31 ký tự, không trùng với used."""
+    base = "".join("_" if char in SHEET_NAME_INVALID else char for char in str(name)).strip("'") or "Sheet"
+    base = base[:SHEET_NAME_MAX]
+    used = {existing.lower() for existing in used}
+    candidate, i = base, 1
+    while candidate.lower() in used:
+        i += 1
+        suffix = f"_{i}"
+        candidate = base[:SHEET_NAME_MAX - len(suffix)] + suffix
+    return candidate
+
+def write_table(df, path, sheet_name="Sheet1", group_column=None):
+    """
+    Ghi DataFrame ra file theo phần mở rộng: .xlsx, .csv hoặc .parquet.
+    File Excel được ghi từng phần ở chế độ constant_memory và tự sang sheet mới
+    khi vượt quá EXCEL_MAX_ROWS dòng. Với group_column, file Excel có mỗi giá trị
+    của cột đó một sheet (theo thứ tự xuất hiện, bỏ cột group_column); CSV/Parquet ghi như bình thường.
+    """
+    path = os.fspath(path)
+    lower = path.lower()
+    if lower.endswith(".csv"):
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+    elif lower.endswith(".parquet"):
+        arrow_compatible(df).to_parquet(path, index=False)
+    elif group_column is not None:
+        used = []
+        with ChunkWriter(path) as writer:
+            for value, df_group in df.groupby(group_column, sort=False, dropna=False, observed=True):
+                # Dòng không có tên sheet (file CSV, ô trống) được ghi vào sheet sheet_name
+                used.append(excel_sheet_name(sheet_name if pd.isna(value) or value == "" else value, used))
+                writer.start_sheet(used[-1])
+                df_group = df_group.drop(columns=group_column)
+                for start in range(0, max(len(df_group), 1), CHUNK_SIZE):
+                    writer.write(df_group.iloc[start:start + CHUNK_SIZE])
+    else:
+        with ChunkWriter(path, sheet_name=sheet_name) as writer:
+            for start in range(0, max(len(df), 1), CHUNK_SIZE):
+                writer.write(df.iloc[start:start + CHUNK_SIZE])
+
+
+class ChunkWriter:
+    """
+    Ghi dần từng phần DataFrame ra một file (.xlsx, .csv hoặc .parquet)
+    mà không giữ toàn bộ kết quả trong bộ nhớ. Dùng với "with".
+    File Excel sang sheet mới (sheet_name_2, sheet_name_3, ...) khi sheet hiện tại
+    đủ max_sheet_rows dòng dữ liệu, hoặc sang sheet có tên khác khi gọi start_sheet.
+    """
+
+    def __init__(self, path, sheet_name="Sheet1", max_sheet_rows=EXCEL_MAX_ROWS - 1):
+        self.path = os.fspath(path)
+        self.sheet_name = sheet_name
+        self.max_sheet_rows = max_sheet_rows
+        self.rows = 0
+        self.sheets = 0
+        self._file = None
+        self._workbook = None
+        self._worksheet = None
+        self._header = None
+        self._sheet_rows = 0
+        self._sheet_parts = 0
+        self._parquet = None
+        self._schema = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, df):
+        lower = self.path.lower()
+        if lower.endswith(".csv"):
+            self._write_csv(df)
+        elif lower.endswith(".parquet"):
+            self._write_parquet(df)
+        else:
+            self._write_excel(df)
+        self.rows += df.shape[0]
+
+    def _write_csv(self, df):
+        if self._file is None:
+            self._file = open(self.path, "w", encoding="utf-8-sig", newline="")
+            df.to_csv(self._file, index=False)
+        else:
+            df.to_csv(self._file, index=False, header=False)
+
+    def start_sheet(self, sheet_name):
+        """Các phần ghi tiếp theo vào sheet mới tên sheet_name (chỉ với file Excel)."""
+        self.sheet_name = sheet_name
+        self._worksheet = None
+        self._sheet_parts = 0
+
+    def _add_sheet(self):
+        self.sheets += 1
+        self._sheet_parts += 1
+        name = self.sheet_name if self._sheet_parts == 1 else f"{self.sheet_name}_{self._sheet_parts}"
+        self._worksheet = self._workbook.add_worksheet(name)
+        self._worksheet.write_row(0, 0, self._header)
+        self._sheet_rows = 0
+
+    def _write_excel(self, df):
+        if self._workbook is None:
+            # constant_memory: xlsxwriter ghi từng dòng xuống đĩa ngay khi xong
+            self._workbook = xlsxwriter.Workbook(self.path, {
+                "constant_memory": True,
+                "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            })
+            self._header = [str(col) for col in df.columns]
+        if self._worksheet is None:
+            self._add_sheet()
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if self._sheet_rows >= self.max_sheet_rows:
+                self._add_sheet()
+            self._sheet_rows += 1
+            self._worksheet.write_row(self._sheet_rows, 0, row)
+
+    def _write_parquet(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(arrow_compatible(df), schema=self._schema, preserve_index=False)
+        if self._parquet is None:
+            self._schema = table.schema
+            self._parquet = pq.ParquetWriter(self.path, self._schema)
+        self._parquet.write_table(table)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
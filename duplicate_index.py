@@ -0,0 +1,74 @@
+"""
+Chỉ mục các nhóm trùng của một cột cho trang Check Data: được tạo một lần khi bấm kiểm tra
+(giá trị -> vị trí các dòng, kích thước nhóm, nhóm lớn xếp trước) rồi lưu trong session,
+để chọn, tìm và chuyển trang giữa các nhóm không phải so sánh lại cả cột. Không gọi st.*.
+"""
+import numpy as np
+import pandas as pd
+
+from preview import column_contains, page_count
+
+# Nhãn của nhóm các ô trống
+EMPTY_LABEL = "(trống)"
+# Số nhóm mỗi trang khi chọn nhóm để xem
+GROUPS_PER_PAGE = 100
+
+
+class DuplicateIndex:
+    """
+    Các nhóm giá trị xuất hiện từ hai lần trở lên trong cột column của df (các ô trống là một nhóm).
+    Nhóm được sắp theo kích thước giảm dần, cùng kích thước thì theo lần xuất hiện đầu tiên.
+    """
+
+    def __init__(self, df, column):
+        self.column = column
+        codes, uniques = pd.factorize(df[column], use_na_sentinel=False)
+        sizes = np.bincount(codes, minlength=len(uniques))
+        duplicated = np.flatnonzero(sizes > 1)
+        # factorize đánh số theo lần xuất hiện đầu tiên, nên sắp ổn định theo kích thước là đủ
+        group_codes = duplicated[np.argsort(-sizes[duplicated], kind="stable")]
+        self.sizes = sizes[group_codes]
+        self.labels = pd.Series(
+            [EMPTY_LABEL if pd.isna(value) else str(value) for value in uniques[group_codes]], dtype=object
+        )
+
+        # Vị trí các dòng của mọi nhóm nằm liền nhau theo thứ tự nhóm: nhóm i là positions[starts[i]:starts[i + 1]]
+        rank = np.full(len(uniques), -1)
+        rank[group_codes] = np.arange(len(group_codes))
+        row_rank = rank[codes]
+        in_group = np.flatnonzero(row_rank >= 0)
+        self.positions = in_group[np.argsort(row_rank[in_group], kind="stable")]
+        self.starts = np.concatenate([[0], np.cumsum(self.sizes)])
+        self.row_count = len(in_group)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def duplicate_rows(self, df):
+        """Tất cả các dòng thuộc một nhóm trùng, theo thứ tự gốc."""
+        return df.iloc[np.sort(self.positions)]
+
+    def group_positions(self, group):
+        return self.positions[self.starts[group]:self.starts[group + 1]]
+
+    def group_rows(self, df, group):
+        """Các dòng của một nhóm, theo thứ tự gốc."""
+        return df.iloc[self.group_positions(group)]
+
+    def search(self, text):
+        """Số thứ tự các nhóm có giá trị chứa text (không phân biệt hoa thường), vẫn theo kích thước giảm dần."""
+        if not text:
+            return np.arange(len(self))
+        return np.flatnonzero(column_contains(self.labels, text).to_numpy())
+
+    def page(self, groups, page, page_size):
+        """Một trang trong danh sách nhóm groups. Trả về (các nhóm của trang, trang thực tế, tổng số trang)."""
+        pages = page_count(len(groups), page_size)
+        page = min(max(1, page), pages)
+        start = (page - 1) * page_size
+        return groups[start:start + page_size], page, pages
+
+    def size_distribution(self):
+        """Số nhóm theo số dòng mỗi nhóm (tăng dần)."""
+        size, count = np.unique(self.sizes, return_counts=True)
+        return pd.DataFrame({"Số dòng mỗi nhóm": size, "Số nhóm": count})
@@ -0,0 +1,285 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from text_normalize import strip_accents
+
+# --- Các pattern dùng chung (biên dịch sẵn một lần) ---
+EMAIL_PATTERN = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
+EMAIL_SEARCH_PATTERN = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+INVISIBLE_CHARS_PATTERN = r"[\u200B\u200C\u200D\uFEFF]"
+
+_EMAIL_RE = re.compile(EMAIL_PATTERN)
+_EMAIL_SEARCH_RE = re.compile(EMAIL_SEARCH_PATTERN)
+_INVISIBLE_CHARS_RE = re.compile(INVISIBLE_CHARS_PATTERN)
+_WHITESPACE_RE = re.compile(r"\s+")
+_SEPARATOR_RE = re.compile(r"[;,/]+")
+# Phần sau dấu phân cách đầu tiên (chỉ giữ email đầu tiên)
+_AFTER_SEPARATOR_RE = re.compile(r"[;,/].*", re.DOTALL)
+# Domain dạng x.vnn.y (đúng 3 phần) -> x.y
+_VNN_DOMAIN_RE = re.compile(r"@([^.@]*)\.(?i:vnn)\.([^.@]*)$")
+
+DEFAULT_EMAIL_DOMAIN = "default.com"
+
+
+# --- Các hàm xử lý từng giá trị ---
+def is_valid_email(email):
+    """Kiểm tra định dạng email hợp lệ."""
+    return bool(_EMAIL_RE.match(str(email)))
+
+def remove_accents(input_str):
+    """Loại bỏ dấu tiếng Việt (và ký tự ẩn) khỏi chuỗi."""
+    return strip_accents(input_str)
+
+def remove_invisible_chars(s):
+    """Loại bỏ các ký tự ẩn (invisible characters) khỏi chuỗi."""
+    return _INVISIBLE_CHARS_RE.sub('', s)
+
+def fix_domain(email):
+
+    parts = email.split('@')
+    if len(parts) != 2:
+        return email
+    local, domain = parts
+    domain = domain.strip()
+    domain_parts = domain.split('.')
+    if len(domain_parts) == 3 and domain_parts[1].lower() == "vnn":
+        domain = f"{domain_parts[0]}.{domain_parts[2]}"
+    return f"{local}@{domain}"
+
+def email_from_name(company_name):
+    """Tạo email mặc định từ tên công ty (bỏ dấu, bỏ khoảng trắng, chữ thường)."""
+    clean_name = remove_accents(str(company_name).strip().replace(" ", "").lower())
+    return f"{clean_name}@{DEFAULT_EMAIL_DOMAIN}"
+
+def clean_and_normalize_email(email, company_name):
+
+    if pd.isna(email) or not email.strip():
+        return email_from_name(company_name)
+
+    # Xóa các ký tự ẩn và khoảng trắng
+    email_clean = remove_invisible_chars(email).strip()
+    email_clean = _WHITESPACE_RE.sub('', email_clean)
+
+    # Nếu email nối liền nhau, tách bằng dấu phân cách ;, dấu phẩy hoặc dấu gạch chéo
+    emails = _SEPARATOR_RE.split(email_clean)
+    candidate = emails[0] if emails else email_clean
+
+    # Nếu candidate không hợp lệ, trích xuất email hợp lệ bằng regex
+    if not is_valid_email(candidate):
+        matches = _EMAIL_SEARCH_RE.findall(candidate)
+        if matches:
+            candidate = matches[0]
+
+    if is_valid_email(candidate):
+        return fix_domain(candidate)
+
+    # Nếu không tìm được email hợp lệ, tạo email mới từ tên công ty
+    return email_from_name(company_name)
+
+
+# --- Các hàm xử lý theo cả cột (vectorized) ---
+def _as_text(series):
+    """
+    Chuyển cột về kiểu object để các phép .str dùng module re của Python
+    (giống hệt các hàm xử lý từng giá trị). Cột không chứa chuỗi trả về toàn NaN.
+    Cột category được xét theo kiểu của các giá trị.
+    """
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    if not pd.api.types.is_string_dtype(dtype):
+        return pd.Series(float("nan"), index=series.index, dtype=object)
+    return series.astype(object)
+
+def valid_email_mask(emails):
+    """Trả về mask True/False cho từng dòng có email hợp lệ (tương đương is_valid_email)."""
+    text = _as_text(emails)
+    return text.str.match(_EMAIL_RE, na=False).astype(bool)
+
+def emails_from_names(company_names):
+    """Tạo email mặc định cho cả cột tên, mỗi tên khác nhau chỉ tính một lần."""
+    names = company_names.astype(object)
+    # factorize thay cho dict: cột có cả None và NaN sẽ cho dict hai khóa NA và map bị lỗi
+    codes, uniques = pd.factorize(names, use_na_sentinel=True)
+    missing = codes < 0
+    emails = np.empty(len(names), dtype=object)
+    emails[~missing] = np.array([email_from_name(name) for name in uniques], dtype=object)[codes[~missing]]
+    if missing.any():
+        # Ô trống xử lý riêng từng dòng (None và NaN cho kết quả khác nhau, như email_from_name)
+        emails[missing] = names[missing].map(email_from_name).to_numpy()
+    return pd.Series(emails, index=names.index, dtype=object)
+
+def clean_and_normalize_emails(emails, company_names):
+    """
+    Phiên bản theo cột của clean_and_normalize_email.
+    Kết quả giống hệt khi gọi clean_and_normalize_email cho từng dòng.
+    """
+    text = _as_text(emails)
+
+    # Xóa ký tự ẩn, khoảng trắng và chỉ giữ email đầu tiên trước dấu phân cách
+    candidate = (
+        text.str.replace(_INVISIBLE_CHARS_RE, '', regex=True)
+        .str.replace(_WHITESPACE_RE, '', regex=True)
+        .str.replace(_AFTER_SEPARATOR_RE, '', regex=True)
+    )
+
+    # Candidate không hợp lệ thì trích xuất email hợp lệ đầu tiên (nếu có)
+    valid = candidate.str.match(_EMAIL_RE, na=False).astype(bool)
+    extracted = candidate[~valid].str.extract(f"({EMAIL_SEARCH_PATTERN})", expand=False)
+    candidate = candidate.where(valid, extracted)
+
+    # Sửa domain x.vnn.y -> x.y cho các email tìm được
+    result = candidate.str.replace(_VNN_DOMAIN_RE, r"@\1.\2", regex=True).astype(object)
+
+    # Các dòng còn lại (rỗng, NaN, không trích được email) lấy email từ tên công ty
+    missing = result.isna()
+    if missing.any():
+        result[missing] = emails_from_names(company_names[missing])
+    return result
+
+
+# --- Sửa lỗi chính tả domain (gmial.com, gmail.con, yahoo.com.vnn, ...) ---
+# Các domain phổ biến luôn được coi là đúng
+COMMON_EMAIL_DOMAINS = [
+    "gmail.com", "yahoo.com", "yahoo.com.vn", "hotmail.com", "outlook.com", "live.com",
+    "icloud.com", "msn.com", "aol.com", "ymail.com", "googlemail.com", "outlook.com.vn",
+    "mail.com", "email.com", "gmx.com", "zoho.com", "proton.me", "protonmail.com", "qq.com", "163.com",
+    "fpt.vn", "fpt.com.vn", "fpt.edu.vn", "viettel.vn", "viettel.com.vn", "vnpt.vn",
+    "vnn.vn", "hcm.vnn.vn", "hn.vnn.vn", "vinaphone.vn", "mobifone.vn", "zing.vn", "vng.com.vn",
+    DEFAULT_EMAIL_DOMAIN,
+]
+# Domain trong file được dùng làm đích sửa nếu xuất hiện ít nhất MIN_DOMAIN_COUNT lần
+# và nhiều hơn domain cần sửa ít nhất DOMAIN_COUNT_RATIO lần
+MIN_DOMAIN_COUNT = 3
+DOMAIN_COUNT_RATIO = 10
+# Sai tối đa 1 ký tự (thêm/bớt/thay hoặc đảo 2 ký tự liền nhau): với 2 ký tự, các domain
+# thật như vnpost.vn hay bvag.com.vn bị sửa nhầm thành vnpt.vn, vng.com.vn
+MAX_DOMAIN_DISTANCE = 1
+# Domain có phần đầu ngắn hơn độ dài này không được sửa (apt.com.vn, npt.com.vn là domain thật)
+MIN_LABEL_LENGTH = 4
+# Đuôi tên miền có thật: không sửa domain sang một đuôi khác (yahoo.com.tw giữ nguyên)
+KNOWN_TLDS = {
+    "com", "net", "org", "edu", "gov", "info", "biz", "int", "io",
+    "vn", "tw", "jp", "kr", "cn", "hk", "sg", "th", "my", "id", "ph", "kh", "la",
+    "au", "uk", "us", "ca", "de", "fr", "it", "nl", "ru", "in",
+}
+
+
+def _deletes(word, max_distance):
+    """Tất cả các chuỗi có được khi xóa tối đa max_distance ký tự của word (kể cả word)."""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result |= frontier
+    return result
+
+def edit_distance(a, b, max_distance=None):
+    """
+    Khoảng cách Damerau-Levenshtein (hoán vị 2 ký tự liền nhau tính là 1 lỗi).
+    Trả về max_distance + 1 nếu vượt quá max_distance.
+    """
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class DomainCorrector:
+    """
+    Sửa domain gõ sai về domain đúng gần nhất theo khoảng cách chỉnh sửa.
+    Từ điển gồm COMMON_EMAIL_DOMAINS và các domain hợp lệ xuất hiện nhiều trong file;
+    chỉ mục kiểu SymSpell (các chuỗi sau khi xóa ký tự) giúp tìm ứng viên mà không phải
+    so sánh với toàn bộ từ điển. Mỗi domain khác nhau chỉ được tra một lần.
+    """
+
+    def __init__(self, domain_counts=None, common_domains=COMMON_EMAIL_DOMAINS,
+                 max_distance=MAX_DOMAIN_DISTANCE, min_count=MIN_DOMAIN_COUNT, count_ratio=DOMAIN_COUNT_RATIO):
+        self.counts = dict(domain_counts or {})
+        self.common = {domain.lower() for domain in common_domains}
+        self.max_distance = max_distance
+        self.count_ratio = count_ratio
+        self._cache = {}
+
+        # Chỉ các domain có thể làm đích sửa mới được đưa vào chỉ mục
+        targets = self.common | {d for d, count in self.counts.items() if count >= min_count}
+        self._index = {}
+        for target in targets:
+            for deleted in _deletes(target, max_distance):
+                self._index.setdefault(deleted, []).append(target)
+
+    def _rank(self, domain):
+        # Domain phổ biến luôn được ưu tiên trước, sau đó theo số lần xuất hiện
+        return (domain in self.common, self.counts.get(domain, 0))
+
+    def correct(self, domain):
+        """Trả về domain đã sửa (chữ thường), hoặc domain ban đầu nếu không cần/không sửa được."""
+        if domain in self._cache:
+            return self._cache[domain]
+        lower = domain.lower()
+        result = domain
+        if lower not in self.common and len(lower.split(".", 1)[0]) >= MIN_LABEL_LENGTH:
+            tld = lower.rsplit(".", 1)[-1]
+            min_target_count = self.count_ratio * max(self.counts.get(lower, 0), 1)
+            candidates = {
+                target
+                for deleted in _deletes(lower, self.max_distance)
+                for target in self._index.get(deleted, ())
+                if target != lower and (target in self.common or self.counts.get(target, 0) >= min_target_count)
+                and (tld not in KNOWN_TLDS or target.rsplit(".", 1)[-1] == tld)
+            }
+            best = None
+            for target in candidates:
+                distance = edit_distance(lower, target, self.max_distance)
+                if distance <= self.max_distance:
+                    key = (distance, tuple(-value for value in self._rank(target)), target)
+                    if best is None or key < best:
+                        best = key
+            if best is not None:
+                result = best[2]
+        self._cache[domain] = result
+        return result
+
+def _split_valid_emails(emails):
+    """(mask email hợp lệ, phần trước @, domain) của các email hợp lệ trong cột."""
+    text = _as_text(emails)
+    valid = text.str.match(_EMAIL_RE, na=False).astype(bool)
+    parts = [email.rpartition("@") for email in text[valid]]
+    local = pd.Series([part[0] for part in parts], index=text.index[valid], dtype=object)
+    domain = pd.Series([part[2] for part in parts], index=text.index[valid], dtype=object)
+    return text, valid, local, domain
+
+def email_domains(emails):
+    """Domain (chữ thường) của từng email hợp lệ; email không hợp lệ nhận NaN."""
+    text, valid, _, domain = _split_valid_emails(emails)
+    return domain.str.lower().reindex(text.index)
+
+def build_domain_corrector(emails, **options):
+    """Tạo DomainCorrector với từ điển tần suất từ các email hợp lệ của cột emails."""
+    return DomainCorrector(email_domains(emails).value_counts().to_dict(), **options)
+
+def correct_email_domains(emails, corrector=None):
+    """
+    Sửa domain gõ sai của cả cột email; mỗi domain khác nhau chỉ tra một lần.
+    Email không hợp lệ được giữ nguyên.
+    """
+    text, valid, local, domain = _split_valid_emails(emails)
+    if corrector is None:
+        corrector = DomainCorrector(domain.str.lower().value_counts().to_dict())
+    mapping = {value: corrector.correct(value) for value in pd.unique(domain)}
+    result = text.copy()
+    result[valid] = local + "@" + domain.map(mapping)
+    return result
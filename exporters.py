@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import time
+import weakref
+import zipfile
+
+from data_io import EXCEL_MAX_ROWS, EXCEL_MIME, ChunkWriter, process_pool, write_table
+from operations import split_into_chunks
+
+# Định dạng file con khi chia nhỏ: phần mở rộng -> kiểu nén trong zip
+# (xlsx và parquet đã được nén sẵn nên chỉ lưu, không nén lại)
+CHUNK_FORMATS = {
+    "xlsx": zipfile.ZIP_STORED,
+    "csv": zipfile.ZIP_DEFLATED,
+    "parquet": zipfile.ZIP_STORED,
+}
+
+# Định dạng tải xuống: phần mở rộng -> MIME
+EXPORT_FORMATS = {
+    "xlsx": EXCEL_MIME,
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+ZIP_MIME = "application/zip"
+
+
+class TempFile:
+    """File tạm trên đĩa (ví dụ file zip đã tạo), tự xóa khi đối tượng không còn được dùng."""
+
+    def __init__(self, path):
+        self.path = path
+        weakref.finalize(self, _remove_file, path)
+
+    def read(self):
+        with open(self.path, "rb") as file:
+            return file.read()
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def chunk_file_name(prefix, number, fmt):
+    """Tên file con trong zip: chỉ lấy phần tên của prefix (bỏ thư mục) để không ghi ra ngoài zip."""
+    name = os.path.basename(prefix.replace("\\", "/")).strip() or "file"
+    return f"{name}_{number}.{fmt}"
+
+def _write_chunk_file(df_chunk, path):
+    """Ghi một phần dữ liệu ra file (chạy trong process con)."""
+    with ChunkWriter(path) as writer:
+        writer.write(df_chunk)
+    return path
+
+def export_chunks_zip(df, chunk_size, prefix, fmt="xlsx", max_workers=None, progress=None):
+    """
+    Chia DataFrame thành các file nhỏ (mỗi file tối đa chunk_size dòng) và nén vào một file zip tạm.
+    Các file con được ghi song song bằng process pool, xong file nào thì đưa vào zip
+    và xóa file đó ngay, nên không giữ toàn bộ zip trong bộ nhớ.
+    progress(done, total) được gọi sau mỗi file.
+    Trả về (đường dẫn zip, thống kê); người gọi tự xóa file zip khi dùng xong.
+    """
+    if fmt not in CHUNK_FORMATS:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+
+    start = time.perf_counter()
+    total = -(-df.shape[0] // chunk_size)
+    max_workers = max_workers or os.cpu_count() or 1
+    # File tạm dùng tên cố định; prefix (do người dùng nhập) chỉ dùng cho tên file trong zip
+    work_dir = tempfile.mkdtemp(prefix="cleandata_chunks_")
+    zip_fd, zip_path = tempfile.mkstemp(prefix="cleandata_chunks_", suffix=".zip")
+    os.close(zip_fd)
+
+    def add_to_zip(zip_file, path, done):
+        number = int(os.path.splitext(os.path.basename(path))[0])
+        zip_file.write(path, arcname=chunk_file_name(prefix, number, fmt))
+        os.remove(path)
+        if progress is not None:
+            progress(done, total)
+
+    try:
+        chunks = (
+            (df_chunk, os.path.join(work_dir, f"{i+1}.{fmt}"))
+            for i, df_chunk in enumerate(split_into_chunks(df, chunk_size))
+        )
+        with zipfile.ZipFile(zip_path, mode="w", compression=CHUNK_FORMATS[fmt]) as zip_file:
+            if max_workers == 1 or total <= 1:
+                for done, (df_chunk, path) in enumerate(chunks, start=1):
+                    add_to_zip(zip_file, _write_chunk_file(df_chunk, path), done)
+            else:
+                with process_pool(max_workers) as executor:
+                    # Chỉ gửi tối đa 2 * max_workers phần cùng lúc để giới hạn bộ nhớ
+                    pending = []
+                    done = 0
+                    for df_chunk, path in chunks:
+                        pending.append(executor.submit(_write_chunk_file, df_chunk, path))
+                        if len(pending) >= 2 * max_workers:
+                            done += 1
+                            add_to_zip(zip_file, pending.pop(0).result(), done)
+                    for future in pending:
+                        done += 1
+                        add_to_zip(zip_file, future.result(), done)
+    except BaseException:
+        os.remove(zip_path)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    seconds = time.perf_counter() - start
+    stats = {
+        "files": total,
+        "rows": int(df.shape[0]),
+        "seconds": seconds,
+        "rows_per_sec": df.shape[0] / seconds if seconds else 0.0,
+        "zip_bytes": os.path.getsize(zip_path),
+    }
+    return zip_path, stats
+
+def export_bytes(df, fmt="xlsx", sheet_name="Sheet1", split_files=False, group_column=None):
+    """
+    Tạo file tải xuống của df. Trả về (bytes, phần mở rộng, MIME).
+    - xlsx: ghi từng phần ở chế độ constant_memory qua file tạm; quá EXCEL_MAX_ROWS dòng thì
+      sang sheet mới, hoặc nếu split_files thì chia thành nhiều file xlsx trong một file zip.
+      Với group_column, mỗi giá trị của cột đó được ghi thành một sheet (xem data_io.write_table).
+    - csv: UTF-8 có BOM để Excel hiện đúng tiếng Việt.
+    - parquet: cột lẫn kiểu số/chữ được ghi dạng chuỗi.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+
+    if fmt == "xlsx" and split_files and group_column is None and df.shape[0] > EXCEL_MAX_ROWS - 1:
+        zip_path, _ = export_chunks_zip(df, EXCEL_MAX_ROWS - 1, sheet_name, fmt="xlsx")
+        try:
+            with open(zip_path, "rb") as zip_file:
+                return zip_file.read(), "zip", ZIP_MIME
+        finally:
+            os.remove(zip_path)
+
+    fd, path = tempfile.mkstemp(prefix="cleandata_export_", suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        write_table(df, path, sheet_name=sheet_name, group_column=group_column)
+        with open(path, "rb") as export_file:
+            return export_file.read(), fmt, EXPORT_FORMATS[fmt]
+    finally:
+        os.remove(path)
+
+def format_bytes(num_bytes):
+    """Hiển thị dung lượng dạng dễ đọc (KB, MB, GB)."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.1f} {unit}" if unit != "B" else f"{num_bytes} B"
+        num_bytes /= 1024
@@ -0,0 +1,258 @@
+"""
+Tìm các dòng trùng gần đúng (tên công ty / liên hệ viết khác nhau) bằng MinHash + LSH.
+
+Các bước:
+    1. Chuẩn hóa tên: bỏ dấu, chữ thường, bỏ ký tự đặc biệt và các từ loại hình
+       doanh nghiệp ("Công ty", "Cty", "TNHH", ...), nên "Công ty TNHH ABC",
+       "CONG TY TNHH ABC " và "Cty ABC" có cùng khóa "abc".
+    2. Mỗi khóa khác nhau được biểu diễn bằng tập n-gram ký tự và chữ ký MinHash.
+    3. LSH chia chữ ký thành các band; chỉ các khóa rơi cùng bucket ở ít nhất
+       một band mới được so sánh (không so sánh mọi cặp).
+    4. Cặp ứng viên được tính độ giống Jaccard thật trên tập n-gram, giữ các cặp
+       đạt ngưỡng và gom thành nhóm quanh một khóa đại diện: mỗi khóa trong nhóm đều
+       giống đại diện đạt ngưỡng, nên các tên không bị nối thành chuỗi A ~ B ~ C.
+Thời gian chạy gần tuyến tính theo số khóa khác nhau.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from text_normalize import normalize_text
+
+# Các từ chỉ loại hình doanh nghiệp, bỏ khi so khớp tên (đã bỏ dấu, chữ thường)
+COMPANY_STOPWORDS = [
+    "cong ty co phan", "cong ty tnhh", "cong ty", "cty cp", "cty tnhh", "cty",
+    "tnhh", "mtv", "mot thanh vien", "co phan", "cp", "trach nhiem huu han",
+    "doanh nghiep tu nhan", "dntn", "jsc", "co ltd", "ltd", "company", "corp", "inc",
+    # Các từ chỉ ngành nghề rất phổ biến, làm các tên khác nhau trông giống nhau
+    "thuong mai", "dich vu", "san xuat", "xuat nhap khau", "dau tu", "phat trien",
+    "tm", "dv", "sx", "xnk", "tmdv", "va",
+]
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z]+")
+_STOPWORDS_RE = re.compile(
+    r"\b(?:" + "|".join(sorted((re.escape(w) for w in COMPANY_STOPWORDS), key=len, reverse=True)) + r")\b"
+)
+_SPACES_RE = re.compile(r"\s+")
+
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_NGRAM = 3
+# Trong một bucket, mỗi khóa chỉ so với tối đa WINDOW khóa kế tiếp để tránh bùng nổ
+# số cặp khi bucket quá lớn (ví dụ hàng nghìn tên rất ngắn giống nhau)
+DEFAULT_WINDOW = 20
+# Cặp ứng viên có độ giống ước lượng (từ MinHash) thấp hơn ngưỡng quá mức này bị loại
+# trước khi tính Jaccard thật (sai số ước lượng với 64 hoán vị khoảng 0.06)
+ESTIMATE_MARGIN = 0.2
+
+# Tên các cột thêm vào kết quả
+CLUSTER_COL = "Nhóm trùng"
+SCORE_COL = "Độ giống"
+KEY_COL = "Khóa so khớp"
+
+
+def normalize_name(value):
+    """Chuẩn hóa tên để so khớp: bỏ dấu, chữ thường, bỏ ký tự đặc biệt và từ loại hình doanh nghiệp."""
+    if pd.isna(value):
+        return ""
+    text = _NON_ALNUM_RE.sub(" ", normalize_text(str(value)))
+    text = _STOPWORDS_RE.sub(" ", text)
+    return _SPACES_RE.sub(" ", text).strip()
+
+def normalize_names(series):
+    """Chuẩn hóa cả cột, mỗi giá trị khác nhau chỉ xử lý một lần."""
+    cache = {value: normalize_name(value) for value in pd.unique(series.astype(object))}
+    return series.astype(object).map(cache)
+
+def ngrams(text, n=DEFAULT_NGRAM):
+    """Tập n-gram ký tự của text (thêm khoảng trắng hai đầu để giữ đầu/cuối từ)."""
+    text = f" {text} "
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def minhash_signatures(keys, num_perm=DEFAULT_NUM_PERM, ngram=DEFAULT_NGRAM, seed=1):
+    """
+    Chữ ký MinHash (mảng n_keys x num_perm) của tập n-gram từng khóa đã chuẩn hóa.
+    Khóa chỉ gồm [0-9a-z ] nên mỗi n-gram được mã hóa thành số nguyên trực tiếp từ
+    bytes, và mỗi hoán vị được tính trên toàn bộ n-gram cùng lúc bằng numpy.
+    """
+    padded = [f" {key} " for key in keys]
+    lengths = np.fromiter((len(text) for text in padded), dtype=np.int64, count=len(padded))
+    buffer = np.frombuffer("".join(padded).encode("ascii"), dtype=np.uint8).astype(np.uint64)
+    starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+
+    # Vị trí bắt đầu của mọi n-gram, không vượt qua ranh giới giữa hai khóa
+    counts = np.maximum(lengths - ngram + 1, 1)
+    offsets = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    positions = np.repeat(starts - offsets, counts) + np.arange(int(counts.sum()))
+    grams = np.zeros(len(positions), dtype=np.uint64)
+    for i in range(ngram):
+        grams = (grams << np.uint64(8)) | buffer[np.minimum(positions + i, len(buffer) - 1)]
+
+    # Số n-gram khác nhau rất ít (tối đa 37^3), nên chỉ băm các n-gram khác nhau rồi tra bảng
+    present = np.zeros(1 << (8 * ngram), dtype=bool)
+    present[grams] = True
+    unique_grams = np.flatnonzero(present).astype(np.uint64)
+    lookup = np.zeros(len(present), dtype=np.int32)
+    lookup[unique_grams] = np.arange(len(unique_grams), dtype=np.int32)
+    gram_ids = lookup[grams]
+    del present, lookup
+
+    # Băm nhân-dịch (multiply-shift): ((a * x + b) mod 2^64) >> 32, tràn số là chủ ý
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((num_perm, len(counts)), dtype=np.uint32)
+    with np.errstate(over="ignore"):
+        for i in range(num_perm):
+            table = ((a[i] * unique_grams + b[i]) >> np.uint64(32)).astype(np.uint32)
+            np.minimum.reduceat(table[gram_ids], offsets, out=signatures[i])
+    return signatures.T
+
+def lsh_candidate_pairs(signatures, bands=DEFAULT_BANDS, window=DEFAULT_WINDOW):
+    """
+    Các cặp khóa (i, j) với i < j rơi cùng bucket ở ít nhất một band.
+    Trả về mảng n_pairs x 2 không trùng lặp.
+    """
+    n_keys, num_perm = signatures.shape
+    rows = num_perm // bands
+    pairs = []
+    with np.errstate(over="ignore"):
+        for band in range(bands):
+            # Gộp các dòng của band thành một giá trị băm 64 bit làm mã bucket
+            bucket = np.zeros(n_keys, dtype=np.uint64)
+            for col in range(band * rows, (band + 1) * rows):
+                bucket = bucket * np.uint64(0x100000001B3) ^ signatures[:, col].astype(np.uint64)
+            order = np.argsort(bucket, kind="stable")
+            sorted_bucket = bucket[order]
+            for step in range(1, min(window, n_keys - 1) + 1):
+                same = sorted_bucket[step:] == sorted_bucket[:-step]
+                if not same.any():
+                    break
+                pairs.append(np.column_stack([order[:-step][same], order[step:][same]]))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    # Bỏ cặp trùng (cùng cặp xuất hiện ở nhiều band) bằng mã i * n_keys + j
+    codes = np.unique(pairs[:, 0] * n_keys + pairs[:, 1])
+    return np.column_stack([codes // n_keys, codes % n_keys])
+
+def estimated_similarity(signatures, pairs):
+    """Độ giống Jaccard ước lượng từ chữ ký MinHash cho từng cặp."""
+    return (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+
+def _no_progress(done, total, text=""):
+    pass
+
+def _representative_clusters(n, pairs, scores, sizes):
+    """
+    Gom n khóa thành nhóm quanh khóa đại diện. Lần lượt theo số dòng (rồi số cặp) giảm dần,
+    khóa chưa thuộc nhóm nào làm đại diện và nhận các khóa chưa có nhóm nối trực tiếp với nó
+    trong pairs (độ giống scores đạt ngưỡng).
+    Trả về (nhãn nhóm là số thứ tự của khóa đại diện, -1 nếu không thuộc nhóm nào;
+    độ giống với khóa đại diện, 1.0 với chính đại diện).
+    """
+    labels = np.full(n, -1, dtype=np.int64)
+    rep_scores = np.zeros(n)
+    if not len(pairs):
+        return labels, rep_scores
+
+    # Danh sách kề dạng CSR: các khóa nối với khóa k là neighbors[starts[k]:starts[k + 1]]
+    edges = np.concatenate([pairs, pairs[:, ::-1]])
+    edge_scores = np.concatenate([scores, scores])
+    order = np.argsort(edges[:, 0], kind="stable")
+    neighbors, neighbor_scores = edges[order, 1], edge_scores[order]
+    starts = np.searchsorted(edges[order, 0], np.arange(n + 1))
+    degree = np.diff(starts)
+
+    for key in np.lexsort((np.arange(n), -degree, -sizes)):
+        if labels[key] >= 0 or degree[key] == 0:
+            continue
+        members = neighbors[starts[key]:starts[key + 1]]
+        free = labels[members] < 0
+        if not free.any():
+            continue
+        labels[key] = key
+        rep_scores[key] = 1.0
+        labels[members[free]] = key
+        rep_scores[members[free]] = neighbor_scores[starts[key]:starts[key + 1]][free]
+    return labels, rep_scores
+
+def fuzzy_duplicate_clusters(values, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM,
+                             bands=DEFAULT_BANDS, ngram=DEFAULT_NGRAM, window=DEFAULT_WINDOW, progress=_no_progress):
+    """
+    Gom các giá trị gần giống nhau thành nhóm.
+    Trả về (nhãn nhóm theo từng dòng, độ giống theo từng dòng, khóa chuẩn hóa theo từng dòng).
+    Nhãn -1 là dòng không thuộc nhóm nào (hoặc khóa trống). Độ giống của một dòng là
+    độ giống Jaccard với khóa đại diện của nhóm (1.0 nếu cùng khóa với đại diện).
+    progress(bước, tổng số bước, mô tả) được gọi trước mỗi bước.
+    """
+    progress(0, 4, "Chuẩn hóa tên")
+    keys = normalize_names(pd.Series(values))
+    codes, uniques = pd.factorize(keys)
+    n_keys = len(uniques)
+    key_labels = np.full(n_keys, -1, dtype=np.int64)
+    key_scores = np.zeros(n_keys)
+
+    non_blank = np.flatnonzero(uniques != "")
+    if len(non_blank) > 0:
+        keys_non_blank = uniques[non_blank]
+        progress(1, 4, "Tính chữ ký MinHash")
+        signatures = minhash_signatures(keys_non_blank, num_perm=num_perm, ngram=ngram)
+        progress(2, 4, "Tìm cặp ứng viên (LSH)")
+        candidates = lsh_candidate_pairs(signatures, bands=bands, window=window)
+        candidates = candidates[estimated_similarity(signatures, candidates) >= threshold - ESTIMATE_MARGIN]
+        progress(3, 4, f"Kiểm tra {len(candidates)} cặp ứng viên")
+
+        # Độ giống thật trên tập n-gram, chỉ cho các cặp còn lại
+        shingles = {}
+        def shingles_of(k):
+            if k not in shingles:
+                shingles[k] = ngrams(keys_non_blank[k], ngram)
+            return shingles[k]
+        scores = np.array([jaccard(shingles_of(i), shingles_of(j)) for i, j in candidates], dtype=float)
+        matched = scores >= threshold
+        pairs, scores = candidates[matched], scores[matched]
+
+        sizes = np.bincount(codes[codes >= 0], minlength=n_keys)[non_blank]
+        labels, rep_scores = _representative_clusters(len(non_blank), pairs, scores, sizes)
+        key_labels[non_blank] = np.where(labels >= 0, non_blank[np.maximum(labels, 0)], -1)
+        key_scores[non_blank] = rep_scores
+
+    # Ánh xạ về từng dòng; khóa xuất hiện ở nhiều dòng là trùng tuyệt đối (độ giống 1.0)
+    codes = np.asarray(codes)
+    valid = codes >= 0
+    row_labels = np.full(len(codes), -1, dtype=np.int64)
+    row_scores = np.zeros(len(codes))
+    row_labels[valid] = key_labels[codes[valid]]
+    row_scores[valid] = key_scores[codes[valid]]
+
+    counts = np.bincount(codes[valid], minlength=n_keys)
+    repeated = valid & (counts[np.where(valid, codes, 0)] > 1) & (keys.to_numpy() != "")
+    # Khóa không giống khóa nào khác nhưng lặp lại ở nhiều dòng: một nhóm riêng, độ giống 1.0
+    alone = repeated & (row_labels < 0)
+    row_scores[alone] = 1.0
+    row_labels[alone] = n_keys + codes[alone]
+    return row_labels, row_scores, keys.to_numpy()
+
+def find_fuzzy_duplicates(df, column, threshold=DEFAULT_THRESHOLD, **options):
+    """
+    Các dòng có giá trị trong cột column gần giống ít nhất một dòng khác.
+    Kết quả thêm cột nhóm, độ giống, khóa chuẩn hóa và được sắp xếp theo nhóm.
+    """
+    labels, scores, keys = fuzzy_duplicate_clusters(df[column], threshold=threshold, **options)
+    in_cluster = labels >= 0
+    df_result = df[in_cluster].copy()
+    # Đánh số nhóm 1, 2, 3, ... theo thứ tự xuất hiện
+    cluster_ids, _ = pd.factorize(labels[in_cluster])
+    df_result[CLUSTER_COL] = cluster_ids + 1
+    df_result[SCORE_COL] = np.round(scores[in_cluster], 3)
+    df_result[KEY_COL] = keys[in_cluster]
+    return df_result.sort_values(CLUSTER_COL, kind="stable")
@@ -0,0 +1,99 @@
+"""
+Chạy các thao tác nặng trong nền (thread pool) để giao diện không bị treo:
+báo tiến độ, hủy giữa chừng và giữ kết quả sau khi chạy xong.
+"""
+import itertools
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+# Trạng thái của job
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Job bị hủy: được ném ra tại lần báo tiến độ tiếp theo sau khi người dùng bấm hủy."""
+
+
+class Job:
+    """
+    Một lần chạy func(job) trong nền. func báo tiến độ bằng job.progress(done, total, text);
+    mỗi lần báo tiến độ cũng là điểm dừng khi job bị hủy.
+    Thao tác không có điểm báo tiến độ vẫn chạy hết, nhưng kết quả bị bỏ nếu job đã bị hủy.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, label, params=None):
+        self.id = next(self._ids)
+        self.label = label
+        self.params = params
+        self.status = JOB_RUNNING
+        self.fraction = None
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self._cancel = threading.Event()
+
+    @property
+    def running(self):
+        return self.status == JOB_RUNNING
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def seconds(self):
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def cancel(self):
+        self._cancel.set()
+
+    def progress(self, done, total=None, text=""):
+        """Cập nhật tiến độ (done/total nếu có total) và dừng job nếu đã bị hủy."""
+        if self.cancelled:
+            raise JobCancelled()
+        if total:
+            self.fraction = min(done / total, 1.0)
+        self.message = text or (f"{done}/{total}" if total else "")
+
+    def _run(self, func):
+        try:
+            result = func(self)
+            if self.cancelled:
+                raise JobCancelled()
+            self.result = result
+            self.fraction = 1.0
+            self.status = JOB_DONE
+        except JobCancelled:
+            self.status = JOB_CANCELLED
+        except Exception as e:
+            self.error = e
+            self.traceback = traceback.format_exc()
+            self.status = JOB_FAILED
+        finally:
+            self.finished_at = time.perf_counter()
+
+
+class JobRunner:
+    """Thread pool dùng chung để chạy các Job (các thao tác pandas/numpy nhả GIL phần lớn thời gian)."""
+
+    def __init__(self, max_workers=None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or min(4, os.cpu_count() or 1), thread_name_prefix="cleandata_job"
+        )
+
+    def submit(self, func, label, params=None):
+        """Chạy func(job) trong nền, trả về Job ngay lập tức."""
+        job = Job(label, params)
+        self._executor.submit(job._run, func)
+        return job
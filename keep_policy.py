@@ -0,0 +1,138 @@
+"""
+Chọn dòng giữ lại trong mỗi nhóm trùng theo danh sách tiêu chí có thứ tự ưu tiên
+(domain email ưu tiên, giá trị lớn / nhỏ nhất của một cột, nhiều ô có dữ liệu nhất, dòng mới nhất).
+Mỗi tiêu chí được đổi thành một cột điểm (càng lớn càng được ưu tiên), tất cả các nhóm được
+xử lý bằng một lần sắp xếp theo (nhóm, điểm...) rồi lấy dòng đầu mỗi nhóm. Hòa ở mọi tiêu chí
+thì giữ dòng đứng trước trong dữ liệu gốc.
+"""
+import collections
+
+import numpy as np
+import pandas as pd
+
+from backends import BACKEND_PANDAS, group_ids
+from data_io import decategorize
+
+# Các loại tiêu chí
+RULE_DOMAIN = "Email thuộc domain ưu tiên"
+RULE_MAX = "Giá trị lớn nhất của cột"
+RULE_MIN = "Giá trị nhỏ nhất của cột"
+RULE_FILLED = "Nhiều ô có dữ liệu nhất"
+RULE_NEWEST = "Dòng mới nhất"
+RULE_KINDS = [RULE_DOMAIN, RULE_MAX, RULE_MIN, RULE_FILLED, RULE_NEWEST]
+# Quyết định khi mọi tiêu chí đều hòa
+DECIDED_BY_ORDER = "Dòng đứng trước"
+
+KeepRule = collections.namedtuple("KeepRule", ["kind", "column", "values"], defaults=(None, None))
+KeepRule.__doc__ = """
+Một tiêu chí giữ dòng. column: cột email (RULE_DOMAIN), cột so sánh (RULE_MAX / RULE_MIN)
+hoặc cột ngày (RULE_NEWEST, None = dòng nằm sau cùng là mới nhất); values: các domain
+theo thứ tự ưu tiên (RULE_DOMAIN).
+"""
+
+
+def rule_label(rule):
+    """Tên hiển thị của một tiêu chí, ví dụ "Giá trị lớn nhất của cột (Doanh thu)"."""
+    detail = ", ".join(rule.values) if rule.kind == RULE_DOMAIN and rule.values else rule.column
+    return f"{rule.kind} ({detail})" if detail else rule.kind
+
+def _missing_last(values):
+    """Điểm dạng float, giá trị thiếu (NaN) xếp sau cùng."""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isnan(values), -np.inf, values)
+
+def _domain_scores(emails, domains):
+    """Domain đứng trước trong domains được điểm cao hơn; email khác domain hoặc trống được 0."""
+    points = {domain.strip().lower(): len(domains) - i for i, domain in enumerate(domains)}
+    emails = decategorize(emails).astype(object)
+    text = emails.where(emails.notna(), "").astype(str)
+    found = text.str.rpartition("@")[2].str.strip().str.lower().map(points)
+    return found.fillna(0).to_numpy(dtype=float)
+
+def _filled_counts(df):
+    """Số ô có dữ liệu của mỗi dòng (bỏ qua ô trống và chuỗi chỉ có khoảng trắng)."""
+    counts = np.zeros(len(df))
+    for column in df.columns:
+        values = decategorize(df[column])
+        filled = values.notna().to_numpy(dtype=bool, copy=True)
+        if pd.api.types.is_string_dtype(values.dtype) or values.dtype == object:
+            text = values.astype(object).where(values.notna(), "").astype(str)
+            filled &= text.str.strip().ne("").to_numpy(dtype=bool)
+        counts += filled
+    return counts
+
+def _datetime_scores(dates):
+    dates = dates.to_numpy(dtype="datetime64[ns]")
+    scores = dates.astype("int64").astype(float)
+    scores[np.isnat(dates)] = -np.inf
+    return scores
+
+def _date_scores(values):
+    """
+    Điểm theo ngày (mới hơn được điểm cao hơn, ngày trống / sai xếp sau cùng). Chuỗi dạng ISO
+    (2023-05-01, kể cả giờ) đọc theo năm-tháng-ngày, các chuỗi khác đọc theo ngày/tháng/năm.
+    """
+    values = decategorize(values)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return _datetime_scores(values)
+    text = values.astype(object).where(values.notna(), "").astype(str).str.strip()
+    iso = text.str.match(r"\d{4}-").to_numpy(dtype=bool)
+    scores = np.full(len(text), -np.inf)
+    for mask, dayfirst in ((iso, False), (~iso, True)):
+        if mask.any():
+            dates = pd.to_datetime(text[mask], errors="coerce", dayfirst=dayfirst, format="mixed")
+            scores[mask] = _datetime_scores(dates)
+    return scores
+
+def rule_scores(df, rule):
+    """Điểm của từng dòng theo một tiêu chí (mảng float, càng lớn càng được giữ)."""
+    if rule.kind == RULE_DOMAIN:
+        return _domain_scores(df[rule.column or "Email"], list(rule.values or []))
+    if rule.kind in (RULE_MAX, RULE_MIN):
+        values = pd.to_numeric(decategorize(df[rule.column]), errors="coerce").to_numpy(dtype=float)
+        return _missing_last(values if rule.kind == RULE_MAX else -values)
+    if rule.kind == RULE_FILLED:
+        return _filled_counts(df)
+    if rule.kind == RULE_NEWEST:
+        if rule.column is None:
+            return np.arange(len(df), dtype=float)
+        return _date_scores(df[rule.column])
+    raise ValueError(f"Tiêu chí giữ dòng không hợp lệ: {rule.kind}")
+
+def rank_keep(df, keys, rules, backend=BACKEND_PANDAS):
+    """
+    Chọn một dòng trong mỗi nhóm có cùng giá trị ở các cột keys (các khóa trống coi là trùng nhau).
+    Trả về (vị trí các dòng được giữ theo thứ tự gốc, decided_by) với decided_by là tên tiêu chí
+    quyết định nhóm của từng dòng được giữ: tiêu chí đầu tiên mà dòng được giữ hơn hẳn dòng xếp
+    thứ hai, DECIDED_BY_ORDER nếu hòa ở mọi tiêu chí, None nếu dòng không trùng với dòng nào.
+    backend: engine tính số nhóm của các khóa (backends.BACKENDS).
+    """
+    n = len(df)
+    groups = group_ids(keys, backend)
+    scores = [rule_scores(df, rule) for rule in rules]
+    # lexsort lấy khóa cuối làm khóa chính: nhóm, rồi điểm giảm dần theo thứ tự tiêu chí, rồi vị trí
+    order = np.lexsort([np.arange(n)] + [-score for score in reversed(scores)] + [groups])
+    sorted_groups = groups[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    winners = np.flatnonzero(first)
+
+    # Dòng xếp thứ hai của nhóm (nếu có) cho biết tiêu chí nào đã phân định
+    has_runner_up = np.zeros(len(winners), dtype=bool)
+    inside = winners + 1 < n
+    has_runner_up[inside] = ~first[winners[inside] + 1]
+    labels = np.array([rule_label(rule) for rule in rules] + [DECIDED_BY_ORDER, None], dtype=object)
+    decided = np.full(len(winners), len(rules) + 1)
+    if has_runner_up.any():
+        best, runner_up = order[winners[has_runner_up]], order[winners[has_runner_up] + 1]
+        differs = np.array([score[best] != score[runner_up] for score in scores] + [np.ones(len(best), dtype=bool)])
+        decided[has_runner_up] = differs.argmax(axis=0)
+
+    kept = order[winners]
+    in_order = np.argsort(kept, kind="stable")
+    return kept[in_order], labels[decided[in_order]]
+
+def decision_counts(decided_by):
+    """Số nhóm trùng được quyết định bởi từng tiêu chí (bỏ qua các dòng không trùng)."""
+    counts = pd.Series(decided_by, dtype=object).dropna().value_counts(sort=False)
+    return pd.DataFrame({"Tiêu chí quyết định": counts.index, "Số nhóm": counts.to_numpy()})
@@ -0,0 +1,155 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+# File SQLite mặc định lưu chỉ mục master (có thể đổi bằng biến môi trường CLEANDATA_MASTER_DB)
+DEFAULT_MASTER_PATH = os.environ.get(
+    "CLEANDATA_MASTER_DB", os.path.join(os.path.expanduser("~"), ".cleandata", "master_index.sqlite")
+)
+
+# Tên các cột thêm vào kết quả kiểm tra
+IN_MASTER_COL = "Đã có trong master"
+MASTER_SOURCE_COL = "Nguồn master"
+MASTER_ADDED_COL = "Ngày thêm vào master"
+
+# Số khóa gửi sang SQLite mỗi lần (giới hạn bộ nhớ khi lô lớn)
+BATCH_SIZE = 50_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS master_keys (
+    key_set TEXT NOT NULL,
+    key_hash BLOB NOT NULL,
+    key_text TEXT NOT NULL,
+    source TEXT,
+    added_at TEXT NOT NULL,
+    PRIMARY KEY (key_set, key_hash)
+) WITHOUT ROWID;
+"""
+
+
+def key_set_name(columns):
+    """Tên bộ cột khóa (mỗi bộ cột có chỉ mục riêng trong cùng file)."""
+    return json.dumps(list(columns), ensure_ascii=False)
+
+def row_keys(df, columns):
+    """
+    Khóa của từng dòng: các giá trị của cột khóa (bỏ khoảng trắng đầu/cuối) nối bằng ký tự \\x1f.
+    Dòng có ô khóa trống nhận None và không được đưa vào chỉ mục.
+    """
+    values = df[list(columns)].astype(object)
+    blank = values.isna().to_numpy().any(axis=1)
+    text = values.where(~values.isna(), "").astype(str).apply(lambda col: col.str.strip())
+    blank |= (text == "").to_numpy().any(axis=1)
+    keys = text.iloc[:, 0].str.cat([text[col] for col in text.columns[1:]], sep="\x1f")
+    keys = keys.to_numpy(dtype=object)
+    keys[blank] = None
+    return keys
+
+def hash_key(key):
+    return hashlib.sha1(key.encode("utf-8")).digest()
+
+
+class MasterIndex:
+    """
+    Chỉ mục khóa trùng lưu trên đĩa (SQLite) cho toàn bộ dữ liệu đã nhập trước đây.
+    Chỉ lưu khóa (băm SHA-1 + giá trị), nguồn và ngày thêm; kiểm tra và thêm một lô mới
+    chỉ tốn thời gian theo kích thước lô, không cần đọc lại dữ liệu cũ.
+    """
+
+    def __init__(self, path=DEFAULT_MASTER_PATH):
+        self.path = os.fspath(path)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.execute("CREATE TEMP TABLE lookup_keys (key_hash BLOB PRIMARY KEY)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def lookup(self, df, columns):
+        """
+        Kiểm tra từng dòng của df đã có trong master chưa.
+        Trả về DataFrame cùng index với df gồm 3 cột: đã có, nguồn, ngày thêm.
+        """
+        keys = row_keys(df, columns)
+        key_set = key_set_name(columns)
+        found = {}
+        unique_keys = list({key for key in keys if key is not None})
+        # Kết thúc giao dịch của bảng tạm sau mỗi lần kiểm tra, nếu không kết nối (dùng chung trong app)
+        # sẽ đọc mãi bản chụp cũ và không thấy các khóa được thêm sau đó từ tiến trình khác
+        with self._lock, self._conn:
+            for start in range(0, len(unique_keys), BATCH_SIZE):
+                batch = unique_keys[start:start + BATCH_SIZE]
+                hashes = {hash_key(key): key for key in batch}
+                self._conn.execute("DELETE FROM lookup_keys")
+                self._conn.executemany("INSERT OR IGNORE INTO lookup_keys VALUES (?)", ((h,) for h in hashes))
+                rows = self._conn.execute(
+                    "SELECT m.key_hash, m.source, m.added_at FROM lookup_keys l "
+                    "JOIN master_keys m ON m.key_set = ? AND m.key_hash = l.key_hash",
+                    (key_set,)
+                )
+                for key_hash, source, added_at in rows:
+                    found[hashes[key_hash]] = (source, added_at)
+
+        info = [found.get(key) if key is not None else None for key in keys]
+        return pd.DataFrame({
+            IN_MASTER_COL: np.array([item is not None for item in info], dtype=bool),
+            MASTER_SOURCE_COL: [item[0] if item else None for item in info],
+            MASTER_ADDED_COL: [item[1] if item else None for item in info],
+        }, index=df.index)
+
+    def add(self, df, columns, source=None):
+        """Thêm khóa của các dòng vào master (khóa đã có được giữ nguyên). Trả về số khóa mới."""
+        keys = row_keys(df, columns)
+        key_set = key_set_name(columns)
+        added_at = datetime.datetime.now().isoformat(timespec="seconds")
+        # Ghi theo thứ tự băm để SQLite chèn tuần tự vào B-tree
+        entries = sorted((hash_key(key), key) for key in {key for key in keys if key is not None})
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            for start in range(0, len(entries), BATCH_SIZE):
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO master_keys VALUES (?, ?, ?, ?, ?)",
+                    ((key_set, key_hash, key, source, added_at) for key_hash, key in entries[start:start + BATCH_SIZE])
+                )
+            return self._conn.total_changes - before
+
+    def key_sets(self):
+        """Các bộ cột khóa đã có trong master và số khóa của mỗi bộ."""
+        with self._lock:
+            rows = self._conn.execute("SELECT key_set, COUNT(*) FROM master_keys GROUP BY key_set").fetchall()
+        return {tuple(json.loads(key_set)): count for key_set, count in rows}
+
+    def clear(self, columns=None):
+        """Xóa toàn bộ master, hoặc chỉ bộ cột khóa columns."""
+        with self._lock, self._conn:
+            if columns is None:
+                self._conn.execute("DELETE FROM master_keys")
+            else:
+                self._conn.execute("DELETE FROM master_keys WHERE key_set = ?", (key_set_name(columns),))
+
+def check_against_master(df, columns, index, add_new=False, source=None):
+    """
+    Đánh dấu các dòng của df đã có trong master; nếu add_new thì thêm các dòng mới vào master.
+    Trả về (df có thêm cột kết quả, số khóa mới được thêm).
+    """
+    df_result = pd.concat([df, index.lookup(df, columns)], axis=1)
+    added = index.add(df[~df_result[IN_MASTER_COL]], columns, source=source) if add_new else 0
+    return df_result, added
@@ -0,0 +1,419 @@
+"""
+Các thao tác xử lý dữ liệu dùng chung cho giao diện Streamlit (app.py)
+và chạy dòng lệnh (cli.py). Các hàm ở đây không gọi st.* và không
+thay đổi DataFrame đầu vào.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from data_io import decategorize, fillna_keep_categories
+from email_utils import (
+    valid_email_mask,
+    clean_and_normalize_emails,
+    build_domain_corrector,
+    correct_email_domains,
+)
+from backends import BACKEND_PANDAS, duplicated, match_positions
+from keep_policy import KeepRule, RULE_DOMAIN, RULE_MAX, RULE_MIN, rank_keep
+from text_normalize import normalize_column
+
+KEEP_FIRST = "Giữ dòng đầu tiên"
+KEEP_GMAIL = "Giữ dòng có Email @gmail.com"
+KEEP_COMPARE = "So sánh theo cột cụ thể"
+KEEP_RANKED = "Theo nhiều tiêu chí ưu tiên"
+KEEP_METHODS = [KEEP_FIRST, KEEP_GMAIL, KEEP_COMPARE, KEEP_RANKED]
+
+COMPARE_MAX = "Lớn nhất"
+COMPARE_MIN = "Nhỏ nhất"
+
+
+def _no_progress(done, total, text=""):
+    pass
+
+
+# --- Clean Email ---
+def fix_emails(df, email_col="Email", name_col="Tên", correct_domains=True, progress=_no_progress,
+               corrector=None):
+    """
+    Sửa các email không hợp lệ; nếu correct_domains thì sửa thêm domain gõ sai
+    (gmial.com, gmail.con, ...) của tất cả email, dùng từ điển domain từ các email hợp lệ
+    (hoặc corrector nếu có, ví dụ từ điển của cả file khi xử lý từng phần).
+    Trả về (df_fixed, df_compare) với df_compare gồm email_original và email_fixed
+    của các dòng đã sửa. progress(bước, tổng số bước, mô tả) được gọi trước mỗi bước.
+    """
+    progress(0, 3, "Kiểm tra email hợp lệ")
+    valid_mask = valid_email_mask(df[email_col])
+    df_invalid = df[~valid_mask]
+    progress(1, 3, f"Sửa {len(df_invalid)} email không hợp lệ")
+    email_fixed = clean_and_normalize_emails(df_invalid[email_col], df_invalid[name_col])
+
+    df_fixed = df.copy()
+    # Cột chuỗi (kể cả chuỗi Arrow/category) giữ kiểu chuỗi, cột khác chuyển sang object để gán email
+    emails = decategorize(df_fixed[email_col])
+    text_dtype = emails.dtype if pd.api.types.is_string_dtype(emails.dtype) else object
+    df_fixed[email_col] = emails.astype(text_dtype)
+    df_fixed.loc[~valid_mask, email_col] = email_fixed
+    changed = ~valid_mask
+
+    if correct_domains:
+        progress(2, 3, "Sửa domain gõ sai")
+        if corrector is None:
+            corrector = build_domain_corrector(df.loc[valid_mask, email_col])
+        corrected = correct_email_domains(df_fixed[email_col], corrector)
+        changed = changed | (corrected.ne(df_fixed[email_col]) & corrected.notna())
+        df_fixed[email_col] = corrected.astype(text_dtype)
+
+    df_compare = pd.DataFrame({
+        "email_original": df.loc[changed, email_col],
+        "email_fixed": df_fixed.loc[changed, email_col],
+    })
+    return df_fixed, df_compare
+
+
+# --- Check Data / Check duplicate ---
+def dedup_keys(df, columns, normalize=False):
+    """
+    Các cột khóa dùng để so trùng. normalize=True thì so sau khi chuẩn hóa
+    (bỏ dấu, bỏ ký tự ẩn, không phân biệt hoa thường, gộp khoảng trắng).
+    """
+    keys = df[columns]
+    return keys.apply(normalize_column) if normalize else keys
+
+def find_duplicates(df, columns, sort=False, normalize=False, backend=BACKEND_PANDAS):
+    """
+    Lấy tất cả các dòng trùng lặp theo các cột, có thể sắp xếp để các dòng trùng nằm gần nhau.
+    backend: engine so khóa (backends.BACKENDS), kết quả như nhau.
+    """
+    keys = dedup_keys(df, columns, normalize)
+    if sort:
+        order = keys.reset_index(drop=True).sort_values(by=list(keys.columns)).index
+        df, keys = df.iloc[order].reset_index(drop=True), keys.iloc[order]
+    return df[duplicated(keys, keep=False, backend=backend)]
+
+def keep_rules(method, compare_column=None, compare_type=COMPARE_MAX, rules=None):
+    """Danh sách tiêu chí (keep_policy.KeepRule) tương ứng với cách giữ dòng."""
+    if method == KEEP_FIRST:
+        return []
+    if method == KEEP_GMAIL:
+        return [KeepRule(RULE_DOMAIN, "Email", ["gmail.com"])]
+    if method == KEEP_COMPARE:
+        return [KeepRule(RULE_MAX if compare_type == COMPARE_MAX else RULE_MIN, compare_column)]
+    if method == KEEP_RANKED:
+        return list(rules or [])
+    raise ValueError(f"Cách giữ dòng không hợp lệ: {method}")
+
+def drop_duplicates_ranked(df, columns, rules, normalize=False, backend=BACKEND_PANDAS):
+    """
+    Loại bỏ các dòng trùng theo các cột, giữ một dòng mỗi nhóm theo danh sách tiêu chí rules
+    (xem keep_policy.rank_keep). Trả về (df_kept, decided_by) với decided_by là tiêu chí
+    quyết định nhóm của từng dòng được giữ (None với dòng không trùng).
+    """
+    keys = dedup_keys(df, columns, normalize)
+    kept, decided_by = rank_keep(df, keys, rules, backend=backend)
+    df_kept = df.iloc[kept]
+    return df_kept, pd.Series(decided_by, index=df_kept.index, dtype=object)
+
+def drop_duplicate_rows(df, columns, method=KEEP_FIRST, compare_column=None, compare_type=COMPARE_MAX,
+                        normalize=False, rules=None, backend=BACKEND_PANDAS):
+    """
+    Loại bỏ các dòng trùng theo các cột (chuẩn hóa trước nếu normalize), giữ lại dòng theo cách được chọn.
+    Nhóm không có dòng nào hơn hẳn theo tiêu chí (không có Email @gmail.com, cột so sánh trống)
+    vẫn giữ dòng đầu tiên; các dòng được giữ theo thứ tự gốc.
+    """
+    rules = keep_rules(method, compare_column, compare_type, rules)
+    return drop_duplicates_ranked(df, columns, rules, normalize, backend)[0]
+
+def split_into_chunks(df, chunk_size):
+    """Chia DataFrame thành các phần nhỏ, mỗi phần tối đa chunk_size dòng."""
+    for chunk_start in range(0, df.shape[0], chunk_size):
+        yield df.iloc[chunk_start: chunk_start + chunk_size]
+
+
+# --- Merge Data ---
+def merge_blocks_legacy(df, x_col, y_col):
+    """Cách gộp cũ duyệt từng khối, giữ lại để đối chiếu kết quả với merge_blocks."""
+    df = df.copy()
+    # Tìm chỉ số bắt đầu block
+    block_start_indices = df[df[x_col].notna()].index.tolist()
+    block_start_indices.append(len(df))  # Đảm bảo chặn cuối
+
+    rows_to_drop = set()
+
+    for i in range(len(block_start_indices) - 1):
+        start = block_start_indices[i]
+        end = block_start_indices[i + 1]
+        block = df.loc[start:end-1]
+
+        # Gom dữ liệu cột Y
+        values = (
+            block[y_col]
+            .dropna()
+            .astype(str)
+            .str.strip()
+            .loc[lambda x: x != '']
+            .unique()
+            .tolist()
+        )
+
+        value_string = ",".join(values)
+        df.at[start, y_col] = value_string
+
+        # Xoá các dòng chỉ có giá trị Y
+        idx_range = df.index[(df.index > start) & (df.index < end)]
+        for j in idx_range:
+            if (
+                pd.isna(df.at[j, x_col]) and
+                df.at[j, y_col] in values and
+                all(pd.isna(df.at[j, col]) for col in df.columns if col not in [y_col])
+            ):
+                rows_to_drop.add(j)
+
+    return df.drop(index=list(rows_to_drop)).reset_index(drop=True)
+
+def merge_blocks(df, x_col, y_col):
+    """
+    Gộp thông tin cột Y theo khối. Mỗi khối bắt đầu ở dòng có giá trị cột X;
+    các giá trị Y trong khối được nối bằng dấu phẩy vào dòng đầu khối và
+    các dòng chỉ chứa giá trị Y bị loại bỏ.
+    Xử lý theo cả cột (mã khối = tổng tích lũy các dòng bắt đầu khối) nên
+    thời gian tăng tuyến tính theo số dòng.
+    """
+    is_start = df[x_col].notna().to_numpy()
+    # Mã khối của từng dòng; -1 cho các dòng nằm trước khối đầu tiên
+    block_id = np.cumsum(is_start) - 1
+
+    # Gom dữ liệu cột Y: giá trị khác rỗng, không trùng, theo thứ tự xuất hiện trong khối
+    y = df[y_col]
+    y_text = y.dropna().astype(str).str.strip()
+    values = pd.DataFrame({"block": block_id[y.notna().to_numpy()], "value": y_text.to_numpy()})
+    values = values[(values["block"] >= 0) & (values["value"] != '')].drop_duplicates()
+    # Các giá trị đã nằm liên tiếp theo khối nên chỉ cần cắt theo ranh giới khối rồi nối
+    blocks = values["block"].to_numpy()
+    texts = values["value"].tolist()
+    starts = np.flatnonzero(np.diff(blocks, prepend=-2))
+    ends = np.append(starts[1:], len(blocks))
+    value_strings = pd.Series(
+        [",".join(texts[a:b]) for a, b in zip(starts, ends)], index=blocks[starts], dtype=object
+    )
+
+    # Dòng chỉ có giá trị Y: không phải đầu khối, Y là chuỗi đã gọn (nên có trong danh sách
+    # giá trị của khối) và mọi cột khác đều trống
+    y_raw = y.astype(object)
+    is_str = y_raw.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    y_in_values = np.zeros(len(df), dtype=bool)
+    if is_str.any():
+        y_str = y_raw[is_str]
+        y_stripped = y_str.str.strip()
+        y_in_values[is_str] = ((y_stripped == y_str) & (y_stripped != '')).to_numpy()
+    others_empty = df.drop(columns=[y_col]).isna().all(axis=1).to_numpy()
+    rows_to_drop = (block_id >= 0) & ~is_start & y_in_values & others_empty
+
+    df_result = df.copy()
+    df_result[y_col] = decategorize(df_result[y_col])
+    if not pd.api.types.is_string_dtype(df_result[y_col].dtype):
+        df_result[y_col] = df_result[y_col].astype(object)
+    start_blocks = block_id[is_start]
+    df_result.loc[is_start, y_col] = (
+        pd.Series(start_blocks).map(value_strings).fillna('').to_numpy(dtype=object)
+    )
+    return df_result[~rows_to_drop].reset_index(drop=True)
+
+
+# --- Split Data ---
+def split_row_generic(row, columns):
+    values_split = {col: str(row[col]).split('\n') for col in columns}
+    max_len = max(len(v) for v in values_split.values())
+    rows = []
+
+    for i in range(max_len):
+        new_row = row.copy()
+        for col in columns:
+            new_row[col] = values_split[col][i] if i < len(values_split[col]) else ''
+        rows.append(new_row)
+    return rows
+
+def split_multiline_rows_legacy(df, columns):
+    """Cách tách cũ theo từng dòng (iterrows), giữ lại để đối chiếu kết quả với split_multiline_rows."""
+    new_rows = []
+    for _, row in df.iterrows():
+        new_rows.extend(split_row_generic(row, columns))
+
+    df_result = pd.DataFrame(new_rows)
+    return df_result.fillna('')  # Thay NaN bằng chuỗi rỗng
+
+def _row_values(df, columns):
+    """
+    Giá trị các cột như khi đọc từng dòng bằng iterrows: nếu mọi cột đều là số
+    thì pandas ép về kiểu chung (ví dụ int -> float), ngược lại giữ nguyên giá trị.
+    """
+    if any(pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype) for dtype in df.dtypes):
+        return df[columns]
+    return pd.DataFrame(df.to_numpy(), index=df.index, columns=df.columns)[columns]
+
+def split_multiline_rows(df, columns):
+    """
+    Tách các ô có nhiều dòng (xuống dòng) trong các cột chỉ định thành nhiều dòng.
+    Mỗi dòng được tách thành số dòng bằng ô dài nhất; vị trí thiếu điền '', NaN thành 'nan'.
+    Kết quả giống split_multiline_rows_legacy nhưng xử lý theo cả cột.
+    """
+    columns = list(dict.fromkeys(columns))
+    values = _row_values(df, columns)
+
+    # Tách tất cả các cột một lần: mỗi ô thành danh sách các dòng
+    parts = {col: values[col].astype(object).map(str).str.split('\n') for col in columns}
+    lengths = {col: parts[col].str.len().to_numpy() for col in columns}
+    max_len = np.maximum.reduce([lengths[col] for col in columns]) if columns else np.ones(len(df), dtype=int)
+
+    # Vị trí dòng gốc và thứ tự trong dòng gốc của từng dòng kết quả
+    source_row = np.repeat(np.arange(len(df)), max_len)
+    position = np.arange(len(source_row)) - np.repeat(np.cumsum(max_len) - max_len, max_len)
+
+    # Tạm dùng index 0..n-1 để gán cột không bị lệch khi index gốc có giá trị trùng
+    df_result = df.take(source_row).reset_index(drop=True)
+    for col in columns:
+        flat = np.array(list(itertools.chain.from_iterable(parts[col])) + [''], dtype=object)
+        starts = np.cumsum(lengths[col]) - lengths[col]
+        has_value = position < lengths[col][source_row]
+        index = np.where(has_value, starts[source_row] + position, len(flat) - 1)
+        df_result[col] = pd.Series(flat[index]).infer_objects()
+    df_result.index = df.index[source_row]
+
+    return fillna_keep_categories(df_result, '')  # Thay NaN bằng chuỗi rỗng
+
+
+# --- Fill Data ---
+# Cách xử lý khi File B có nhiều dòng cùng khóa
+DUPLICATE_FIRST = "first"
+DUPLICATE_LAST = "last"
+DUPLICATE_ERROR = "error"
+DUPLICATE_KEY_POLICIES = [DUPLICATE_LAST, DUPLICATE_FIRST, DUPLICATE_ERROR]
+
+
+def _key_frame(df, key_cols, normalize):
+    keys = df[key_cols].reset_index(drop=True).apply(decategorize)
+    if normalize:
+        keys = keys.apply(normalize_column)
+    return keys
+
+def lookup_positions(df_a, df_b, keys_a, keys_b, normalize=False, duplicate_keys=DUPLICATE_LAST,
+                     backend=BACKEND_PANDAS):
+    """
+    Với mỗi dòng File A, tìm vị trí (theo thứ tự dòng) của dòng File B có cùng khóa, -1 nếu không có.
+    Dòng có khóa trống không được ghép. duplicate_keys quyết định dòng nào của File B
+    được dùng khi khóa bị trùng: "last" (giống cách cũ), "first" hoặc "error".
+    """
+    if len(keys_a) != len(keys_b) or not keys_a:
+        raise ValueError("Số cột khóa ở File A và File B phải bằng nhau và khác 0")
+    if duplicate_keys not in DUPLICATE_KEY_POLICIES:
+        raise ValueError(f"Cách xử lý khóa trùng không hợp lệ: {duplicate_keys}")
+
+    key_frame_a = _key_frame(df_a, keys_a, normalize)
+    key_frame_b = _key_frame(df_b, keys_b, normalize)
+    key_frame_b.columns = key_frame_a.columns
+
+    # Bỏ các dòng File B có khóa trống, rồi giữ một dòng cho mỗi khóa
+    key_frame_b = key_frame_b[key_frame_b.notna().all(axis=1)]
+    repeated = duplicated(key_frame_b, keep=False, backend=backend)
+    if duplicate_keys == DUPLICATE_ERROR and repeated.any():
+        examples = key_frame_b[repeated].drop_duplicates().head(5).values.tolist()
+        raise ValueError(f"File B có {int(repeated.sum())} dòng trùng khóa, ví dụ: {examples}")
+    key_frame_b = key_frame_b[~duplicated(key_frame_b, keep=duplicate_keys, backend=backend)]
+    return match_positions(key_frame_a, key_frame_b, backend=backend)
+
+def fill_columns(df_a, df_b, keys_a, keys_b, column_pairs, overwrite=False, normalize=False,
+                 duplicate_keys=DUPLICATE_LAST, progress=_no_progress, backend=BACKEND_PANDAS):
+    """
+    Điền nhiều cột của File A từ File B trong một lần ghép khóa.
+    column_pairs: danh sách (cột nguồn ở File B, cột đích ở File A).
+    Chỉ điền vào ô trống (NaN hoặc chuỗi rỗng) trừ khi overwrite=True.
+    Trả về (df_result, filled_masks) với filled_masks[cột đích] là mask các dòng đã được điền.
+    progress(bước, tổng số bước, mô tả) được gọi khi ghép khóa và trước mỗi cột.
+    """
+    total = len(column_pairs) + 1
+    progress(0, total, "Ghép khóa File A với File B")
+    positions = lookup_positions(df_a, df_b, keys_a, keys_b, normalize, duplicate_keys, backend)
+    matched = positions >= 0
+    take_positions = np.where(matched, positions, 0)
+
+    df_result = df_a.copy()
+    filled_masks = {}
+    for step, (source_col, target_col) in enumerate(column_pairs, start=1):
+        progress(step, total, f"Điền cột {target_col}")
+        target = decategorize(df_result[target_col]).reset_index(drop=True)
+        if overwrite:
+            fill_mask = matched
+        else:
+            is_empty = target.isna() | target.astype(str).str.strip().eq('')
+            fill_mask = matched & is_empty.to_numpy()
+
+        source = decategorize(df_b[source_col]).reset_index(drop=True)
+        if len(source):
+            source = source.take(take_positions).reset_index(drop=True)
+        else:
+            source = pd.Series(np.nan, index=target.index)
+        filled = target.mask(fill_mask, source)
+        filled.index = df_result.index
+        df_result[target_col] = filled
+        filled_masks[target_col] = fill_mask
+
+    return df_result, filled_masks
+
+def fill_from_reference(df_a, df_b, check_col_a, check_col_b, source_col_b, target_col_a, overwrite=False):
+    """
+    Điền dữ liệu cột target_col_a của File A từ cột source_col_b của File B,
+    ghép theo check_col_a == check_col_b. Trả về (df_result, filled_count).
+    """
+    df_result, filled_masks = fill_columns(
+        df_a, df_b, [check_col_a], [check_col_b], [(source_col_b, target_col_a)], overwrite=overwrite
+    )
+    return df_result, int(filled_masks[target_col_a].sum())
+
+def fill_from_reference_legacy(df_a, df_b, check_col_a, check_col_b, source_col_b, target_col_a, overwrite=False):
+    """Cách điền cũ duyệt từng dòng bằng dict, giữ lại để đối chiếu kết quả với fill_from_reference."""
+    df_result = df_a.copy()
+
+    # Tạo dictionary mapping từ File B
+    mapping_dict = df_b.set_index(check_col_b)[source_col_b].to_dict()
+
+    filled_count = 0
+    for idx, row in df_result.iterrows():
+        check_value = row[check_col_a]
+
+        # Kiểm tra xem giá trị có trong mapping không
+        if check_value in mapping_dict:
+            # Nếu overwrite=True hoặc ô đích đang trống
+            if overwrite or pd.isna(row[target_col_a]) or str(row[target_col_a]).strip() == '':
+                df_result.at[idx, target_col_a] = mapping_dict[check_value]
+                filled_count += 1
+
+    return df_result, filled_count
+
+def compare_filled(df_before, df_after, check_cols, target_cols, filled_masks=None):
+    """
+    Bảng so sánh các dòng có giá trị cột đích thay đổi sau khi điền.
+    Nếu có filled_masks (từ fill_columns) thì chỉ so sánh các dòng đã được điền.
+    """
+    check_cols = [check_cols] if isinstance(check_cols, str) else list(check_cols)
+    target_cols = [target_cols] if isinstance(target_cols, str) else list(target_cols)
+
+    columns = {col: df_after[col].array for col in check_cols}
+    changed = np.zeros(len(df_after), dtype=bool)
+    for target_col in target_cols:
+        before = df_before[target_col]
+        after = df_after[target_col]
+        columns[f'{target_col} (Trước)'] = before.array
+        columns[f'{target_col} (Sau)'] = after.array
+
+        candidates = filled_masks[target_col] if filled_masks is not None else np.ones(len(df_after), dtype=bool)
+        if candidates.any():
+            before_part = before[candidates]
+            after_part = after[candidates]
+            differs = before_part.astype(str).to_numpy() != after_part.astype(str).to_numpy()
+            both_empty = (before_part.isna() & after_part.isna()).to_numpy()
+            changed[candidates] |= differs & ~both_empty
+
+    df_compare = pd.DataFrame(columns, index=df_after.index)
+    # Chỉ giữ các dòng có thay đổi
+    return df_compare[changed]
@@ -0,0 +1,256 @@
+import contextlib
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from batch import read_batch
+from data_io import compact_frame, drop_unnamed_columns, frame_nbytes, read_table, sheet_names
+
+# Giới hạn bộ nhớ cho các DataFrame đã đọc (MB)
+DEFAULT_MAX_MB = 1024
+# Thư mục lưu tạm các DataFrame bị đẩy ra khỏi bộ nhớ dưới dạng Parquet
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "cleandata_parse_cache")
+# Giới hạn dung lượng thư mục spill (MB), file dùng lâu nhất bị xóa trước
+DEFAULT_MAX_SPILL_MB = 4096
+# Phần mở rộng của các file spill
+SPILL_EXTENSIONS = (".parquet", ".pkl")
+# pandas >= 3 luôn dùng Copy-on-Write: bản sao nông đã an toàn khi sửa, không cần chép dữ liệu
+COPY_ON_WRITE = int(pd.__version__.split(".")[0]) >= 3
+
+
+def content_digest(data):
+    """SHA-256 của nội dung file (bytes)."""
+    return hashlib.sha256(data).hexdigest()
+
+def make_cache_key(data, file_name, **read_options):
+    """Khóa cache: SHA-256 của nội dung file + loại file + các tùy chọn đọc."""
+    digest = content_digest(data)
+    ext = os.path.splitext(file_name)[1].lower()
+    options = ",".join(f"{key}={read_options[key]!r}" for key in sorted(read_options))
+    return hashlib.sha256(f"{digest}|{ext}|{options}".encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    Cache các file đã đọc thành DataFrame, dùng chung cho tất cả các tab.
+    Khi vượt quá max_bytes, DataFrame ít dùng nhất (LRU) bị loại khỏi bộ nhớ
+    và được lưu ra Parquet (hoặc pickle nếu không ghi được Parquet) trong
+    spill_dir (nếu có) để đọc lại nhanh; thư mục spill được giữ dưới max_spill_bytes
+    bằng cách xóa các file dùng lâu nhất.
+    Mỗi file chỉ được đọc một lần dù nhiều phiên cùng yêu cầu, các file khác nhau được đọc song song.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, spill_dir=DEFAULT_SPILL_DIR,
+                 max_spill_bytes=DEFAULT_MAX_SPILL_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._sheet_names = {}
+        # _lock chỉ giữ khi đọc / sửa các dict; việc đọc file giữ khóa riêng của từng khóa cache
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._trim_spill_dir()
+
+    @property
+    def nbytes(self):
+        return sum(self._sizes.values())
+
+    def read(self, data, file_name, drop_unnamed=True, compact=False, **read_options):
+        """
+        Trả về DataFrame của file (bytes + tên file), chỉ đọc file khi chưa có trong cache.
+        Các cột "Unnamed" được bỏ sau khi lấy từ cache nên không ảnh hưởng khóa cache.
+        compact=True lưu và trả về bản gọn bộ nhớ (data_io.compact_frame).
+        Kết quả là bản sao, có thể sửa tự do.
+        """
+        key_options = dict(read_options, compact=True) if compact else read_options
+        key = make_cache_key(data, file_name, **key_options)
+
+        def parse():
+            buffer = io.BytesIO(data)
+            buffer.name = file_name
+            df = read_table(buffer, drop_unnamed=False, **read_options)
+            return compact_frame(df) if compact else df
+
+        df = self._get_or_parse(key, parse)
+        if drop_unnamed:
+            df = drop_unnamed_columns(df)
+        return df.copy(deep=not COPY_ON_WRITE)
+
+    def read_batch(self, files, drop_unnamed=True, compact=False, max_workers=None, sheets=None, tag_source=True,
+                   **read_options):
+        """
+        Như read() cho nhiều file (danh sách (tên file, bytes), file zip được mở ra) và / hoặc nhiều sheet:
+        các file / sheet được đọc song song và ghép lại với cột batch.SOURCE_COL (nếu tag_source)
+        và batch.SHEET_COL (nếu có sheets, xem batch.sheet_tasks). Cache lưu bản đã ghép.
+        """
+        key_options = dict(read_options, sheets=sheets, tag_source=tag_source)
+        if compact:
+            key_options["compact"] = True
+        names = "|".join(f"{name}:{make_cache_key(data, name)}" for name, data in files)
+        key = make_cache_key(names.encode("utf-8"), ".batch", **key_options)
+
+        def parse():
+            df = read_batch(files, max_workers=max_workers, sheets=sheets, tag_source=tag_source, **read_options)
+            return compact_frame(df) if compact else df
+
+        df = self._get_or_parse(key, parse)
+        if drop_unnamed:
+            df = drop_unnamed_columns(df)
+        return df.copy(deep=not COPY_ON_WRITE)
+
+    def sheet_names(self, data, file_name):
+        """Tên các sheet của file (bytes + tên file), chỉ mở workbook lần đầu."""
+        key = make_cache_key(data, file_name)
+        with self._key_lock(key):
+            with self._lock:
+                if key in self._sheet_names:
+                    return self._sheet_names[key]
+            buffer = io.BytesIO(data)
+            buffer.name = file_name
+            names = sheet_names(buffer)
+            with self._lock:
+                self._sheet_names[key] = names
+            return names
+
+    def clear(self):
+        """Xóa cache trong bộ nhớ và các file spill."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._sheet_names.clear()
+        for path, _, _ in self._spill_files():
+            _remove_quietly(path)
+
+    @contextlib.contextmanager
+    def _key_lock(self, key):
+        """Khóa riêng của một khóa cache (bị bỏ khi không còn luồng nào dùng)."""
+        with self._lock:
+            lock, users = self._key_locks.get(key, (None, 0))
+            lock = lock or threading.Lock()
+            self._key_locks[key] = (lock, users + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, users = self._key_locks[key]
+                if users == 1:
+                    del self._key_locks[key]
+                else:
+                    self._key_locks[key] = (lock, users - 1)
+
+    def _get_or_parse(self, key, parse):
+        """DataFrame của key từ bộ nhớ, từ file spill, hoặc parse() nếu chưa có."""
+        with self._key_lock(key):
+            with self._lock:
+                df = self._get(key)
+                if df is not None:
+                    self.hits += 1
+                    return df
+                self.misses += 1
+            df = self._load_spilled(key)
+            if df is None:
+                df = parse()
+            with self._lock:
+                evicted = self._put(key, df)
+        # Ghi các mục bị loại ra đĩa ngoài khóa chung để không chặn các phiên khác
+        for old_key, old_df in evicted:
+            self._spill(old_key, old_df)
+        if evicted:
+            self._trim_spill_dir()
+        return df
+
+    def _get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def _put(self, key, df):
+        """Thêm df vào bộ nhớ; trả về các mục (khóa, DataFrame) bị loại để ghi ra đĩa."""
+        self._entries[key] = df
+        self._sizes[key] = frame_nbytes(df)
+        evicted = []
+        # Loại các mục ít dùng nhất cho tới khi nằm trong giới hạn (luôn giữ mục mới nhất)
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            old_key, old_df = self._entries.popitem(last=False)
+            del self._sizes[old_key]
+            evicted.append((old_key, old_df))
+        return evicted
+
+    def _spill_path(self, key, ext):
+        return os.path.join(self.spill_dir, f"{key}.{ext}")
+
+    def _spill(self, key, df):
+        if not self.spill_dir:
+            return
+        parquet_path = self._spill_path(key, "parquet")
+        if os.path.exists(parquet_path) or os.path.exists(self._spill_path(key, "pkl")):
+            return
+        # Ghi vào file tạm rồi đổi tên, để phiên khác không đọc phải file đang ghi dở
+        temp_path = self._spill_path(key, f"{threading.get_ident()}.tmp")
+        try:
+            try:
+                df.to_parquet(temp_path, index=False)
+                os.replace(temp_path, parquet_path)
+            except Exception:
+                # Thiếu pyarrow hoặc cột có kiểu hỗn hợp (số lẫn chữ) không ghi được Parquet:
+                # lưu dạng pickle để giữ nguyên kiểu dữ liệu
+                df.to_pickle(temp_path)
+                os.replace(temp_path, self._spill_path(key, "pkl"))
+        finally:
+            _remove_quietly(temp_path)
+
+    def _load_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        for ext, read in (("parquet", pd.read_parquet), ("pkl", pd.read_pickle)):
+            path = self._spill_path(key, ext)
+            try:
+                df = read(path)
+            except FileNotFoundError:
+                continue
+            # Đánh dấu vừa dùng để không bị xóa trước (xem _trim_spill_dir)
+            with contextlib.suppress(OSError):
+                os.utime(path)
+            return df
+        return None
+
+    def _spill_files(self):
+        """Các file spill: (đường dẫn, dung lượng, lần dùng cuối)."""
+        if not self.spill_dir or not os.path.isdir(self.spill_dir):
+            return []
+        files = []
+        with os.scandir(self.spill_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(SPILL_EXTENSIONS):
+                    with contextlib.suppress(OSError):
+                        stat = entry.stat()
+                        files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _trim_spill_dir(self):
+        """Xóa các file spill dùng lâu nhất cho tới khi thư mục nằm trong max_spill_bytes."""
+        files = sorted(self._spill_files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_spill_bytes:
+                break
+            _remove_quietly(path)
+            total -= size
+
+
+def _remove_quietly(path):
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
@@ -0,0 +1,139 @@
+"""
+Nhật ký thay đổi dạng thưa (dòng, cột, giá trị cũ, giá trị mới) trên một DataFrame gốc không đổi:
+sửa tự động và chỉnh sửa tay chỉ lưu các ô thay đổi, có hoàn tác / làm lại và xuất được
+nhật ký. DataFrame đã áp dụng thay đổi chỉ được tạo khi cần và được giữ tới lần thay đổi sau.
+Không gọi st.*.
+"""
+import pandas as pd
+
+from data_io import decategorize
+
+# Các cột của bảng nhật ký thay đổi
+AUDIT_COLUMNS = ["Bước", "Nguồn", "Dòng", "Cột", "Giá trị cũ", "Giá trị mới"]
+
+
+class PatchLog:
+    """
+    Các lần thay đổi trên base, mỗi lần (apply) là một bước gồm nhiều ô; undo / redo theo từng bước.
+    Dòng được nhận biết bằng nhãn index của base.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.version = 0
+        self._steps = []
+        self._undone = []
+        self._values = {}
+        self._materialized = None
+
+    def __len__(self):
+        return len(self._steps)
+
+    @property
+    def can_undo(self):
+        return bool(self._steps)
+
+    @property
+    def can_redo(self):
+        return bool(self._undone)
+
+    @property
+    def changed_cells(self):
+        """Số ô đang khác giá trị gốc."""
+        return len(self._values)
+
+    def value(self, row, column):
+        """Giá trị hiện tại của một ô (sau các thay đổi)."""
+        if (row, column) in self._values:
+            return self._values[(row, column)]
+        return self.base.at[row, column]
+
+    def values(self, rows, column):
+        """Giá trị hiện tại của cột column tại các dòng rows (Series theo rows)."""
+        current = self.base.loc[rows, column].astype(object)
+        changed = {row: self._values[(row, column)] for row in rows if (row, column) in self._values}
+        if changed:
+            current.loc[list(changed)] = list(changed.values())
+        return current
+
+    def apply(self, changes, source=""):
+        """
+        Thêm một bước gồm các thay đổi (dòng, cột, giá trị mới); ô không đổi giá trị được bỏ qua.
+        Xóa các bước đã hoàn tác. Trả về số ô thay đổi.
+        """
+        step = []
+        for row, column, new in changes:
+            old = self.value(row, column)
+            if _same(old, new):
+                continue
+            step.append((row, column, old, new))
+            self._set(row, column, new)
+        if step:
+            self._steps.append((source, step))
+            self._undone.clear()
+            self._changed()
+        return len(step)
+
+    def undo(self):
+        source, step = self._steps.pop()
+        for row, column, old, _ in reversed(step):
+            self._set(row, column, old)
+        self._undone.append((source, step))
+        self._changed()
+
+    def redo(self):
+        source, step = self._undone.pop()
+        for row, column, _, new in step:
+            self._set(row, column, new)
+        self._steps.append((source, step))
+        self._changed()
+
+    def touched_rows(self, column):
+        """Nhãn các dòng có ô column được thay đổi ở một bước đang có hiệu lực, theo thứ tự trong base."""
+        rows = {row for _, step in self._steps for row, col, _, _ in step if col == column}
+        return self.base.index[self.base.index.isin(list(rows))]
+
+    def materialize(self):
+        """base đã áp dụng các thay đổi (bản sao tạo một lần cho mỗi version)."""
+        if self._materialized is not None and self._materialized[0] == self.version:
+            return self._materialized[1]
+        df = self.base.copy()
+        by_column = {}
+        for (row, column), value in self._values.items():
+            by_column.setdefault(column, {})[row] = value
+        for column, changes in by_column.items():
+            # Cột chuỗi (kể cả chuỗi Arrow/category) giữ kiểu chuỗi khi giá trị mới đều là chuỗi,
+            # ngược lại chuyển sang object để gán được mọi giá trị
+            values = decategorize(df[column])
+            all_text = all(isinstance(value, str) or pd.isna(value) for value in changes.values())
+            if not (pd.api.types.is_string_dtype(values.dtype) and all_text):
+                values = values.astype(object)
+            values.loc[list(changes)] = list(changes.values())
+            df[column] = values
+        self._materialized = (self.version, df)
+        return df
+
+    def audit_frame(self):
+        """Nhật ký các bước đang có hiệu lực: mỗi ô thay đổi một dòng."""
+        records = [
+            (number, source, row, column, old, new)
+            for number, (source, step) in enumerate(self._steps, 1)
+            for row, column, old, new in step
+        ]
+        return pd.DataFrame.from_records(records, columns=AUDIT_COLUMNS)
+
+    def _set(self, row, column, value):
+        if _same(value, self.base.at[row, column]):
+            self._values.pop((row, column), None)
+        else:
+            self._values[(row, column)] = value
+
+    def _changed(self):
+        self.version += 1
+        self._materialized = None
+
+
+def _same(a, b):
+    if pd.isna(a) and pd.isna(b):
+        return True
+    return not (pd.isna(a) or pd.isna(b)) and a == b
@@ -0,0 +1,57 @@
+"""
+Xem trước DataFrame theo trang: tìm kiếm, sắp xếp và cắt trang trên server,
+chỉ một trang dữ liệu được gửi sang trình duyệt. Các hàm ở đây không gọi st.*.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+# Bảng không quá số dòng này được hiển thị toàn bộ, không cần phân trang
+FULL_RENDER_ROWS = 1000
+PAGE_SIZES = [50, 100, 500, 1000]
+DEFAULT_PAGE_SIZE = 100
+
+
+def column_contains(series, text):
+    """Mask các ô của cột chứa text (không phân biệt hoa thường). Cột category chỉ xét các giá trị khác nhau."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = column_contains(pd.Series(series.cat.categories), text).to_numpy()
+        codes = series.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, categories[codes], False), index=series.index)
+    if not pd.api.types.is_string_dtype(series.dtype) or pd.api.types.is_object_dtype(series.dtype):
+        series = series.astype(str).where(series.notna())
+    return series.str.contains(text, case=False, regex=False, na=False).astype(bool)
+
+def search_mask(df, text, columns=None):
+    """Mask các dòng có ít nhất một ô (trong columns, mặc định mọi cột) chứa text."""
+    mask = np.zeros(len(df), dtype=bool)
+    for col in columns if columns is not None else df.columns:
+        mask |= column_contains(df[col], text).to_numpy()
+    return mask
+
+def sort_frame(df, column, ascending=True):
+    """Sắp xếp ổn định theo một cột; cột lẫn kiểu (số và chữ) được so sánh dạng chuỗi."""
+    try:
+        return df.sort_values(column, ascending=ascending, kind="stable")
+    except TypeError:
+        return df.sort_values(column, ascending=ascending, kind="stable", key=lambda col: col.astype(str))
+
+def page_count(rows, page_size):
+    return max(1, math.ceil(rows / page_size))
+
+def preview_page(df, search="", search_columns=None, sort_column=None, ascending=True,
+                 page=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Một trang của df sau khi tìm kiếm và sắp xếp.
+    Trả về (df_page, số dòng khớp, trang thực tế, tổng số trang). Trang vượt quá được đưa về trang cuối.
+    Chỉ các dòng khớp tìm kiếm được sắp xếp.
+    """
+    if search:
+        df = df[search_mask(df, search, search_columns)]
+    if sort_column is not None:
+        df = sort_frame(df, sort_column, ascending)
+    pages = page_count(len(df), page_size)
+    page = min(max(1, page), pages)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], len(df), page, pages
@@ -0,0 +1,142 @@
+import contextlib
+import cProfile
+import io
+import json
+import marshal
+import pstats
+import time
+
+import pandas as pd
+
+# Các loại bước của một công cụ
+STAGE_PARSE = "parse"
+STAGE_TRANSFORM = "transform"
+STAGE_RENDER = "render"
+STAGE_EXPORT = "export"
+
+# Số hàm hiển thị trong báo cáo cProfile
+CPROFILE_TOP = 40
+
+
+def memory_kb(field="VmRSS"):
+    """Giá trị VmRSS / VmHWM (KB) của process hiện tại, None nếu không đọc được /proc."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def peak_rss_kb():
+    """Bộ nhớ đỉnh (KB) của process từ lúc bắt đầu hoặc từ lần reset_peak_rss gần nhất."""
+    value = memory_kb("VmHWM")
+    if value is None:
+        import resource
+        value = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return value
+
+def reset_peak_rss():
+    """Đặt lại VmHWM về RSS hiện tại (Linux). Trả về False nếu hệ thống không hỗ trợ."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+def _mb(kb):
+    return round(kb / 1024, 1) if kb is not None else None
+
+
+class RunProfiler:
+    """
+    Ghi lại thời gian, số dòng và thay đổi bộ nhớ của từng bước (đọc file, xử lý,
+    hiển thị, xuất file) trong một lần chạy của một công cụ, có thể kèm cProfile.
+    Bộ nhớ là của cả process, nên khi nhiều người dùng chạy cùng lúc số liệu chỉ mang tính tham khảo.
+    """
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.stages = []
+        self.cprofile_stats = None
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, kind, detail="", rows=None, rows_out=None):
+        """
+        Đo một bước. Có thể gán số dòng kết quả sau khi xử lý xong qua record["rows_out"]:
+            with profiler.stage(STAGE_TRANSFORM, "find_duplicates", rows=len(df)) as record:
+                df_duplicates = find_duplicates(df, ...)
+                record["rows_out"] = len(df_duplicates)
+        """
+        record = {"tool": self.tool, "stage": kind, "detail": detail, "rows": rows, "rows_out": rows_out}
+        rss_before = memory_kb("VmRSS")
+        peak_reset = reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - start, 4)
+            rss_after = memory_kb("VmRSS")
+            record["rss_before_mb"] = _mb(rss_before)
+            record["rss_after_mb"] = _mb(rss_after)
+            record["rss_delta_mb"] = _mb(rss_after - rss_before) if rss_before is not None and rss_after is not None else None
+            record["peak_rss_mb"] = _mb(peak_rss_kb()) if peak_reset else None
+            self.stages.append(record)
+
+    def record(self, kind, detail, seconds, rows=None, rows_out=None):
+        """Thêm một bước đã được đo ở nơi khác (ví dụ job chạy nền), không có số liệu bộ nhớ."""
+        self.stages.append({
+            "tool": self.tool, "stage": kind, "detail": detail, "rows": rows, "rows_out": rows_out,
+            "seconds": round(seconds, 4), "rss_before_mb": None, "rss_after_mb": None,
+            "rss_delta_mb": None, "peak_rss_mb": None,
+        })
+
+    @contextlib.contextmanager
+    def cprofile(self, enabled=True):
+        """Chạy khối lệnh dưới cProfile (nếu enabled) và lưu kết quả vào cprofile_stats."""
+        if not enabled:
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.cprofile_stats = pstats.Stats(profile)
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self._start
+
+    def to_frame(self):
+        columns = ["tool", "stage", "detail", "rows", "rows_out", "seconds", "rss_before_mb", "rss_after_mb", "rss_delta_mb", "peak_rss_mb"]
+        return pd.DataFrame(self.stages, columns=columns)
+
+    def to_json(self):
+        return json.dumps({
+            "tool": self.tool,
+            "total_seconds": round(self.total_seconds, 4),
+            "stages": self.stages,
+        }, ensure_ascii=False, indent=2)
+
+    def to_csv(self):
+        return self.to_frame().to_csv(index=False)
+
+    def cprofile_text(self, top=CPROFILE_TOP):
+        """Báo cáo cProfile dạng văn bản (các hàm tốn thời gian nhất, tính cả hàm con)."""
+        if self.cprofile_stats is None:
+            return None
+        output = io.StringIO()
+        self.cprofile_stats.stream = output
+        self.cprofile_stats.sort_stats("cumulative").print_stats(top)
+        return output.getvalue()
+
+    def cprofile_bytes(self):
+        """Dữ liệu cProfile dạng .prof (mở bằng pstats, snakeviz, ...)."""
+        if self.cprofile_stats is None:
+            return None
+        return marshal.dumps(self.cprofile_stats.stats)
@@ -0,0 +1,205 @@
+"""
+Sinh dữ liệu liên hệ tiếng Việt giả lập (có dấu, email lỗi, ô nhiều dòng, ...) để đo hiệu năng.
+
+Ví dụ:
+    python synthetic_data.py 100000 -o contacts_100k.xlsx
+    python synthetic_data.py 50000 -o blocks.xlsx --kind blocks
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+COMPANY_PREFIXES = [
+    "CÔNG TY TNHH", "CÔNG TY CỔ PHẦN", "Công ty TNHH MTV", "CTY TNHH", "Cty CP", "DNTN", "CÔNG TY TNHH MỘT THÀNH VIÊN",
+]
+COMPANY_ACTIVITIES = [
+    "", "", "THƯƠNG MẠI DỊCH VỤ", "SẢN XUẤT", "XÂY DỰNG", "SẢN XUẤT - THƯƠNG MẠI", "XUẤT NHẬP KHẨU",
+    "CÔNG NGHỆ", "THỰC PHẨM", "VẬN TẢI", "KỸ THUẬT",
+]
+NAME_SYLLABLES = [
+    "HOÀNG", "LONG", "MINH", "PHÁT", "AN", "THỊNH", "VIỆT", "NAM", "ĐẠI", "TÂN", "PHÚ", "HƯNG", "THÀNH",
+    "ĐỨC", "KIM", "NGỌC", "HẢI", "SƠN", "BÌNH", "DƯƠNG", "QUANG", "TRUNG", "TIẾN", "LỢI", "HÒA", "VĨNH",
+    "GIA", "KHANG", "NHẬT", "QUỐC", "THIÊN", "ÂN", "PHƯƠNG", "ĐÔNG", "SÀI GÒN", "HÀ NỘI", "MEKONG",
+]
+STREETS = ["Nguyễn Huệ", "Lê Lợi", "Trần Hưng Đạo", "Điện Biên Phủ", "Cách Mạng Tháng 8", "Võ Văn Kiệt", "Đường số 13"]
+CITIES = [
+    "TP Hồ Chí Minh (VN)", "Hà Nội (VN)", "Bình Dương (VN)", "Đồng Nai (VN)", "Long An (VN)",
+    "Đà Nẵng (VN)", "Hải Phòng (VN)", "Cần Thơ (VN)",
+]
+EMAIL_DOMAINS = ["gmail.com"] * 6 + ["yahoo.com", "yahoo.com.vn", "hotmail.com", "outlook.com", "fpt.vn", "hcm.vnn.vn"]
+TYPO_DOMAINS = ["gmial.com", "gmail.con", "gmai.com", "yahoo.com.vnn", "hotmial.com", "yhaoo.com"]
+
+# Tỉ lệ các loại email lỗi trong cột Email (phần còn lại là email hợp lệ)
+EMAIL_ERROR_RATES = {
+    "none": 0.10,       # none@gmail.com (giá trị giữ chỗ)
+    "blank": 0.08,      # ô trống
+    "multi": 0.05,      # nhiều email trong một ô
+    "typo": 0.05,       # domain gõ sai
+    "vnn": 0.03,        # x@hcm.vnn.vn -> x@hcm.vn
+    "invisible": 0.02,  # ký tự ẩn
+    "space": 0.04,      # khoảng trắng thừa
+    "broken": 0.03,     # thiếu domain
+}
+
+
+def _pool_size(rows, ratio=0.5, limit=200_000):
+    return max(10, min(int(rows * ratio), limit))
+
+def company_names(rng, size):
+    """size tên công ty khác nhau (có thể trùng) dạng 'CÔNG TY TNHH THƯƠNG MẠI HOÀNG LONG'."""
+    prefixes = rng.choice(COMPANY_PREFIXES, size)
+    activities = rng.choice(COMPANY_ACTIVITIES, size)
+    syllables = rng.choice(NAME_SYLLABLES, (size, 3))
+    lengths = rng.integers(1, 4, size)
+    names = []
+    for prefix, activity, parts, length in zip(prefixes, activities, syllables, lengths):
+        words = [prefix, activity, *parts[:length]]
+        names.append(" ".join(word for word in words if word))
+    return np.array(names, dtype=object)
+
+def _name_variants(names):
+    """
+    4 cách viết cho mỗi tên (giữ nguyên, chữ thường, bỏ dấu, viết tắt "CTY" + khoảng trắng thừa)
+    để tạo trùng gần đúng. Trả về mảng len(names) x 4.
+    """
+    return np.array([
+        (name, name.lower(), unidecode(name), name.replace("CÔNG TY", "CTY") + " ")
+        for name in names
+    ], dtype=object).reshape(len(names), 4)
+
+def tax_codes(rng, size):
+    return np.char.zfill(rng.integers(100_000_000, 9_999_999_999, size).astype(str), 10).astype(object)
+
+def phone_numbers(rng, size):
+    prefixes = rng.choice(["090", "091", "093", "097", "098", "028", "024"], size)
+    numbers = np.char.zfill(rng.integers(0, 10_000_000, size).astype(str), 7)
+    return np.char.add(prefixes, numbers).astype(object)
+
+def email_local_part(name):
+    """Phần trước @ của email tạo từ tên công ty: 2 từ cuối, bỏ dấu, chữ thường."""
+    words = unidecode(str(name)).lower().replace("-", " ").split()
+    return "".join(words[-2:]) or "info"
+
+def emails_for(rng, names):
+    """Email tương ứng với tên công ty, kèm các lỗi thường gặp theo EMAIL_ERROR_RATES."""
+    size = len(names)
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+    locals_ = np.array([email_local_part(name) for name in uniques], dtype=object)[codes]
+    emails = (pd.Series(locals_) + "@" + pd.Series(rng.choice(EMAIL_DOMAINS, size), dtype=object)).to_numpy(dtype=object)
+
+    kinds = list(EMAIL_ERROR_RATES)
+    probabilities = list(EMAIL_ERROR_RATES.values())
+    choice = rng.choice(len(kinds) + 1, size, p=probabilities + [1 - sum(probabilities)])
+    for k, kind in enumerate(kinds):
+        idx = np.flatnonzero(choice == k)
+        if kind == "none":
+            emails[idx] = "none@gmail.com"
+        elif kind == "blank":
+            emails[idx] = None
+        elif kind == "multi":
+            emails[idx] = [f"{email}; sales.{email}" for email in emails[idx]]
+        elif kind == "typo":
+            typos = rng.choice(TYPO_DOMAINS, len(idx))
+            emails[idx] = [f"{local}@{typo}" for local, typo in zip(locals_[idx], typos)]
+        elif kind == "vnn":
+            emails[idx] = [f"{local}@hcm.vnn.vn" for local in locals_[idx]]
+        elif kind == "invisible":
+            emails[idx] = [f"{email}​" for email in emails[idx]]
+        elif kind == "space":
+            emails[idx] = [f" {email.replace('@', ' @')} " for email in emails[idx]]
+        elif kind == "broken":
+            emails[idx] = [f"{local}@" for local in locals_[idx]]
+    return emails
+
+def generate_contacts(rows, seed=0, duplicate_ratio=0.3):
+    """
+    Bảng liên hệ giống DuLieuLienHe.xlsx: Tên, Đường, Mã số thuế, Điện thoại (có ô nhiều dòng),
+    Email (nhiều kiểu lỗi), Thành phố. Khoảng duplicate_ratio số dòng là công ty lặp lại
+    (cùng mã số thuế, tên viết khác nhau).
+    """
+    rng = np.random.default_rng(seed)
+    pool = max(1, int(rows * (1 - duplicate_ratio)))
+    company = rng.integers(0, pool, rows)
+    variants = _name_variants(company_names(rng, min(pool, _pool_size(rows))))
+    names = variants[company % len(variants), rng.integers(0, 4, rows)]
+    codes = tax_codes(rng, pool)[company]
+
+    phones = phone_numbers(rng, rows)
+    multi_line = rng.random(rows) < 0.2
+    phones[multi_line] = [f"{phone}\n{other}" for phone, other in zip(phones[multi_line], phone_numbers(rng, multi_line.sum()))]
+
+    streets = np.char.add(
+        np.char.add(rng.integers(1, 500, rows).astype(str), " "),
+        rng.choice(STREETS, rows)
+    ).astype(object)
+    return pd.DataFrame({
+        "Tên": names,
+        "Đường": streets,
+        "Mã số thuế": codes,
+        "Điện thoại": phones,
+        "Email": emails_for(rng, names),
+        "Thành phố": rng.choice(CITIES, rows).astype(object),
+    })
+
+def generate_blocks(rows, seed=0, max_block=5):
+    """
+    Dữ liệu theo khối cho Merge Data: dòng đầu khối có Tên (cột X) và các cột khác,
+    các dòng tiếp theo chỉ có Điện thoại (cột Y).
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, max_block + 1, rows)
+    starts = np.cumsum(sizes) - sizes
+    starts = starts[starts < rows]
+    is_start = np.zeros(rows, dtype=bool)
+    is_start[starts] = True
+
+    df = generate_contacts(rows, seed=seed, duplicate_ratio=0)
+    df["Điện thoại"] = phone_numbers(rng, rows)
+    others = [col for col in df.columns if col != "Điện thoại"]
+    df[others] = df[others].astype(object)
+    df.loc[~is_start, others] = None
+    return df
+
+def generate_fill_pair(rows, seed=0, reference_ratio=1.0, missing_ratio=0.5):
+    """
+    Cặp File A / File B cho Fill Data, khóa "Mã số thuế".
+    File A thiếu Email ở khoảng missing_ratio số dòng; File B (khoảng reference_ratio * rows dòng)
+    chứa Email của phần lớn các mã số thuế, theo thứ tự ngẫu nhiên và có vài mã trùng.
+    """
+    rng = np.random.default_rng(seed)
+    df_a = generate_contacts(rows, seed=seed, duplicate_ratio=0)[["Tên", "Mã số thuế", "Email"]]
+    df_a["Email"] = df_a["Email"].astype(object)
+    df_a.loc[rng.random(rows) < missing_ratio, "Email"] = None
+
+    size_b = max(1, int(rows * reference_ratio))
+    picked = rng.integers(0, rows, size_b)
+    df_b = pd.DataFrame({
+        "MST": df_a["Mã số thuế"].to_numpy()[picked],
+        "Email liên hệ": emails_for(rng, df_a["Tên"].to_numpy()[picked]),
+    })
+    return df_a, df_b
+
+
+GENERATORS = {
+    "contacts": generate_contacts,
+    "blocks": generate_blocks,
+}
+
+
+def main(argv=None):
+    from data_io import write_table
+
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu liên hệ giả lập.")
+    parser.add_argument("rows", type=int, help="Số dòng")
+    parser.add_argument("-o", "--output", required=True, help="File kết quả (.xlsx, .csv hoặc .parquet)")
+    parser.add_argument("--kind", choices=list(GENERATORS), default="contacts", help="Loại dữ liệu")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_table(GENERATORS[args.kind](args.rows, seed=args.seed), args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
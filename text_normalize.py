@@ -0,0 +1,66 @@
+"""
+Chuẩn hóa văn bản tiếng Việt dùng chung cho sửa email, tìm trùng và khóa ghép File A / File B:
+bỏ dấu (kể cả đ/Đ), bỏ ký tự ẩn, không phân biệt hoa thường và gộp khoảng trắng.
+Bỏ dấu bằng bảng str.translate tạo sẵn; chỉ chuỗi còn ký tự ngoài ASCII sau khi tra bảng
+(chữ Trung, ký hiệu, ...) mới cần đến unidecode. Kết quả được nhớ theo từng giá trị khác nhau.
+"""
+import functools
+import re
+
+import pandas as pd
+from unidecode import unidecode
+
+# Chữ cái tiếng Việt có dấu (chữ thường) theo chữ cái không dấu
+VIETNAMESE_LETTERS = {
+    "a": "àáảãạăằắẳẵặâầấẩẫậ",
+    "d": "đ",
+    "e": "èéẻẽẹêềếểễệ",
+    "i": "ìíỉĩị",
+    "o": "òóỏõọôồốổỗộơờớởỡợ",
+    "u": "ùúủũụưừứửữự",
+    "y": "ỳýỷỹỵ",
+}
+# Ký tự ẩn (giống email_utils.INVISIBLE_CHARS_PATTERN)
+INVISIBLE_CHARS = "​‌‍﻿"
+# Dấu tổ hợp (văn bản dạng NFD: chữ cái + dấu tách rời)
+COMBINING_MARKS = range(0x0300, 0x0370)
+# Số giá trị khác nhau được nhớ kết quả chuẩn hóa
+CACHE_SIZE = 1 << 18
+
+
+def _build_table():
+    table = {}
+    for base, letters in VIETNAMESE_LETTERS.items():
+        for letter in letters:
+            table[ord(letter)] = base
+            table[ord(letter.upper())] = base.upper()
+    for char in INVISIBLE_CHARS:
+        table[ord(char)] = None
+    for code in COMBINING_MARKS:
+        table[code] = None
+    return table
+
+_TRANSLATION_TABLE = _build_table()
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def strip_accents(text):
+    """Bỏ dấu tiếng Việt (đ -> d, Đ -> D) và ký tự ẩn; ký tự khác ngoài ASCII được chuyển bằng unidecode."""
+    if text.isascii():
+        return text
+    text = text.translate(_TRANSLATION_TABLE)
+    return text if text.isascii() else unidecode(text)
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def normalize_text(text):
+    """Chuẩn hóa để so sánh: bỏ dấu, bỏ ký tự ẩn, chữ thường (casefold), gộp khoảng trắng và bỏ ở hai đầu."""
+    return _WHITESPACE_RE.sub(" ", strip_accents(text).casefold()).strip()
+
+def normalize_column(series):
+    """
+    Chuẩn hóa cả cột bằng normalize_text, mỗi giá trị khác nhau chỉ tính một lần.
+    Giá trị không phải chuỗi được chuyển bằng str (123 và "123" cùng khóa); NaN giữ nguyên.
+    """
+    values = series.astype(object)
+    mapping = {value: normalize_text(str(value)) for value in pd.unique(values) if not pd.isna(value)}
+    return values.map(mapping)